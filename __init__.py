@@ -8,18 +8,52 @@ NoneBot 2 QQ群邀请行为监控插件
 """
 
 import os
+import time
 import asyncio
 import configparser
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, List, Dict, FrozenSet, Mapping, Optional, Tuple
 
 import nonebot
-from nonebot import on_request, get_bots, logger
-from nonebot.adapters.onebot.v11 import Bot, GroupRequestEvent
+from nonebot import on_request, on_notice, get_bots, logger
+from nonebot.adapters import Bot as BaseBot, Event
+from nonebot.drivers import ASGIMixin, HTTPServerSetup, Request, Response, URL
+from nonebot.adapters.onebot.v11 import (
+    Bot,
+    GroupRequestEvent,
+    GroupIncreaseNoticeEvent,
+    GroupDecreaseNoticeEvent,
+    GroupAdminNoticeEvent,
+    Message,
+)
 from nonebot.rule import Rule
 from nonebot.permission import SUPERUSER
-from nonebot.params import EventType, EventMessage
+from nonebot.params import EventType, EventMessage, CommandArg
+from nonebot.typing import T_State
+
+from .actions import KickExecutor, REJOIN_TARGET_GROUP
+from .analytics import BUCKETS, DIMENSIONS, FORMATS, ViolationAggregator, export_file, iter_sqlite
+from .cache import ApiCache
+from .dedup import InviteDeduplicator
+from .journal import KIND_DETECTION, KIND_KICK, ActionJournal, Entry
+from .logwriter import ViolationLogWriter
+from .membership import MemberIndex, MemberSyncScheduler, ADMIN_ROLES
+from .metrics import END_TO_END_BUCKETS, MetricsRegistry
+from .outbox import DetectionSender
+from .pool import BotPool
+from .protocol import (
+    DetectionFormatError,
+    decode_detections,
+    encode_detections,
+    format_legacy_detection,
+    is_detection_text,
+)
+from .reputation import ReputationStore, count_offenders
+from .store import ViolationStore, iter_text_log
+from .transport import GroupTransport, LocalTransport, SocketServer, SocketTransport, TransportRouter
 
 # 插件元数据
 __plugin_meta__ = {
@@ -34,19 +68,132 @@ __plugin_meta__ = {
 # 全局配置
 config_file_path = Path(__file__).parent / "config.ini"
 log_file_path = Path(__file__).parent / "violation_logs.txt"
+pending_actions_path = Path(__file__).parent / "pending_actions.json"
+
+def parse_bot_ids(value: str) -> List[str]:
+    """解析逗号分隔的机器人QQ号列表"""
+    return [bot_id.strip() for bot_id in value.split(',') if bot_id.strip().isdigit()]
 
 class PluginConfig:
-    """插件配置类"""
+    """插件配置类
+
+    加载完成后成为只读快照，重载配置时整体替换，不会原地修改。
+    """
+    
+    # 由其他配置项生成的查询结构，不参与配置比较
+    DERIVED_FIELDS = (
+        "monitored_group_set",
+        "monitored_group_order",
+        "monitor_bot_set",
+        "admin_bot_set",
+        "monitor_bot_int_set",
+        "admin_bot_int_set",
+        "load_error",
+    )
     
     def __init__(self):
-        self.monitor_bot_id: Optional[str] = None
-        self.admin_bot_id: Optional[str] = None
-        self.monitored_groups: List[int] = []
+        self.monitor_bot_ids: Tuple[str, ...] = ()
+        self.admin_bot_ids: Tuple[str, ...] = ()
+        self.monitored_groups: Tuple[int, ...] = ()
         self.communication_group: Optional[int] = None
         self.enabled: bool = True
         self.log_level: str = "INFO"
         self.reject_add_request: bool = False
+        self.config_watch_interval: float = 0
+        self.member_index_enabled: bool = True
+        self.member_index_refresh_interval: int = 3600
+        self.member_index_active_interval: float = 600
+        self.member_index_sync_rate: float = 0.5
+        self.member_index_snapshot: str = "member_index.json"
+        self.member_index_snapshot_max_age: float = 86400
+        self.probe_concurrency: int = 8
+        self.probe_timeout: float = 5.0
+        self.dedup_window: float = 30
+        self.detection_format: str = "compact"
+        self.cache_enabled: bool = True
+        self.cache_max_size: int = 4096
+        self.cache_member_info_ttl: float = 300
+        self.cache_group_info_ttl: float = 3600
+        self.cache_negative_ttl: float = 60
+        self.log_batch_size: int = 100
+        self.log_flush_interval: float = 1.0
+        self.log_max_size_mb: float = 10
+        self.log_rotate_daily: bool = True
+        self.log_compress: bool = True
+        self.log_backend: str = "text"
+        self.sender_batch_window: float = 1.0
+        self.sender_max_batch_size: int = 10
+        self.sender_rate: float = 0.5
+        self.sender_burst: float = 3
+        self.sender_max_retries: int = 3
+        self.sender_retry_backoff: float = 2.0
+        self.executor_merge_window: float = 3.0
+        self.executor_max_retries: int = 3
+        self.executor_retry_backoff: float = 2.0
+        self.executor_kicked_ttl: float = 3600
+        self.log_sqlite_path: str = "violations.db"
+        self.transport_mode: str = "auto"
+        self.transport_socket_address: str = ""
+        self.transport_socket_listen: bool = False
+        self.transport_socket_token: str = ""
+        self.metrics_enabled: bool = False
+        self.metrics_path: str = "/invite_detection/metrics"
+        self.reputation_enabled: bool = False
+        self.reputation_path: str = "reputation"
+        self.reputation_user_threshold: int = 1
+        self.reputation_target_threshold: int = 3
+        self.reputation_reject_known_targets: bool = True
+        self.reputation_kick_on_join: bool = True
+        self.reputation_save_interval: float = 60
+        self.journal_enabled: bool = True
+        self.journal_path: str = "pending_journal.log"
+        self.journal_flush_interval: float = 0.05
+        self.journal_compact_threshold: int = 1000
+        self.export_path: str = "exports"
+        self.export_max_keys: int = 100000
+        self.export_time_bucket: str = "day"
+        self.export_top: int = 10
+        # 配置文件存在但读取失败时的错误信息
+        self.load_error: Optional[str] = None
         self._load_config()
+        self._freeze()
+    
+    def _freeze(self):
+        """生成 O(1) 查询结构，此后配置不可修改"""
+        self.monitor_bot_ids = tuple(self.monitor_bot_ids)
+        self.admin_bot_ids = tuple(self.admin_bot_ids)
+        self.monitored_groups = tuple(self.monitored_groups)
+        self.monitored_group_set: FrozenSet[int] = frozenset(self.monitored_groups)
+        # 群号 -> 在配置中的位置，用户在多个监控群中时按配置顺序选择
+        self.monitored_group_order: Mapping[int, int] = MappingProxyType(
+            {group_id: index for index, group_id in reversed(list(enumerate(self.monitored_groups)))}
+        )
+        self.monitor_bot_set: FrozenSet[str] = frozenset(self.monitor_bot_ids)
+        self.admin_bot_set: FrozenSet[str] = frozenset(self.admin_bot_ids)
+        # OneBot V11 事件中的 self_id 为整数，规则中直接比较，无需构造字符串
+        self.monitor_bot_int_set: FrozenSet[int] = frozenset(int(bot_id) for bot_id in self.monitor_bot_ids)
+        self.admin_bot_int_set: FrozenSet[int] = frozenset(int(bot_id) for bot_id in self.admin_bot_ids)
+        object.__setattr__(self, '_frozen', True)
+    
+    def __setattr__(self, name: str, value: Any):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"配置为只读快照，无法修改 {name}，请修改配置文件后重载")
+        super().__setattr__(name, value)
+    
+    def is_bot(self, self_id: str) -> bool:
+        """是否为配置中的监控机器人或管理机器人"""
+        return self_id in self.monitor_bot_set or self_id in self.admin_bot_set
+    
+    def diff(self, other: "PluginConfig") -> Dict[str, Tuple[Any, Any]]:
+        """与另一份配置比较，返回 配置项 -> (旧值, 新值)"""
+        changes = {}
+        for name, value in vars(self).items():
+            if name.startswith('_') or name in self.DERIVED_FIELDS:
+                continue
+            new_value = getattr(other, name)
+            if new_value != value:
+                changes[name] = (value, new_value)
+        return changes
     
     def _load_config(self):
         """加载配置文件"""
@@ -61,8 +208,9 @@ class PluginConfig:
             
             # 读取机器人配置
             if 'bots' in config:
-                self.monitor_bot_id = config.get('bots', 'monitor_bot_id', fallback=None)
-                self.admin_bot_id = config.get('bots', 'admin_bot_id', fallback=None)
+                # 均可配置多个，用逗号分隔
+                self.monitor_bot_ids = parse_bot_ids(config.get('bots', 'monitor_bot_id', fallback=''))
+                self.admin_bot_ids = parse_bot_ids(config.get('bots', 'admin_bot_id', fallback=''))
             
             # 读取群组配置
             if 'groups' in config:
@@ -83,12 +231,97 @@ class PluginConfig:
                 self.enabled = config.getboolean('settings', 'enabled', fallback=True)
                 self.log_level = config.get('settings', 'log_level', fallback='INFO')
                 self.reject_add_request = config.getboolean('settings', 'reject_add_request', fallback=False)
+                self.member_index_enabled = config.getboolean('settings', 'member_index_enabled', fallback=True)
+                self.member_index_refresh_interval = config.getint('settings', 'member_index_refresh_interval', fallback=3600)
+                self.member_index_active_interval = config.getfloat('settings', 'member_index_active_interval', fallback=600)
+                self.member_index_sync_rate = config.getfloat('settings', 'member_index_sync_rate', fallback=0.5)
+                self.member_index_snapshot = config.get('settings', 'member_index_snapshot', fallback='member_index.json').strip()
+                self.member_index_snapshot_max_age = config.getfloat('settings', 'member_index_snapshot_max_age', fallback=86400)
+                self.probe_concurrency = config.getint('settings', 'probe_concurrency', fallback=8)
+                self.probe_timeout = config.getfloat('settings', 'probe_timeout', fallback=5.0)
+                self.dedup_window = config.getfloat('settings', 'dedup_window', fallback=30)
+                self.config_watch_interval = config.getfloat('settings', 'config_watch_interval', fallback=0)
+                self.detection_format = config.get('settings', 'detection_format', fallback='compact').strip().lower()
+            
+            # 读取缓存配置
+            if 'cache' in config:
+                self.cache_enabled = config.getboolean('cache', 'enabled', fallback=True)
+                self.cache_max_size = config.getint('cache', 'max_size', fallback=4096)
+                self.cache_member_info_ttl = config.getfloat('cache', 'member_info_ttl', fallback=300)
+                self.cache_group_info_ttl = config.getfloat('cache', 'group_info_ttl', fallback=3600)
+                self.cache_negative_ttl = config.getfloat('cache', 'negative_ttl', fallback=60)
+            
+            # 读取违规日志配置
+            if 'violation_log' in config:
+                self.log_batch_size = config.getint('violation_log', 'batch_size', fallback=100)
+                self.log_flush_interval = config.getfloat('violation_log', 'flush_interval', fallback=1.0)
+                self.log_max_size_mb = config.getfloat('violation_log', 'max_size_mb', fallback=10)
+                self.log_rotate_daily = config.getboolean('violation_log', 'rotate_daily', fallback=True)
+                self.log_compress = config.getboolean('violation_log', 'compress', fallback=True)
+                self.log_backend = config.get('violation_log', 'backend', fallback='text').strip().lower()
+                self.log_sqlite_path = config.get('violation_log', 'sqlite_path', fallback='violations.db').strip()
+            
+            # 读取检测消息发送配置
+            if 'sender' in config:
+                self.sender_batch_window = config.getfloat('sender', 'batch_window', fallback=1.0)
+                self.sender_max_batch_size = config.getint('sender', 'max_batch_size', fallback=10)
+                self.sender_rate = config.getfloat('sender', 'rate', fallback=0.5)
+                self.sender_burst = config.getfloat('sender', 'burst', fallback=3)
+                self.sender_max_retries = config.getint('sender', 'max_retries', fallback=3)
+                self.sender_retry_backoff = config.getfloat('sender', 'retry_backoff', fallback=2.0)
+            
+            # 读取踢人执行配置
+            if 'executor' in config:
+                self.executor_merge_window = config.getfloat('executor', 'merge_window', fallback=3.0)
+                self.executor_max_retries = config.getint('executor', 'max_retries', fallback=3)
+                self.executor_retry_backoff = config.getfloat('executor', 'retry_backoff', fallback=2.0)
+                self.executor_kicked_ttl = config.getfloat('executor', 'kicked_ttl', fallback=3600)
+            
+            # 读取检测结果传输配置
+            if 'transport' in config:
+                self.transport_mode = config.get('transport', 'mode', fallback='auto').strip().lower()
+                self.transport_socket_address = config.get('transport', 'socket_address', fallback='').strip()
+                self.transport_socket_listen = config.getboolean('transport', 'socket_listen', fallback=False)
+                self.transport_socket_token = config.get('transport', 'socket_token', fallback='').strip()
+            
+            # 读取运行指标配置
+            if 'metrics' in config:
+                self.metrics_enabled = config.getboolean('metrics', 'enabled', fallback=False)
+                self.metrics_path = config.get('metrics', 'path', fallback='/invite_detection/metrics').strip()
+            
+            # 读取信誉库配置
+            if 'reputation' in config:
+                self.reputation_enabled = config.getboolean('reputation', 'enabled', fallback=False)
+                self.reputation_path = config.get('reputation', 'path', fallback='reputation').strip()
+                self.reputation_user_threshold = config.getint('reputation', 'user_threshold', fallback=1)
+                self.reputation_target_threshold = config.getint('reputation', 'target_threshold', fallback=3)
+                self.reputation_reject_known_targets = config.getboolean('reputation', 'reject_known_targets', fallback=True)
+                self.reputation_kick_on_join = config.getboolean('reputation', 'kick_on_join', fallback=True)
+                self.reputation_save_interval = config.getfloat('reputation', 'save_interval', fallback=60)
+            
+            # 读取未完成操作日志配置
+            if 'journal' in config:
+                self.journal_enabled = config.getboolean('journal', 'enabled', fallback=True)
+                self.journal_path = config.get('journal', 'path', fallback='pending_journal.log').strip()
+                self.journal_flush_interval = config.getfloat('journal', 'flush_interval', fallback=0.05)
+                self.journal_compact_threshold = config.getint('journal', 'compact_threshold', fallback=1000)
+            
+            # 读取违规统计导出配置
+            if 'export' in config:
+                self.export_path = config.get('export', 'path', fallback='exports').strip()
+                self.export_max_keys = config.getint('export', 'max_keys', fallback=100000)
+                self.export_time_bucket = config.get('export', 'time_bucket', fallback='day').strip().lower()
+                self.export_top = config.getint('export', 'top', fallback=10)
+                if self.export_time_bucket not in BUCKETS:
+                    logger.warning(f"未知的统计时间段 {self.export_time_bucket}，使用 day")
+                    self.export_time_bucket = "day"
             
             logger.info(f"配置加载成功: 监控{len(self.monitored_groups)}个群聊")
             
         except Exception as e:
+            # 不覆盖用户的配置文件，重载时保留原有配置
             logger.error(f"配置文件加载失败: {e}")
-            self._create_default_config()
+            self.load_error = str(e)
     
     def _create_default_config(self):
         """创建默认配置文件"""
@@ -107,7 +340,88 @@ class PluginConfig:
         config['settings'] = {
             'enabled': 'true',
             'log_level': 'INFO',
-            'reject_add_request': 'false'
+            'reject_add_request': 'false',
+            'member_index_enabled': 'true',
+            'member_index_refresh_interval': '3600',
+            'member_index_active_interval': '600',
+            'member_index_sync_rate': '0.5',
+            'member_index_snapshot': 'member_index.json',
+            'member_index_snapshot_max_age': '86400',
+            'probe_concurrency': '8',
+            'probe_timeout': '5',
+            'dedup_window': '30',
+            'config_watch_interval': '0',
+            'detection_format': 'compact'
+        }
+        
+        config['cache'] = {
+            'enabled': 'true',
+            'max_size': '4096',
+            'member_info_ttl': '300',
+            'group_info_ttl': '3600',
+            'negative_ttl': '60'
+        }
+        
+        config['violation_log'] = {
+            'batch_size': '100',
+            'flush_interval': '1',
+            'max_size_mb': '10',
+            'rotate_daily': 'true',
+            'compress': 'true',
+            'backend': 'text',
+            'sqlite_path': 'violations.db'
+        }
+        
+        config['sender'] = {
+            'batch_window': '1',
+            'max_batch_size': '10',
+            'rate': '0.5',
+            'burst': '3',
+            'max_retries': '3',
+            'retry_backoff': '2'
+        }
+        
+        config['executor'] = {
+            'merge_window': '3',
+            'max_retries': '3',
+            'retry_backoff': '2',
+            'kicked_ttl': '3600'
+        }
+        
+        config['transport'] = {
+            'mode': 'auto',
+            'socket_address': '',
+            'socket_listen': 'false',
+            'socket_token': ''
+        }
+        
+        config['metrics'] = {
+            'enabled': 'false',
+            'path': '/invite_detection/metrics'
+        }
+        
+        config['reputation'] = {
+            'enabled': 'false',
+            'path': 'reputation',
+            'user_threshold': '1',
+            'target_threshold': '3',
+            'reject_known_targets': 'true',
+            'kick_on_join': 'true',
+            'save_interval': '60'
+        }
+        
+        config['journal'] = {
+            'enabled': 'true',
+            'path': 'pending_journal.log',
+            'flush_interval': '0.05',
+            'compact_threshold': '1000'
+        }
+        
+        config['export'] = {
+            'path': 'exports',
+            'max_keys': '100000',
+            'time_bucket': 'day',
+            'top': '10'
         }
         
         with open(config_file_path, 'w', encoding='utf-8') as f:
@@ -116,76 +430,700 @@ class PluginConfig:
 # 创建全局配置实例
 plugin_config = PluginConfig()
 
-async def is_group_admin(bot: Bot, group_id: int, user_id: int) -> bool:
-    """检查用户是否为群管理员"""
+# 运行指标，未启用时计数方法直接返回
+metrics = MetricsRegistry("invite_detection")
+invites_seen = metrics.counter("invites_total", "监控机器人收到的群邀请事件数")
+invites_filtered = metrics.counter("invites_filtered_total", "未触发检测的群邀请事件数", ("reason",))
+invites_detected = metrics.counter("invites_detected_total", "触发检测的群邀请事件数")
+reputation_hits = metrics.counter("reputation_hits_total", "命中信誉库的次数", ("kind",))
+kick_latency = metrics.histogram(
+    "invite_to_kick_seconds", "收到群邀请到踢出邀请者的耗时（跨进程传输时精度为秒）", buckets=END_TO_END_BUCKETS
+)
+api_timer = metrics.time_api_calls(
+    "api_duration_seconds", "OneBot API 调用耗时", "api_errors_total", "OneBot API 调用失败次数"
+)
+metrics.callback(
+    "queue_depth",
+    "各队列中等待处理的条目数",
+    lambda: {
+        ("detection_sender",): detection_sender.queue_depth,
+        ("kick_executor",): kick_executor.pending_count,
+        ("violation_log",): violation_log_writer.pending,
+        ("journal",): action_journal.pending_count,
+    },
+    ("queue",),
+)
+metrics.callback(
+    "kicks_total",
+    "踢人操作结果",
+    lambda: {
+        ("success",): kick_executor.kicks_succeeded,
+        ("failure",): kick_executor.kicks_failed,
+        ("duplicate",): kick_executor.kicks_skipped,
+    },
+    ("result",),
+    kind="counter",
+)
+metrics.callback(
+    "detections_transported_total",
+    "各传输方式交给管理机器人的检测结果数",
+    lambda: {(name,): count for name, count in detection_transport.counts.items()},
+    ("transport",),
+    kind="counter",
+)
+
+def configure_metrics():
+    """根据当前配置启用或停用运行指标"""
+    metrics.configure(plugin_config.metrics_enabled)
+
+configure_metrics()
+
+def record_kick_latency(action: Dict):
+    """记录收到邀请到踢出的耗时"""
+    if not metrics.enabled:
+        return
+    detected_at = action.get('detected_at')
+    if detected_at is None:
+        # 经通讯群或 socket 传输的检测结果只有精确到秒的检测时间
+        try:
+            detected_at = datetime.strptime(action['time'], "%Y-%m-%d %H:%M:%S").timestamp()
+        except (KeyError, TypeError, ValueError):
+            return
+    kick_latency.observe(max(time.time() - detected_at, 0.0))
+
+# 监控群成员索引
+member_index = MemberIndex(call_api=api_timer.call)
+
+# OneBot API 读取缓存
+api_cache = ApiCache(call_api=api_timer.call)
+
+def configure_api_cache():
+    """根据当前配置更新 API 缓存参数"""
+    api_cache.configure(
+        enabled=plugin_config.cache_enabled,
+        max_size=plugin_config.cache_max_size,
+        ttls={
+            'get_group_member_info': plugin_config.cache_member_info_ttl,
+            'get_group_info': plugin_config.cache_group_info_ttl,
+        },
+        negative_ttl=plugin_config.cache_negative_ttl,
+    )
+
+configure_api_cache()
+
+def _close_invite_window(key: Tuple[int, int], count: int, duration: float, record: Optional[Dict]):
+    """邀请去重窗口结束时写入带邀请次数的违规记录"""
+    if count > 1:
+        user_id, monitored_group_id = key
+        logger.info(f"邀请者 {user_id} (监控群 {monitored_group_id}) 在 {duration:.1f} 秒内共发起 {count} 次邀请，已合并为一次检测")
+    if record is not None:
+        record['invite_count'] = count
+        write_violation(record)
+
+# 邀请去重器，键为 (邀请者, 监控群)
+invite_deduplicator = InviteDeduplicator(plugin_config.dedup_window, on_expire=_close_invite_window)
+
+def format_detection_messages(detections: List[Dict]) -> List[str]:
+    """将一批检测结果格式化为要发送的消息"""
+    if plugin_config.detection_format == "legacy":
+        # 旧版文本格式每条消息只能携带一条检测结果
+        return [format_legacy_detection(detection) for detection in detections]
+    return [encode_detections(detections)]
+
+# 未完成操作持久化日志：检测结果和踢人操作完成前记入日志，启动时重放
+action_journal = ActionJournal(Path(__file__).parent / plugin_config.journal_path)
+
+def configure_action_journal():
+    """根据当前配置更新日志写入间隔和重写阈值"""
+    action_journal.configure(
+        flush_interval=plugin_config.journal_flush_interval,
+        compact_threshold=plugin_config.journal_compact_threshold,
+    )
+
+configure_action_journal()
+
+def complete_sent_detections(detections: List[Dict]):
+    """检测消息已发送到通讯群，标记对应的日志条目完成"""
+    for detection in detections:
+        action_journal.done(detection.get('journal_id'))
+
+# 检测消息批量发送器
+detection_sender = DetectionSender(format_detection_messages, on_sent=complete_sent_detections, call_api=api_timer.call)
+
+def configure_detection_sender():
+    """根据当前配置更新检测消息发送参数"""
+    detection_sender.configure(
+        batch_window=plugin_config.sender_batch_window,
+        max_batch_size=plugin_config.sender_max_batch_size,
+        rate=plugin_config.sender_rate,
+        burst=plugin_config.sender_burst,
+        max_retries=plugin_config.sender_max_retries,
+        retry_backoff=plugin_config.sender_retry_backoff,
+    )
+
+configure_detection_sender()
+
+# 监控机器人池：每个监控群由一个所在的监控机器人负责加载成员索引和查询成员信息
+monitor_pool = BotPool("监控", lambda: plugin_config.monitored_groups)
+# 管理机器人池：每个监控群由一个拥有管理员权限的管理机器人负责踢人
+admin_pool = BotPool("管理", lambda: plugin_config.monitored_groups)
+
+def get_monitor_bot(group_id: int) -> Optional[Bot]:
+    """获取负责指定监控群的监控机器人"""
+    owner = monitor_pool.owner(group_id)
+    return get_bots().get(owner) if owner is not None else None
+
+def get_admin_bot(group_id: int) -> Optional[Bot]:
+    """获取负责指定监控群的管理机器人"""
+    bots = get_bots()
+    owner = admin_pool.owner(group_id)
+    if owner is not None and owner in bots:
+        return bots[owner]
+    # 负责的机器人未连接时，退回使用其他已确认在该群拥有管理员权限的机器人；
+    # 都没有时返回 None，操作等待管理机器人连接，不用没有权限的机器人反复重试
+    for self_id in admin_pool.candidates(group_id):
+        if self_id in bots:
+            return bots[self_id]
+    return None
+
+# 成员列表后台同步，由负责各群的监控机器人按限速轮流同步
+member_sync = MemberSyncScheduler(member_index, get_monitor_bot, lambda: plugin_config.monitored_groups)
+
+def member_snapshot_path() -> Optional[Path]:
+    """成员索引快照文件路径，未配置时返回 None"""
+    if not plugin_config.member_index_snapshot:
+        return None
+    return Path(__file__).parent / plugin_config.member_index_snapshot
+
+def configure_member_sync():
+    """根据当前配置更新成员同步参数"""
+    member_sync.configure(
+        interval=plugin_config.member_index_refresh_interval,
+        active_interval=plugin_config.member_index_active_interval,
+        rate=plugin_config.member_index_sync_rate,
+        snapshot_path=member_snapshot_path(),
+        snapshot_max_age=plugin_config.member_index_snapshot_max_age,
+    )
+
+configure_member_sync()
+
+async def load_member_snapshot():
+    """启动时从快照加载成员索引，快照中的群不再在机器人连接时重新获取"""
+    if not plugin_config.member_index_enabled:
+        return
     try:
-        member_info = await bot.get_group_member_info(group_id=group_id, user_id=user_id)
-        role = member_info.get('role', 'member')
-        return role in ['admin', 'owner']
+        await member_sync.load(plugin_config.monitored_groups)
     except Exception as e:
-        logger.error(f"检查管理员权限失败: {e}")
-        return False
+        logger.error(f"加载成员索引快照失败: {e}")
+
+def format_warning_message(actions: List[Dict]) -> str:
+    """生成警告消息，同一窗口内踢出的多名成员合并为一条"""
+    if len(actions) == 1:
+        action = actions[0]
+        if action['target_group'] == REJOIN_TARGET_GROUP:
+            return (
+                f"检测到曾有违规邀请记录的成员 {action['user_card']} ({action['user_id']}) 加入本群，已被移出。"
+                f"请大家注意甄别，不要点击不明群聊邀请，谨防广告与诈骗！"
+            )
+        return (
+            f"检测到违规邀请行为！\n"
+            f"成员：{action['user_card']} ({action['user_id']})\n"
+            f"试图邀请群成员加入外部群聊：{action['target_group_name']} ({action['target_group']})\n"
+            f"已被移出本群。请大家注意甄别，不要点击不明群聊邀请，谨防广告与诈骗！"
+        )
+    
+    if any(action['target_group'] == REJOIN_TARGET_GROUP for action in actions):
+        lines = [f"检测到违规邀请行为！以下 {len(actions)} 名成员试图邀请群成员加入外部群聊或曾有违规邀请记录："]
+    else:
+        lines = [f"检测到违规邀请行为！以下 {len(actions)} 名成员试图邀请群成员加入外部群聊："]
+    for action in actions:
+        if action['target_group'] == REJOIN_TARGET_GROUP:
+            lines.append(f"{action['user_card']} ({action['user_id']}) -> 曾有违规邀请记录，重新入群")
+            continue
+        lines.append(f"{action['user_card']} ({action['user_id']}) -> {action['target_group_name']} ({action['target_group']})")
+    lines.append("以上成员已被移出本群。请大家注意甄别，不要点击不明群聊邀请，谨防广告与诈骗！")
+    return "\n".join(lines)
+
+# 管理机器人踢人执行器
+kick_executor = KickExecutor(
+    get_admin_bot,
+    format_warning_message,
+    state_path=pending_actions_path,
+    on_kicked=record_kick_latency,
+    journal=action_journal,
+    call_api=api_timer.call,
+)
+
+def configure_kick_executor():
+    """根据当前配置更新踢人执行参数"""
+    kick_executor.configure(
+        merge_window=plugin_config.executor_merge_window,
+        max_retries=plugin_config.executor_max_retries,
+        retry_backoff=plugin_config.executor_retry_backoff,
+        kicked_ttl=plugin_config.executor_kicked_ttl,
+    )
+
+configure_kick_executor()
+
+def receive_detections(detections: List[Dict]):
+    """管理端接收检测结果，加入踢人队列，由执行器按群并行执行"""
+    for detection_data in detections:
+        logger.info(
+            f"解析成功 - 监控群: {detection_data['monitor_group']}, "
+            f"用户: {detection_data['user_id']}, 目标群: {detection_data['target_group']}"
+        )
+        # 监控端的日志条目 id 不属于踢人操作，由执行器重新记入日志
+        detection_data.pop('journal_id', None)
+        kick_executor.submit(detection_data)
 
-async def find_user_in_monitored_groups(bot: Bot, user_id: int) -> Optional[int]:
-    """检查用户是否在任何监控群中，返回找到的群号"""
-    for group_id in plugin_config.monitored_groups:
+# 检测结果传输：进程内 -> 本地 socket -> 通讯群，依次回退
+local_transport = LocalTransport(
+    receive_detections,
+    lambda detections: all(get_admin_bot(int(d['monitor_group'])) is not None for d in detections),
+)
+socket_transport = SocketTransport("")
+group_transport = GroupTransport(detection_sender, lambda: plugin_config.communication_group)
+detection_transport = TransportRouter()
+socket_server: Optional[SocketServer] = None
+
+def configure_transport():
+    """根据当前配置选择检测结果传输方式，通讯群始终作为最终回退"""
+    socket_transport.configure(plugin_config.transport_socket_address, plugin_config.transport_socket_token)
+    transports = []
+    if plugin_config.transport_mode in ("auto", "local"):
+        transports.append(local_transport)
+    if plugin_config.transport_mode in ("auto", "socket") and plugin_config.transport_socket_address:
+        transports.append(socket_transport)
+    transports.append(group_transport)
+    detection_transport.configure(transports)
+
+configure_transport()
+
+async def start_socket_server():
+    """按配置启动或重启本地 socket 服务（管理机器人所在进程）"""
+    global socket_server
+    address = plugin_config.transport_socket_address if plugin_config.transport_socket_listen else ""
+    if socket_server is not None:
+        if socket_server.address == address and socket_server.token == plugin_config.transport_socket_token:
+            return
+        await socket_server.stop()
+        socket_server = None
+    if not address:
+        return
+    server = SocketServer(address, receive_detections, plugin_config.transport_socket_token)
+    try:
+        await server.start()
+        socket_server = server
+    except Exception as e:
+        logger.error(f"启动检测结果 socket 服务失败: {e}")
+
+async def dispatch_detection(self_id: str, detection: Dict, journal_id: Optional[int] = None) -> Optional[str]:
+    """将检测结果记入未完成操作日志后交给管理机器人，返回实际使用的传输方式
+
+    经 socket 传输时在收到管理端的确认后、经通讯群传输时在消息实际发出后才标记日志条目完成；
+    全部传输方式失败时条目保留，下次启动时重新处理。
+    """
+    if journal_id is None:
+        journal_id = action_journal.add(KIND_DETECTION, detection)
+    if journal_id is not None:
+        detection = {**detection, 'journal_id': journal_id}
+    transport_name = await detection_transport.send(self_id, [detection])
+    if transport_name is not None and transport_name != group_transport.name:
+        action_journal.done(journal_id)
+    return transport_name
+
+# 从未完成操作日志恢复、等待负责的机器人连接后重新处理的条目
+journal_backlog: List[Entry] = []
+
+async def open_action_journal():
+    """按配置打开或关闭未完成操作日志，打开时重放上次未完成的条目"""
+    if action_journal.opened and not plugin_config.journal_enabled:
+        await action_journal.close()
+        journal_backlog.clear()
+    if not plugin_config.journal_enabled:
+        return
+    path = Path(__file__).parent / plugin_config.journal_path
+    if action_journal.opened:
+        if action_journal.path != path:
+            logger.warning("未完成操作日志路径的修改需要重启 NoneBot 后生效")
+        return
+    action_journal.path = path
+    try:
+        journal_backlog.extend(await action_journal.open())
+    except Exception as e:
+        logger.error(f"打开未完成操作日志失败: {e}")
+        return
+    await resume_journal_backlog()
+
+async def resume_journal_backlog():
+    """重新处理已有负责机器人的恢复条目，其余条目继续等待机器人连接"""
+    if not journal_backlog:
+        return
+    entries = journal_backlog[:]
+    journal_backlog.clear()
+    for entry in entries:
+        entry_id, kind, data = entry
         try:
-            member_info = await bot.get_group_member_info(group_id=group_id, user_id=user_id)
+            group_id = int(data['monitor_group'])
+        except (KeyError, TypeError, ValueError):
+            group_id = None
+        if kind not in (KIND_DETECTION, KIND_KICK) or group_id not in plugin_config.monitored_group_set:
+            logger.warning(f"未完成操作日志条目 {entry_id} 已不属于任何监控群，丢弃")
+            action_journal.done(entry_id)
+        elif kind == KIND_KICK:
+            if get_admin_bot(group_id) is None:
+                journal_backlog.append(entry)
+            else:
+                kick_executor.submit(data, journal_id=entry_id)
+        else:
+            # 检测结果由负责该群的监控机器人重新发送，没有时由负责的管理机器人发送
+            self_id = monitor_pool.owner(group_id) or admin_pool.owner(group_id)
+            if self_id is None:
+                journal_backlog.append(entry)
+            elif await dispatch_detection(self_id, data, entry_id) is None:
+                journal_backlog.append(entry)
+    resumed = len(entries) - len(journal_backlog)
+    if resumed:
+        logger.info(f"已重新处理 {resumed} 个未完成的操作，{len(journal_backlog)} 个等待机器人连接")
+
+# 违规日志后台写入器
+violation_log_writer = ViolationLogWriter(log_file_path)
+
+# [violation_log] 节的配置项；log_level 属于 [settings] 节，不影响违规日志
+VIOLATION_LOG_SETTINGS = frozenset({
+    'log_batch_size', 'log_flush_interval', 'log_max_size_mb', 'log_rotate_daily',
+    'log_compress', 'log_backend', 'log_sqlite_path',
+})
+
+def configure_violation_log_writer():
+    """根据当前配置更新违规日志写入参数"""
+    violation_log_writer.configure(
+        batch_size=plugin_config.log_batch_size,
+        flush_interval=plugin_config.log_flush_interval,
+        max_bytes=int(plugin_config.log_max_size_mb * 1024 * 1024),
+        rotate_daily=plugin_config.log_rotate_daily,
+        compress=plugin_config.log_compress,
+    )
+
+configure_violation_log_writer()
+
+# 违规记录数据库，仅在 backend 配置为 sqlite 或 both 时启用
+violation_store: Optional[ViolationStore] = None
+
+def text_log_enabled() -> bool:
+    """是否写入文本违规日志"""
+    return plugin_config.log_backend in ("text", "both")
+
+def sqlite_store_enabled() -> bool:
+    """是否写入违规记录数据库"""
+    return plugin_config.log_backend in ("sqlite", "both")
+
+async def open_violation_store():
+    """按配置打开违规记录数据库，不再使用数据库时将其关闭"""
+    global violation_store
+    if not sqlite_store_enabled():
+        if violation_store is not None:
+            await violation_store.close()
+            violation_store = None
+            logger.info("违规记录数据库已关闭")
+        return
+    db_path = Path(__file__).parent / plugin_config.log_sqlite_path
+    if violation_store is not None and violation_store.path != db_path:
+        await violation_store.close()
+        violation_store = None
+    if violation_store is None:
+        violation_store = ViolationStore(
+            db_path,
+            batch_size=plugin_config.log_batch_size,
+            flush_interval=plugin_config.log_flush_interval,
+        )
+    try:
+        await violation_store.open()
+    except Exception as e:
+        logger.error(f"打开违规记录数据库失败: {e}")
+
+# 违规用户与广告群信誉库，仅在启用时打开
+reputation_store = ReputationStore(Path(__file__).parent / plugin_config.reputation_path)
+
+def configure_reputation_store():
+    """根据当前配置更新信誉库阈值和保存间隔"""
+    reputation_store.configure(
+        user_threshold=plugin_config.reputation_user_threshold,
+        target_threshold=plugin_config.reputation_target_threshold,
+        save_interval=plugin_config.reputation_save_interval,
+    )
+
+configure_reputation_store()
+
+async def rebuild_reputation_store() -> Tuple[int, int]:
+    """根据历史违规记录重建信誉库，优先使用数据库，返回 (用户数, 目标群数)"""
+    if sqlite_store_enabled() and violation_store is not None:
+        users, targets = await violation_store.offender_counts()
+    else:
+        await violation_log_writer.flush()
+        records = ((record['user_id'], record['target_group']) for record in iter_text_log(log_file_path))
+        users, targets = await asyncio.to_thread(count_offenders, records)
+    return await reputation_store.rebuild(dict(users), dict(targets))
+
+async def open_reputation_store():
+    """按配置打开或关闭信誉库，首次打开时根据历史违规记录建立"""
+    global reputation_store
+    directory = Path(__file__).parent / plugin_config.reputation_path
+    if reputation_store.opened and (not plugin_config.reputation_enabled or reputation_store.directory != directory):
+        await reputation_store.close()
+    if not plugin_config.reputation_enabled:
+        return
+    if reputation_store.directory != directory:
+        reputation_store = ReputationStore(directory)
+        configure_reputation_store()
+    if reputation_store.opened:
+        return
+    try:
+        build = not reputation_store.exists
+        reputation_store.open()
+        if build:
+            users, targets = await rebuild_reputation_store()
+            logger.info(f"已根据历史违规记录建立信誉库: {users} 名用户, {targets} 个目标群")
+    except Exception as e:
+        logger.error(f"打开信誉库失败: {e}")
+
+async def locate_user_in_monitored_groups(bot: Bot, user_id: int) -> Optional[Tuple[int, Dict]]:
+    """检查用户是否在任何监控群中，返回 (群号, 成员信息)；索引命中时成员信息只包含角色"""
+    groups_to_probe = plugin_config.monitored_groups
+    if plugin_config.member_index_enabled:
+        hit = member_index.find(user_id, plugin_config.monitored_group_order)
+        if hit:
+            logger.info(f"用户 {user_id} 在监控群 {hit[0]} 中 (索引命中)")
+            return hit[0], {'role': hit[1]}
+        # 仅对尚未加载索引的群发起查询
+        groups_to_probe = member_index.pending_groups(plugin_config.monitored_groups)
+
+    if plugin_config.probe_concurrency > 1 and len(groups_to_probe) > 1:
+        return await probe_groups_concurrently(bot, user_id, groups_to_probe)
+
+    for group_id in groups_to_probe:
+        try:
+            member_info = await probe_group_member(bot, group_id, user_id)
             if member_info:  # 如果能获取到成员信息，说明用户在该群中
                 logger.info(f"用户 {user_id} 在监控群 {group_id} 中")
-                return group_id
+                return group_id, member_info
         except Exception as e:
             # 用户不在该群中或其他错误，继续检查下一个群
             logger.debug(f"用户 {user_id} 不在群 {group_id} 中: {e}")
             continue
     return None
 
-async def log_violation(user_id: int, group_id: int, user_card: str, nickname: str):
-    """记录违规行为到日志文件"""
+async def probe_group_member(bot: Bot, group_id: int, user_id: int) -> Dict:
+    """带超时地查询单个群的成员信息，用户不在群中时抛出异常"""
+    # 优先使用负责该群的监控机器人，收到邀请的机器人不一定在该群中
+    bot = get_monitor_bot(group_id) or bot
+    call = api_cache.call(bot, 'get_group_member_info', group_id=group_id, user_id=user_id)
+    if plugin_config.probe_timeout > 0:
+        return await asyncio.wait_for(call, plugin_config.probe_timeout)
+    return await call
+
+async def probe_groups_concurrently(bot: Bot, user_id: int, group_ids: List[int]) -> Optional[Tuple[int, Dict]]:
+    """并发查询多个群，首个命中即返回并取消其余查询"""
+    semaphore = asyncio.Semaphore(plugin_config.probe_concurrency)
+
+    async def _probe(group_id: int) -> Tuple[int, Dict]:
+        async with semaphore:
+            return group_id, await probe_group_member(bot, group_id, user_id)
+
+    tasks = [asyncio.create_task(_probe(group_id)) for group_id in group_ids]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            try:
+                group_id, member_info = await finished
+            except Exception as e:
+                logger.debug(f"用户 {user_id} 不在某个监控群中: {e}")
+                continue
+            if member_info:
+                logger.info(f"用户 {user_id} 在监控群 {group_id} 中")
+                return group_id, member_info
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None
+
+# 规则与处理器之间传递邀请上下文使用的 state 键
+INVITE_CONTEXT_KEY = "invite_context"
+# 去重窗口内重复邀请的序号，存在时处理器只拒绝邀请，不再执行检测
+INVITE_REPEAT_KEY = "invite_repeat"
+# 目标群为已知广告群，值为收到邀请的时间；处理器先拒绝邀请，再判断是否踢出邀请者
+INVITE_KNOWN_TARGET_KEY = "invite_known_target"
+
+@dataclass
+class InviteContext:
+    """一次群邀请事件解析后的上下文，规则中解析一次，处理器直接使用"""
+    user_id: int
+    monitored_group_id: int
+    role: str
+    user_card: str
+    nickname: str
+    target_group_id: int
+    target_group_name: str
+    # 收到邀请的时间，仅在启用运行指标时记录
+    received_at: Optional[float] = None
+
+async def resolve_invite_context(
+    bot: Bot, event: GroupRequestEvent, monitored_group_id: int, member_info: Dict
+) -> InviteContext:
+    """补全邀请上下文，每个 OneBot API 最多调用一次"""
+    user_id = event.user_id
+    target_group_id = event.group_id
+
+    # 索引命中时尚无群名片和昵称，需要查询一次成员信息
+    if 'nickname' not in member_info:
+        try:
+            member_info = {
+                **member_info,
+                **await api_cache.call(
+                    get_monitor_bot(monitored_group_id) or bot,
+                    'get_group_member_info',
+                    group_id=monitored_group_id,
+                    user_id=user_id,
+                ),
+            }
+        except Exception as e:
+            logger.error(f"获取用户信息失败: {e}")
+    user_card = member_info.get('card', '') or member_info.get('nickname', str(user_id))
+    nickname = member_info.get('nickname', str(user_id))
+
+    # 获取目标群信息
+    target_group_name = "未知群聊"
+    try:
+        target_group_info = await api_cache.call(bot, 'get_group_info', group_id=target_group_id)
+        target_group_name = target_group_info.get('group_name', f"群{target_group_id}")
+    except Exception as e:
+        logger.debug(f"无法获取目标群信息: {e}")
+
+    return InviteContext(
+        user_id=user_id,
+        monitored_group_id=monitored_group_id,
+        role=member_info.get('role', 'member'),
+        user_card=user_card,
+        nickname=nickname,
+        target_group_id=target_group_id,
+        target_group_name=target_group_name,
+    )
+
+def violation_record(
+    user_id: int,
+    group_id: int,
+    user_card: str,
+    nickname: str,
+    target_group_id: Optional[int] = None,
+    target_group_name: Optional[str] = None,
+    action: str = 'KICKED_FOR_INVITE',
+) -> Dict:
+    """构造一条违规记录，时间为当前时间"""
+    return {
+        'ts': int(time.time()),
+        'user_id': user_id,
+        'monitor_group': group_id,
+        'target_group': target_group_id,
+        'target_group_name': target_group_name,
+        'user_card': user_card,
+        'nickname': nickname,
+        'action': action,
+        'invite_count': 1,
+    }
+
+def write_violation(record: Dict):
+    """将违规记录写入日志文件和/或数据库（由后台任务批量写入）"""
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} | Group: {group_id} | User: {user_id} | Card: {user_card} | Nickname: {nickname} | Action: KICKED_FOR_INVITE\n"
+        if text_log_enabled():
+            timestamp = datetime.fromtimestamp(record['ts']).strftime("%Y-%m-%d %H:%M:%S")
+            log_entry = (
+                f"{timestamp} | Group: {record['monitor_group']} | User: {record['user_id']} | "
+                f"Card: {record['user_card']} | Nickname: {record['nickname']} | Action: {record['action']}"
+            )
+            if record['target_group'] is not None:
+                log_entry += f" | TargetGroup: {record['target_group']}"
+            if record['target_group_name']:
+                log_entry += f" | TargetGroupName: {record['target_group_name']}"
+            if record['invite_count'] > 1:
+                log_entry += f" | Invites: {record['invite_count']}"
+            violation_log_writer.write(log_entry + "\n")
         
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
+        if sqlite_store_enabled() and violation_store is not None:
+            violation_store.add(record)
             
-        logger.info(f"违规记录已保存: {user_id} in {group_id}")
+        logger.info(f"违规记录已保存: {record['user_id']} in {record['monitor_group']}")
     except Exception as e:
         logger.error(f"保存违规日志失败: {e}")
 
+async def log_violation(
+    user_id: int,
+    group_id: int,
+    user_card: str,
+    nickname: str,
+    target_group_id: Optional[int] = None,
+    target_group_name: Optional[str] = None,
+    action: str = 'KICKED_FOR_INVITE',
+):
+    """记录违规行为到日志文件和/或数据库（由后台任务批量写入）"""
+    write_violation(violation_record(user_id, group_id, user_card, nickname, target_group_id, target_group_name, action))
+
+async def evaluate_invite(bot: BaseBot, event: GroupRequestEvent, state: T_State, received_at: Optional[float]) -> bool:
+    """判断邀请者是否需要踢出，需要时把邀请上下文写入 state"""
+    # 检查邀请者是否在任何监控群中
+    located = await locate_user_in_monitored_groups(bot, event.user_id)
+    if not located:
+        invites_filtered.inc("not_member")
+        logger.debug(f"邀请者 {event.user_id} 不在任何监控群中，跳过处理")
+        return False
+    monitored_group_id, member_info = located
+    
+    # 检查邀请者是否为监控群的管理员
+    if member_info.get('role', 'member') in ADMIN_ROLES:
+        invites_filtered.inc("admin")
+        logger.info(f"邀请者 {event.user_id} 是监控群 {monitored_group_id} 的管理员，跳过处理")
+        return False
+    
+    # 同一邀请者在去重窗口内的后续邀请不再重复检测
+    count = invite_deduplicator.hit((event.user_id, monitored_group_id))
+    if count > 1:
+        invites_filtered.inc("duplicate")
+        logger.debug(f"邀请者 {event.user_id} 在去重窗口内的第 {count} 次邀请，合并处理")
+        state[INVITE_REPEAT_KEY] = count
+        return True
+    
+    # 解析一次邀请上下文，通过 state 传递给处理器
+    invites_detected.inc()
+    context = await resolve_invite_context(bot, event, monitored_group_id, member_info)
+    context.received_at = received_at
+    state[INVITE_CONTEXT_KEY] = context
+    return True
+
 def create_invite_rule() -> Rule:
     """创建群邀请事件规则"""
-    async def _rule(event: GroupRequestEvent) -> bool:
-        # 检查插件是否启用
-        if not plugin_config.enabled:
+    # 参数使用基类注解，避免 NoneBot 每次调用都对事件和机器人做类型校验
+    async def _rule(bot: BaseBot, event: Event, state: T_State) -> bool:
+        # 快速路径：只做类型判断和整数、字符串常量比较，不分配对象、不等待
+        config = plugin_config
+        if not isinstance(event, GroupRequestEvent) or event.self_id not in config.monitor_bot_int_set:
             return False
         
         # 检查是否为群邀请事件
-        if event.request_type != "group" or event.sub_type != "invite":
-            return False
-        
-        # 检查是否为监控机器人接收的事件
-        if str(event.self_id) != plugin_config.monitor_bot_id:
+        if event.sub_type != "invite" or event.request_type != "group":
             return False
+        invites_seen.inc()
+        received_at = time.time() if metrics.enabled else None
         
-        # 检查邀请者是否在任何监控群中
-        try:
-            bot = nonebot.get_bot(str(event.self_id))
-        except Exception as e:
-            logger.error(f"无法获取监控机器人实例 {event.self_id}: {e}")
-            return False
-            
-        monitored_group_id = await find_user_in_monitored_groups(bot, event.user_id)
-        if not monitored_group_id:
-            logger.debug(f"邀请者 {event.user_id} 不在任何监控群中，跳过处理")
+        # 检查插件是否启用
+        if not config.enabled:
+            invites_filtered.inc("disabled")
             return False
         
-        # 检查邀请者是否为监控群的管理员
-        if await is_group_admin(bot, monitored_group_id, event.user_id):
-            logger.info(f"邀请者 {event.user_id} 是监控群 {monitored_group_id} 的管理员，跳过处理")
-            return False
+        # 目标群是已知的广告群：不等待成员查询，交给处理器立即拒绝
+        if config.reputation_enabled and config.reputation_reject_known_targets and reputation_store.is_bad_target(event.group_id):
+            reputation_hits.inc("target")
+            state[INVITE_KNOWN_TARGET_KEY] = received_at
+            return True
         
-        return True
+        return await evaluate_invite(bot, event, state, received_at)
     
     return Rule(_rule)
 
@@ -193,107 +1131,108 @@ def create_invite_rule() -> Rule:
 group_invite_handler = on_request(rule=create_invite_rule(), priority=5)
 
 @group_invite_handler.handle()
-async def handle_group_invite(event: GroupRequestEvent):
+async def handle_group_invite(bot: Bot, event: GroupRequestEvent, state: T_State):
     """处理群邀请事件 - 监控机器人发送检测消息"""
+    known_target = INVITE_KNOWN_TARGET_KEY in state
+    if known_target:
+        logger.info(f"群邀请的目标群 {event.group_id} 是已知的广告群，直接拒绝")
+        await reject_group_invite(bot, event, force=True)
+        if not await evaluate_invite(bot, event, state, state[INVITE_KNOWN_TARGET_KEY]):
+            return
+    
+    if INVITE_REPEAT_KEY in state:
+        # 重复邀请已合并到首次检测中，只需按配置拒绝
+        if not known_target:
+            await reject_group_invite(bot, event)
+        return
+    
     try:
-        target_group_id = event.group_id  # 被邀请的目标群
-        user_id = event.user_id
+        context: InviteContext = state[INVITE_CONTEXT_KEY]
+        monitor_bot = bot
+        target_group_id = context.target_group_id  # 被邀请的目标群
+        target_group_name = context.target_group_name
+        monitored_group_id = context.monitored_group_id
+        user_id = context.user_id
+        user_card = context.user_card
+        nickname = context.nickname
         
         logger.info(f"检测到群邀请事件: 用户{user_id}被邀请到群{target_group_id}")
-        
-        # 获取监控机器人实例
-        try:
-            monitor_bot = nonebot.get_bot(plugin_config.monitor_bot_id)
-        except Exception as e:
-            logger.error(f"无法找到监控机器人 {plugin_config.monitor_bot_id}: {e}")
-            # 尝试从所有连接的机器人中查找
-            bots = nonebot.get_bots()
-            monitor_bot = bots.get(plugin_config.monitor_bot_id)
-            if not monitor_bot:
-                logger.error(f"监控机器人 {plugin_config.monitor_bot_id} 未连接")
-                return
-        
-        # 找到邀请者所在的监控群
-        monitored_group_id = await find_user_in_monitored_groups(monitor_bot, user_id)
-        if not monitored_group_id:
-            logger.error(f"无法找到邀请者 {user_id} 所在的监控群")
-            return
-        
         logger.info(f"邀请者 {user_id} 在监控群 {monitored_group_id} 中，将发送检测消息")
+        if plugin_config.member_index_enabled:
+            # 出现违规邀请的群更早重新同步成员列表
+            member_sync.touch(monitored_group_id)
         
-        # 获取用户在监控群中的信息
-        try:
-            member_info = await monitor_bot.get_group_member_info(group_id=monitored_group_id, user_id=user_id)
-            user_card = member_info.get('card', '') or member_info.get('nickname', str(user_id))
-            nickname = member_info.get('nickname', str(user_id))
-        except Exception as e:
-            logger.error(f"获取用户信息失败: {e}")
-            user_card = str(user_id)
-            nickname = str(user_id)
-        
-        # 获取目标群信息
-        target_group_name = "未知群聊"
-        try:
-            target_group_info = await monitor_bot.get_group_info(group_id=target_group_id)
-            target_group_name = target_group_info.get('group_name', f"群{target_group_id}")
-        except Exception as e:
-            logger.debug(f"无法获取目标群信息: {e}")
+        # 记录违规日志（记录监控群信息）；处于去重窗口中时，窗口结束后连同邀请次数一起写入
+        record = violation_record(user_id, monitored_group_id, user_card, nickname, target_group_id, target_group_name)
+        if not invite_deduplicator.defer((user_id, monitored_group_id), record):
+            write_violation(record)
+        if plugin_config.reputation_enabled:
+            reputation_store.record(user_id, target_group_id)
         
-        # 记录违规日志（记录监控群信息）
-        await log_violation(user_id, monitored_group_id, user_card, nickname)
-        
-        # 检查是否配置了通讯群
-        if not plugin_config.communication_group:
-            logger.error("未配置通讯群，无法发送检测消息")
-            return
-        
-        # 构造检测消息 (Unix日志格式)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        detection_message = (
-            f"InvalidGroupInvitationDetect | "
-            f"Time: {timestamp} | "
-            f"MonitorGroup: {monitored_group_id} | "
-            f"User: {user_id} | "
-            f"Card: {user_card} | "
-            f"Nickname: {nickname} | "
-            f"TargetGroup: {target_group_id} | "
-            f"TargetGroupName: {target_group_name}"
-        )
+        # 构造检测消息
+        detection = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'monitor_group': monitored_group_id,
+            'user_id': user_id,
+            'user_card': user_card,
+            'nickname': nickname,
+            'target_group': target_group_id,
+            'target_group_name': target_group_name,
+        }
+        if context.received_at is not None:
+            # 只在进程内移交时保留，用于统计收到邀请到踢出的耗时
+            detection['detected_at'] = context.received_at
         
-        # 在通讯群发送检测消息
-        try:
-            await monitor_bot.send_group_msg(group_id=plugin_config.communication_group, message=detection_message)
-            logger.info(f"检测消息已发送到通讯群 {plugin_config.communication_group}")
-        except Exception as e:
-            logger.error(f"发送检测消息失败: {e}")
+        # 交给管理机器人：同进程直接移交，否则经本地 socket 或通讯群传输
+        transport_name = await dispatch_detection(str(monitor_bot.self_id), detection)
+        if transport_name is None:
+            logger.error("没有可用的检测结果传输方式，请检查通讯群或 socket 配置")
+        else:
+            logger.info(f"检测结果已通过 {transport_name} 方式交给管理机器人")
         
         # 如果配置了拒绝加群申请，则拒绝该邀请
-        if plugin_config.reject_add_request:
-            try:
-                await monitor_bot.set_group_add_request(
-                    flag=event.flag,
-                    approve=False,
-                    reason="检测到可疑邀请行为"
-                )
-                logger.info(f"已拒绝群邀请申请: {event.flag}")
-            except Exception as e:
-                logger.error(f"拒绝群邀请申请失败: {e}")
-                logger.error(f"尝试调用的API: set_group_add_request(flag={event.flag}, approve=False)")
+        if not known_target:
+            await reject_group_invite(monitor_bot, event)
     
     except Exception as e:
         logger.error(f"处理群邀请事件时发生错误: {e}")
 
+async def reject_group_invite(bot: Bot, event: GroupRequestEvent, force: bool = False):
+    """如果配置了拒绝加群申请（或 force 为真），则拒绝该邀请"""
+    if not plugin_config.reject_add_request and not force:
+        return
+    try:
+        await api_timer.call(
+            bot,
+            'set_group_add_request',
+            flag=event.flag,
+            approve=False,
+            reason="检测到可疑邀请行为"
+        )
+        logger.info(f"已拒绝群邀请申请: {event.flag}")
+    except Exception as e:
+        logger.error(f"拒绝群邀请申请失败: {e}")
+        logger.error(f"尝试调用的API: set_group_add_request(flag={event.flag}, approve=False)")
+
 # 插件加载时的初始化
 @nonebot.get_driver().on_startup
 async def startup():
     """插件启动时的初始化"""
     logger.info("群邀请监控插件已加载")
+    violation_log_writer.start()
+    await open_violation_store()
+    await open_reputation_store()
+    await load_member_snapshot()
+    await open_action_journal()
+    kick_executor.load()
+    await start_socket_server()
+    start_config_watcher()
     
     if not plugin_config.enabled:
         logger.warning("插件已禁用，请在配置文件中启用")
         return
     
-    if not plugin_config.monitor_bot_id or not plugin_config.admin_bot_id:
+    if not plugin_config.monitor_bot_ids or not plugin_config.admin_bot_ids:
         logger.error("机器人ID配置不完整，请检查配置文件")
         return
     
@@ -305,39 +1244,233 @@ async def startup():
         logger.warning("未配置通讯群，分布式模式将无法正常工作")
     
     logger.info(f"插件配置完成:")
-    logger.info(f"  监控机器人: {plugin_config.monitor_bot_id}")
-    logger.info(f"  管理机器人: {plugin_config.admin_bot_id}")
+    logger.info(f"  监控机器人: {plugin_config.monitor_bot_ids}")
+    logger.info(f"  管理机器人: {plugin_config.admin_bot_ids}")
     logger.info(f"  监控群聊: {plugin_config.monitored_groups}")
     logger.info(f"  通讯群聊: {plugin_config.communication_group}")
     
     # 分布式部署模式下，机器人连接状态将在连接时实时显示
 
+def log_pool_changes(pool: BotPool, changes: Dict[int, Optional[str]]):
+    """记录监控群归属变化"""
+    for group_id, owner in changes.items():
+        if owner is None:
+            logger.warning(f"监控群 {group_id} 暂无可用的{pool.name}机器人")
+        else:
+            logger.info(f"监控群 {group_id} 已分配给{pool.name}机器人 {owner}")
+
+async def apply_monitor_changes(changes: Dict[int, Optional[str]]):
+    """监控群归属变化后更新成员索引"""
+    log_pool_changes(monitor_pool, changes)
+    if not plugin_config.member_index_enabled:
+        return
+    for group_id, owner in changes.items():
+        # 没有监控机器人在群中时收不到成员变动通知，索引不再可信
+        if owner is None:
+            member_index.drop_group(group_id)
+    pending = [group_id for group_id, owner in changes.items() if owner is not None and not member_index.is_ready(group_id)]
+    if pending:
+        await member_index.build(get_monitor_bot, pending)
+    if not monitor_pool.bots:
+        member_sync.stop()
+    else:
+        member_sync.start()
+
+def merge_capable(pool: BotPool, self_id: str, checked: List[int], capable: List[int]) -> List[int]:
+    """用本次检查的结果更新机器人原有的可负责群，未检查的群保持不变"""
+    previous = pool.capable_groups(self_id) & plugin_config.monitored_group_set
+    return sorted((previous - set(checked)) | set(capable))
+
+async def register_monitor_bot(bot: Bot, group_ids: Optional[List[int]] = None):
+    """登记监控机器人所在的监控群，group_ids 为空时检查所有监控群"""
+    self_id = str(bot.self_id)
+    checked = list(plugin_config.monitored_groups if group_ids is None else group_ids)
+    try:
+        group_list = await api_timer.call(bot, 'get_group_list')
+        joined = {int(group['group_id']) for group in group_list if 'group_id' in group}
+        groups = [group_id for group_id in checked if group_id in joined]
+    except Exception as e:
+        logger.warning(f"获取监控机器人 {self_id} 的群列表失败，按所有监控群处理: {e}")
+        groups = checked
+    await apply_monitor_changes(monitor_pool.set_capable(self_id, merge_capable(monitor_pool, self_id, checked, groups)))
+
+async def register_admin_bot(bot: Bot, group_ids: Optional[List[int]] = None):
+    """登记管理机器人拥有管理员权限的监控群，group_ids 为空时检查所有监控群"""
+    self_id = str(bot.self_id)
+    checked = list(plugin_config.monitored_groups if group_ids is None else group_ids)
+    semaphore = asyncio.Semaphore(max(plugin_config.probe_concurrency, 1))
+
+    async def _is_admin(group_id: int) -> bool:
+        async with semaphore:
+            try:
+                member_info = await api_timer.call(bot, 'get_group_member_info', group_id=group_id, user_id=int(self_id), no_cache=True)
+                return member_info.get('role') in ADMIN_ROLES
+            except Exception as e:
+                logger.debug(f"查询管理机器人 {self_id} 在群 {group_id} 的权限失败: {e}")
+                return False
+
+    results = await asyncio.gather(*(_is_admin(group_id) for group_id in checked))
+    groups = [group_id for group_id, is_admin in zip(checked, results) if is_admin]
+    missing = [group_id for group_id, is_admin in zip(checked, results) if not is_admin]
+    if missing:
+        logger.warning(f"管理机器人 {self_id} 在以下监控群中没有管理员权限: {missing}")
+    log_pool_changes(admin_pool, admin_pool.set_capable(self_id, merge_capable(admin_pool, self_id, checked, groups)))
+
 @nonebot.get_driver().on_bot_connect
 async def check_bot_connection(bot: Bot):
     """机器人连接时检查"""
-    # 检查是否为配置的机器人
-    if str(bot.self_id) == plugin_config.monitor_bot_id:
-        logger.info(f"✓ 监控机器人 {bot.self_id} 已连接")
-    elif str(bot.self_id) == plugin_config.admin_bot_id:
-        logger.info(f"✓ 管理机器人 {bot.self_id} 已连接")
-    else:
-        logger.debug(f"机器人已连接: {bot.self_id} (非插件配置机器人)")
+    # 检查是否为配置的机器人，同一账号可以同时作为监控机器人和管理机器人
+    self_id = str(bot.self_id)
+    if self_id in plugin_config.monitor_bot_set:
+        logger.info(f"✓ 监控机器人 {self_id} 已连接")
+        await register_monitor_bot(bot)
+    if self_id in plugin_config.admin_bot_set:
+        logger.info(f"✓ 管理机器人 {self_id} 已连接")
+        await register_admin_bot(bot)
+    if not plugin_config.is_bot(self_id):
+        logger.debug(f"机器人已连接: {self_id} (非插件配置机器人)")
+    # 负责的机器人连接后，重新处理从日志或文件恢复的未完成操作
+    await resume_journal_backlog()
+    kick_executor.resume()
 
 @nonebot.get_driver().on_bot_disconnect
 async def on_bot_disconnect(bot: Bot):
-    """机器人断开连接时记录"""
-    if str(bot.self_id) == plugin_config.monitor_bot_id:
-        logger.warning(f"✗ 监控机器人 {bot.self_id} 已断开连接！")
-    elif str(bot.self_id) == plugin_config.admin_bot_id:
-        logger.warning(f"✗ 管理机器人 {bot.self_id} 已断开连接！")
-    else:
-        logger.debug(f"机器人已断开: {bot.self_id} (非插件配置机器人)")
+    """机器人断开连接时将其负责的群转移给其他机器人"""
+    self_id = str(bot.self_id)
+    if self_id in monitor_pool.bots:
+        logger.warning(f"✗ 监控机器人 {self_id} 已断开连接！")
+        await apply_monitor_changes(monitor_pool.remove_bot(self_id))
+    if self_id in admin_pool.bots:
+        logger.warning(f"✗ 管理机器人 {self_id} 已断开连接！")
+        log_pool_changes(admin_pool, admin_pool.remove_bot(self_id))
+    if not plugin_config.is_bot(self_id):
+        logger.debug(f"机器人已断开: {self_id} (非插件配置机器人)")
 
 @nonebot.get_driver().on_shutdown
 async def shutdown():
     """插件关闭时的清理"""
+    stop_config_watcher()
+    member_sync.stop()
+    if plugin_config.member_index_enabled:
+        try:
+            await member_sync.save()
+        except Exception as e:
+            logger.error(f"保存成员索引快照失败: {e}")
+    if socket_server is not None:
+        await socket_server.stop()
+    await detection_transport.stop()
+    await detection_sender.stop()
+    await kick_executor.stop()
+    # 未完成的检测结果和踢人操作保留在日志中，下次启动时重放
+    await action_journal.close()
+    # 关闭去重窗口，写入尚未写入的违规记录，再确保排队中的违规日志全部落盘
+    invite_deduplicator.close_all()
+    await violation_log_writer.stop()
+    if violation_store is not None:
+        await violation_store.close()
+    if reputation_store.opened:
+        await reputation_store.close()
     logger.info("群邀请监控插件已卸载")
 
+# 成员变动通知规则关心的事件类型
+MEMBER_NOTICE_TYPES = (GroupIncreaseNoticeEvent, GroupDecreaseNoticeEvent, GroupAdminNoticeEvent)
+
+def is_self_notice(event: GroupIncreaseNoticeEvent | GroupDecreaseNoticeEvent | GroupAdminNoticeEvent) -> bool:
+    """通知是否与收到通知的机器人自身有关"""
+    return event.user_id == event.self_id or event.sub_type == "kick_me"
+
+def create_member_notice_rule() -> Rule:
+    """创建监控群成员变动通知规则"""
+    async def _rule(event: Event) -> bool:
+        config = plugin_config
+        if not isinstance(event, MEMBER_NOTICE_TYPES):
+            return False
+        if event.self_id not in config.monitor_bot_int_set and event.self_id not in config.admin_bot_int_set:
+            return False
+        # 机器人自身的变动影响监控群分配
+        if is_self_notice(event):
+            return event.group_id in config.monitored_group_set
+        # 成员变动都需要使缓存的成员信息失效，是否更新成员索引、踢出已知违规用户由处理函数判断
+        return event.group_id in config.monitored_group_set
+
+    return Rule(_rule)
+
+# 成员变动通知响应器，用于使缓存的成员信息失效、保持成员索引实时更新，并踢出重新入群的已知违规用户
+member_notice_handler = on_notice(rule=create_member_notice_rule(), priority=1, block=False)
+
+@member_notice_handler.handle()
+async def handle_member_notice(event: GroupIncreaseNoticeEvent | GroupDecreaseNoticeEvent | GroupAdminNoticeEvent):
+    """根据 group_increase / group_decrease / group_admin 通知更新成员索引和监控群分配"""
+    # 成员变动后缓存的成员信息（含负缓存）已过时
+    api_cache.invalidate('get_group_member_info', group_id=event.group_id, user_id=event.user_id)
+    if is_self_notice(event):
+        # 监控机器人被移出群聊时，该群转交其他监控机器人，没有可用机器人时索引才会被清除
+        await handle_self_member_notice(event)
+        return
+
+    if plugin_config.member_index_enabled:
+        member_sync.touch(event.group_id)
+    index_ready = plugin_config.member_index_enabled and member_index.is_ready(event.group_id)
+    if isinstance(event, GroupIncreaseNoticeEvent):
+        if index_ready:
+            member_index.add(event.group_id, event.user_id)
+        if plugin_config.reputation_enabled and plugin_config.reputation_kick_on_join and reputation_store.is_bad_user(event.user_id):
+            await kick_known_offender(event)
+    elif not index_ready:
+        return
+    elif isinstance(event, GroupDecreaseNoticeEvent):
+        member_index.remove(event.group_id, event.user_id)
+    elif isinstance(event, GroupAdminNoticeEvent):
+        member_index.set_role(event.group_id, event.user_id, "admin" if event.sub_type == "set" else "member")
+
+async def kick_known_offender(event: GroupIncreaseNoticeEvent):
+    """已知违规用户加入监控群时踢出，经与邀请检测相同的传输方式交给管理机器人"""
+    self_id, group_id, user_id = str(event.self_id), event.group_id, event.user_id
+    # 群内每个机器人都会收到通知，只由负责该群的监控机器人处理，没有时由负责的管理机器人处理
+    if (monitor_pool.owner(group_id) or admin_pool.owner(group_id)) != self_id:
+        return
+    reputation_hits.inc("user")
+    logger.info(f"已知违规用户 {user_id} 加入监控群 {group_id}，将被踢出")
+    
+    user_card = nickname = str(user_id)
+    bot = get_bots().get(self_id)
+    if bot is not None:
+        try:
+            member_info = await api_cache.call(bot, 'get_group_member_info', group_id=group_id, user_id=user_id)
+            nickname = member_info.get('nickname') or nickname
+            user_card = member_info.get('card') or nickname
+        except Exception as e:
+            logger.debug(f"获取用户 {user_id} 的成员信息失败: {e}")
+    
+    await log_violation(user_id, group_id, user_card, nickname, action='KICKED_ON_REJOIN')
+    detection = {
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'monitor_group': group_id,
+        'user_id': user_id,
+        'user_card': user_card,
+        'nickname': nickname,
+        'target_group': REJOIN_TARGET_GROUP,
+        'target_group_name': "",
+    }
+    if metrics.enabled:
+        detection['detected_at'] = time.time()
+    if await dispatch_detection(self_id, detection) is None:
+        logger.error("没有可用的检测结果传输方式，请检查通讯群或 socket 配置")
+
+async def handle_self_member_notice(event: GroupIncreaseNoticeEvent | GroupDecreaseNoticeEvent | GroupAdminNoticeEvent):
+    """机器人自身入群、退群或管理员变动时更新监控群分配"""
+    self_id, group_id = str(event.self_id), event.group_id
+    if self_id in monitor_pool.bots:
+        if isinstance(event, GroupIncreaseNoticeEvent):
+            await apply_monitor_changes(monitor_pool.grant(self_id, group_id))
+        elif isinstance(event, GroupDecreaseNoticeEvent):
+            await apply_monitor_changes(monitor_pool.revoke(self_id, group_id))
+    if self_id in admin_pool.bots:
+        if isinstance(event, GroupAdminNoticeEvent) and event.sub_type == "set":
+            log_pool_changes(admin_pool, admin_pool.grant(self_id, group_id))
+        elif isinstance(event, (GroupAdminNoticeEvent, GroupDecreaseNoticeEvent)):
+            log_pool_changes(admin_pool, admin_pool.revoke(self_id, group_id))
+
 # 超级用户命令：重载配置
 from nonebot import on_command
 from nonebot.adapters.onebot.v11 import MessageEvent
@@ -347,9 +1480,162 @@ reload_config_cmd = on_command("reload_invite_config", permission=SUPERUSER, pri
 @reload_config_cmd.handle()
 async def handle_reload_config():
     """重载配置文件"""
+    try:
+        changes = await reload_plugin_config()
+    except ValueError as e:
+        await reload_config_cmd.finish(f"配置文件重载失败，继续使用原有配置: {e}")
+    if not changes:
+        await reload_config_cmd.finish("群邀请监控插件配置文件已重载，配置没有变化")
+    await reload_config_cmd.send("群邀请监控插件配置文件已重载：\n" + "\n".join(changes))
+
+def describe_config_changes(old: PluginConfig, new: PluginConfig, changes: Dict[str, Tuple[Any, Any]]) -> List[str]:
+    """生成配置变更说明"""
+    lines = []
+    for name, (old_value, new_value) in changes.items():
+        if name == 'monitored_groups':
+            added = sorted(new.monitored_group_set - old.monitored_group_set)
+            removed = sorted(old.monitored_group_set - new.monitored_group_set)
+            lines.append(f"监控群: 新增 {added or '无'}, 移除 {removed or '无'}")
+        elif name == 'transport_socket_token':
+            lines.append(f"{name}: 已修改")
+        else:
+            lines.append(f"{name}: {old_value} -> {new_value}")
+    return lines
+
+async def reload_plugin_config() -> List[str]:
+    """重新读取配置文件并整体替换配置快照，只刷新受影响的部分，返回变更说明
+
+    配置文件读取失败时抛出 ValueError，原有配置保持不变。
+    """
     global plugin_config
-    plugin_config = PluginConfig()
-    await reload_config_cmd.send("群邀请监控插件配置文件已重载")
+    old, new = plugin_config, PluginConfig()
+    if new.load_error is not None:
+        raise ValueError(new.load_error)
+    changes = old.diff(new)
+    if not changes:
+        return []
+    plugin_config = new
+    changed = set(changes)
+    
+    def _section_changed(prefix: str) -> bool:
+        return any(name.startswith(prefix) for name in changed)
+    
+    if _section_changed('cache_'):
+        configure_api_cache()
+    if changed & VIOLATION_LOG_SETTINGS:
+        configure_violation_log_writer()
+        await open_violation_store()
+    if _section_changed('sender_'):
+        configure_detection_sender()
+    if _section_changed('executor_'):
+        configure_kick_executor()
+    if _section_changed('transport_') or 'communication_group' in changed:
+        configure_transport()
+        await start_socket_server()
+    if 'dedup_window' in changed:
+        invite_deduplicator.window = new.dedup_window
+    if 'config_watch_interval' in changed:
+        start_config_watcher()
+    if _section_changed('reputation_'):
+        configure_reputation_store()
+        await open_reputation_store()
+    if _section_changed('journal_'):
+        configure_action_journal()
+        await open_action_journal()
+    if 'metrics_enabled' in changed:
+        configure_metrics()
+    if 'metrics_path' in changed:
+        logger.warning("运行指标路径的修改需要重启 NoneBot 后生效")
+    
+    # 移出监控的群：清除索引、缓存，并从机器人池中释放
+    removed_groups = old.monitored_group_set - new.monitored_group_set
+    for group_id in removed_groups:
+        member_index.drop_group(group_id)
+        api_cache.invalidate_group(group_id)
+    if removed_groups:
+        await apply_monitor_changes(monitor_pool.refresh())
+        log_pool_changes(admin_pool, admin_pool.refresh())
+    
+    # 移出配置的机器人不再负责任何群
+    for self_id in monitor_pool.bots:
+        if self_id not in new.monitor_bot_set:
+            await apply_monitor_changes(monitor_pool.remove_bot(self_id))
+    for self_id in admin_pool.bots:
+        if self_id not in new.admin_bot_set:
+            log_pool_changes(admin_pool, admin_pool.remove_bot(self_id))
+    
+    # 新加入配置的机器人检查所有监控群，已登记的机器人只检查新增的群
+    added_groups = sorted(new.monitored_group_set - old.monitored_group_set, key=new.monitored_group_order.get)
+    for self_id, bot in get_bots().items():
+        if self_id in new.monitor_bot_set:
+            if self_id not in monitor_pool.bots:
+                await register_monitor_bot(bot)
+            elif added_groups:
+                await register_monitor_bot(bot, added_groups)
+        if self_id in new.admin_bot_set:
+            if self_id not in admin_pool.bots:
+                await register_admin_bot(bot)
+            elif added_groups:
+                await register_admin_bot(bot, added_groups)
+    
+    # 成员索引开关或同步参数变化
+    if _section_changed('member_index_'):
+        configure_member_sync()
+    if 'member_index_enabled' in changed:
+        if new.member_index_enabled:
+            await member_index.build(get_monitor_bot, new.monitored_groups)
+            if monitor_pool.bots:
+                member_sync.start()
+        else:
+            member_sync.stop()
+            member_index.clear()
+    
+    lines = describe_config_changes(old, new, changes)
+    logger.info("配置已重载: " + "; ".join(lines))
+    return lines
+
+# 配置文件监视任务
+config_watch_task: Optional[asyncio.Task] = None
+
+def start_config_watcher():
+    """按 config_watch_interval 定期检查配置文件修改时间，变化时自动重载"""
+    global config_watch_task
+    stop_config_watcher()
+    if plugin_config.config_watch_interval <= 0:
+        return
+    
+    async def _watch():
+        try:
+            last_mtime = config_file_path.stat().st_mtime
+        except OSError:
+            last_mtime = None
+        # 重载后间隔变化时会启动新的监视任务，旧任务随之退出
+        while config_watch_task is asyncio.current_task():
+            await asyncio.sleep(plugin_config.config_watch_interval)
+            try:
+                mtime = config_file_path.stat().st_mtime
+            except OSError:
+                continue
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            logger.info("检测到配置文件变化，自动重载")
+            try:
+                await reload_plugin_config()
+            except ValueError as e:
+                logger.error(f"自动重载配置失败，继续使用原有配置: {e}")
+            except Exception as e:
+                logger.error(f"自动重载配置时发生错误: {e}")
+    
+    config_watch_task = asyncio.create_task(_watch())
+
+def stop_config_watcher():
+    """停止配置文件监视任务"""
+    global config_watch_task
+    # 自动重载时会从监视任务内部调用，不能取消自身
+    if config_watch_task is not None and config_watch_task is not asyncio.current_task() and not config_watch_task.done():
+        config_watch_task.cancel()
+    config_watch_task = None
 
 # 测试命令：检查机器人状态
 test_bots_cmd = on_command("test_invite_bots", permission=SUPERUSER, priority=1)
@@ -363,45 +1649,273 @@ async def handle_test_bots():
     status_msg += f"当前连接的机器人: {list(bots.keys())}\n\n"
     
     # 检查监控机器人
-    if plugin_config.monitor_bot_id in bots:
-        status_msg += f"✓ 监控机器人 {plugin_config.monitor_bot_id} 已连接\n"
-    else:
-        status_msg += f"✗ 监控机器人 {plugin_config.monitor_bot_id} 未连接\n"
+    for self_id in plugin_config.monitor_bot_ids:
+        if self_id in bots:
+            status_msg += f"✓ 监控机器人 {self_id} 已连接\n"
+        else:
+            status_msg += f"✗ 监控机器人 {self_id} 未连接\n"
     
     # 检查管理机器人
-    if plugin_config.admin_bot_id in bots:
-        status_msg += f"✓ 管理机器人 {plugin_config.admin_bot_id} 已连接\n"
-    else:
-        status_msg += f"✗ 管理机器人 {plugin_config.admin_bot_id} 未连接\n"
+    for self_id in plugin_config.admin_bot_ids:
+        if self_id in bots:
+            status_msg += f"✓ 管理机器人 {self_id} 已连接\n"
+        else:
+            status_msg += f"✗ 管理机器人 {self_id} 未连接\n"
     
     status_msg += f"\n监控群聊: {plugin_config.monitored_groups}"
     status_msg += f"\n通讯群聊: {plugin_config.communication_group}"
     status_msg += f"\n插件状态: {'启用' if plugin_config.enabled else '禁用'}"
+    if plugin_config.member_index_enabled:
+        status_msg += f"\n成员索引: {member_index.group_count}/{len(plugin_config.monitored_groups)} 个群已加载, {member_index.user_count} 名用户"
+        status_msg += f"\n{member_sync.summary()}"
+    status_msg += f"\n\n{monitor_pool.summary()}"
+    status_msg += f"\n{admin_pool.summary()}"
+    status_msg += f"\n\n{detection_sender.summary()}"
+    status_msg += f"\n{kick_executor.summary()}"
+    status_msg += f"\n{detection_transport.summary()}"
+    if plugin_config.reputation_enabled:
+        status_msg += f"\n{reputation_store.summary()}"
+    if action_journal.opened:
+        status_msg += f"\n{action_journal.summary()}, 等待机器人连接 {len(journal_backlog)} 个"
     
     await test_bots_cmd.send(status_msg)
 
+# 超级用户命令：查看运行指标摘要
+metrics_cmd = on_command("invite_metrics", permission=SUPERUSER, priority=1)
+
+def format_seconds(value: Optional[float]) -> str:
+    """格式化耗时"""
+    if value is None:
+        return "-"
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.2f}s"
+
+def metrics_summary() -> str:
+    """生成运行指标摘要"""
+    uptime = time.time() - metrics.started_at
+    lines = [f"运行指标（统计 {uptime / 60:.0f} 分钟）："]
+    filtered = ", ".join(
+        f"{labels[0]} {int(value)}" for labels, value in sorted(invites_filtered.values.items())
+    ) or "无"
+    lines.append(f"群邀请: 收到 {int(invites_seen.total())}, 触发检测 {int(invites_detected.total())}, 未触发 {filtered}")
+    lines.append(
+        f"踢人: 成功 {kick_executor.kicks_succeeded}, 失败 {kick_executor.kicks_failed}, "
+        f"忽略重复 {kick_executor.kicks_skipped}"
+    )
+    lines.append(
+        f"收到邀请到踢出: {kick_latency.count()} 次, 平均 {format_seconds(kick_latency.mean())}, "
+        f"p50 {format_seconds(kick_latency.quantile(0.5))}, p99 {format_seconds(kick_latency.quantile(0.99))}"
+    )
+    lines.append(
+        f"队列: 检测消息 {detection_sender.queue_depth}, 踢人 {kick_executor.pending_count}, "
+        f"违规日志 {violation_log_writer.pending}, 未完成操作日志 {action_journal.pending_count}"
+    )
+    if api_timer.durations.values:
+        lines.append("API 调用:")
+        for (action,) in sorted(api_timer.durations.values):
+            errors = int(api_timer.errors.values.get((action,), 0))
+            lines.append(
+                f"  {action}: {api_timer.durations.count(action)} 次, 失败 {errors}, "
+                f"平均 {format_seconds(api_timer.durations.mean(action))}, p99 {format_seconds(api_timer.durations.quantile(0.99, action))}"
+            )
+    return "\n".join(lines)
+
+@metrics_cmd.handle()
+async def handle_metrics():
+    """查看运行指标摘要"""
+    if not metrics.enabled:
+        await metrics_cmd.finish("运行指标未启用，请在配置文件 [metrics] 节中设置 enabled = true 后重载配置")
+    await metrics_cmd.send(metrics_summary())
+
+async def handle_metrics_request(request: Request) -> Response:
+    """以 Prometheus 文本格式导出运行指标"""
+    if not metrics.enabled:
+        return Response(404, content="metrics disabled")
+    return Response(
+        200,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        content=metrics.render(),
+    )
+
+def setup_metrics_endpoint():
+    """在驱动器的 HTTP 服务上注册指标路径，路由只能在启动前注册，启用状态在请求时判断"""
+    driver = nonebot.get_driver()
+    if not isinstance(driver, ASGIMixin):
+        logger.debug("当前驱动器不提供 HTTP 服务，运行指标只能通过 /invite_metrics 命令查看")
+        return
+    driver.setup_http_server(
+        HTTPServerSetup(URL(plugin_config.metrics_path), "GET", "invite_detection_metrics", handle_metrics_request)
+    )
+
+setup_metrics_endpoint()
+
+# 调试命令：查看 API 缓存命中统计
+cache_stats_cmd = on_command("invite_cache_stats", permission=SUPERUSER, priority=1)
+
+@cache_stats_cmd.handle()
+async def handle_cache_stats():
+    """查看 API 缓存命中统计"""
+    await cache_stats_cmd.send(api_cache.summary())
+
+# 超级用户命令：查询违规记录
+query_violations_cmd = on_command("query_violations", permission=SUPERUSER, priority=1)
+
+VIOLATION_PAGE_SIZE = 10
+
+@query_violations_cmd.handle()
+async def handle_query_violations(args: Message = CommandArg()):
+    """查询违规记录：/query_violations [user|group|target <号码>] [页码]"""
+    if violation_store is None or not sqlite_store_enabled():
+        await query_violations_cmd.finish("未启用违规记录数据库，请将 [violation_log] backend 设置为 sqlite 或 both")
+
+    params = args.extract_plain_text().split()
+    field, value, page = None, None, 1
+    try:
+        if params and params[0] in ("user", "group", "target"):
+            field, value = params[0], int(params[1])
+            params = params[2:]
+        if params:
+            page = int(params[0])
+    except (IndexError, ValueError):
+        await query_violations_cmd.finish(
+            "用法: /query_violations [user|group|target <号码>] [页码]\n"
+            "示例: /query_violations user 2741226099 2"
+        )
+
+    total, records = await violation_store.query(field, value, page, VIOLATION_PAGE_SIZE)
+    if not records:
+        await query_violations_cmd.finish(f"没有找到违规记录（共 {total} 条）")
+
+    pages = (total + VIOLATION_PAGE_SIZE - 1) // VIOLATION_PAGE_SIZE
+    lines = [f"违规记录 第 {page}/{pages} 页，共 {total} 条："]
+    for record in records:
+        timestamp = datetime.fromtimestamp(record['ts']).strftime("%Y-%m-%d %H:%M:%S")
+        target = f" -> {record['target_group']}" if record['target_group'] else ""
+        lines.append(f"{timestamp} | 群 {record['monitor_group']} | {record['user_card']} ({record['user_id']}){target}")
+    await query_violations_cmd.send("\n".join(lines))
+
+# 超级用户命令：将文本违规日志导入数据库
+import_logs_cmd = on_command("import_violation_logs", permission=SUPERUSER, priority=1)
+
+@import_logs_cmd.handle()
+async def handle_import_logs():
+    """将文本违规日志导入数据库"""
+    if violation_store is None or not sqlite_store_enabled():
+        await import_logs_cmd.finish("未启用违规记录数据库，请将 [violation_log] backend 设置为 sqlite 或 both")
+
+    try:
+        await violation_log_writer.flush()
+        imported = await violation_store.import_text_log(log_file_path)
+    except Exception as e:
+        logger.error(f"导入文本违规日志失败: {e}")
+        await import_logs_cmd.finish(f"导入失败: {e}")
+
+    await import_logs_cmd.send(f"已导入 {imported} 条违规记录")
+
+async def aggregate_violations(days: Optional[int] = None) -> ViolationAggregator:
+    """在线程中流式聚合违规记录，优先读取数据库，days 表示只统计最近若干天"""
+    since = int(time.time()) - days * 86400 if days else None
+    aggregator = ViolationAggregator(plugin_config.export_time_bucket, plugin_config.export_max_keys, since)
+    if violation_store is not None and sqlite_store_enabled():
+        # 使用独立的只读连接，长时间遍历不阻塞数据库写入
+        records = iter_sqlite(violation_store.path, since)
+    else:
+        await violation_log_writer.flush()
+        records = iter_text_log(log_file_path)
+    return await asyncio.to_thread(aggregator.consume, records)
+
+# 超级用户命令：违规记录统计摘要
+violation_stats_cmd = on_command("violation_stats", permission=SUPERUSER, priority=1)
+
+@violation_stats_cmd.handle()
+async def handle_violation_stats(args: Message = CommandArg()):
+    """违规记录统计：/violation_stats [最近天数] [前N名]"""
+    try:
+        params = [int(param) for param in args.extract_plain_text().split()]
+    except ValueError:
+        await violation_stats_cmd.finish("用法: /violation_stats [最近天数] [前N名]\n示例: /violation_stats 30 5")
+    days = params[0] if params else None
+    top = params[1] if len(params) > 1 else plugin_config.export_top
+    try:
+        aggregator = await aggregate_violations(days)
+    except Exception as e:
+        logger.error(f"统计违规记录失败: {e}")
+        await violation_stats_cmd.finish(f"统计失败: {e}")
+    await violation_stats_cmd.send(aggregator.summary(top))
+
+# 超级用户命令：导出违规记录统计
+export_violations_cmd = on_command("export_violations", permission=SUPERUSER, priority=1)
+
+@export_violations_cmd.handle()
+async def handle_export_violations(args: Message = CommandArg()):
+    """导出违规记录统计：/export_violations [target|inviter|time] [csv|json] [最近天数]"""
+    dimension, fmt, days = "target", "csv", None
+    try:
+        for param in args.extract_plain_text().split():
+            if param in DIMENSIONS:
+                dimension = param
+            elif param in FORMATS:
+                fmt = param
+            else:
+                days = int(param)
+    except ValueError:
+        await export_violations_cmd.finish(
+            "用法: /export_violations [target|inviter|time] [csv|json] [最近天数]\n"
+            "示例: /export_violations target csv 90"
+        )
+
+    # CSV 只包含一个维度，JSON 包含所有维度
+    name = dimension if fmt == "csv" else "all"
+    path = Path(__file__).parent / plugin_config.export_path / f"violations_{name}_{datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+    try:
+        aggregator = await aggregate_violations(days)
+        written = await asyncio.to_thread(export_file, aggregator, path, dimension, fmt)
+    except Exception as e:
+        logger.error(f"导出违规记录统计失败: {e}")
+        await export_violations_cmd.finish(f"导出失败: {e}")
+    logger.info(f"违规记录统计已导出到 {path}")
+    await export_violations_cmd.send(f"已导出 {written} 行到 {path}\n{aggregator.summary(plugin_config.export_top)}")
+
+# 超级用户命令：根据历史违规记录重建信誉库
+rebuild_reputation_cmd = on_command("rebuild_invite_reputation", permission=SUPERUSER, priority=1)
+
+@rebuild_reputation_cmd.handle()
+async def handle_rebuild_reputation():
+    """根据历史违规记录重建信誉库"""
+    if not plugin_config.reputation_enabled or not reputation_store.opened:
+        await rebuild_reputation_cmd.finish("未启用信誉库，请在配置文件 [reputation] 节中设置 enabled = true 后重载配置")
+    try:
+        users, targets = await rebuild_reputation_store()
+    except Exception as e:
+        logger.error(f"重建信誉库失败: {e}")
+        await rebuild_reputation_cmd.finish(f"重建失败: {e}")
+    await rebuild_reputation_cmd.send(f"信誉库已重建: {users} 名用户, {targets} 个目标群\n{reputation_store.summary()}")
+
 # 管理机器人的消息监听器 - 监听检测消息并执行操作
 from nonebot import on_message
-from nonebot.adapters.onebot.v11 import GroupMessageEvent, Message
+from nonebot.adapters.onebot.v11 import GroupMessageEvent
 
 def create_detection_message_rule() -> Rule:
     """创建检测消息规则"""
-    async def _rule(event: GroupMessageEvent) -> bool:
-        # 检查插件是否启用
-        if not plugin_config.enabled:
+    # 每条消息都会经过该规则，参数使用基类注解以跳过 NoneBot 的类型校验
+    async def _rule(event: Event) -> bool:
+        # 快速路径：先比较群号和机器人QQ号（均为整数），绝大多数消息在这里返回
+        config = plugin_config
+        if not isinstance(event, GroupMessageEvent) or event.group_id != config.communication_group:
             return False
         
-        # 检查是否为通讯群的消息
-        if not plugin_config.communication_group or event.group_id != plugin_config.communication_group:
+        # 检查是否为管理机器人接收的消息
+        if event.self_id not in config.admin_bot_int_set:
             return False
         
-        # 检查是否为管理机器人接收的消息
-        if str(event.self_id) != plugin_config.admin_bot_id:
+        # 检查插件是否启用
+        if not config.enabled:
             return False
         
-        # 检查消息是否以特定标识开头
-        message_text = str(event.message).strip()
-        if not message_text.startswith("InvalidGroupInvitationDetect"):
+        # 检查消息是否以特定标识开头，只查看第一个文本段，不构造整条消息字符串
+        if not event.message:
+            return False
+        first_segment = event.message[0]
+        if first_segment.type != "text" or not is_detection_text(first_segment.data.get("text", "")):
             return False
         
         return True
@@ -415,92 +1929,17 @@ detection_message_handler = on_message(rule=create_detection_message_rule(), pri
 async def handle_detection_message(event: GroupMessageEvent):
     """处理检测消息 - 管理机器人执行踢人操作"""
     try:
-        message_text = str(event.message).strip()
+        message_text = event.message.extract_plain_text().strip()
         logger.info(f"管理机器人收到检测消息: {message_text}")
         
-        # 解析消息内容
-        detection_data = parse_detection_message(message_text)
-        if not detection_data:
-            logger.error(f"无法解析检测消息: {message_text}")
-            return
-        
-        monitor_group_id = detection_data['monitor_group']
-        user_id = detection_data['user_id']
-        user_card = detection_data['user_card']
-        nickname = detection_data['nickname']
-        target_group_id = detection_data['target_group']
-        target_group_name = detection_data['target_group_name']
-        
-        logger.info(f"解析成功 - 监控群: {monitor_group_id}, 用户: {user_id}, 目标群: {target_group_id}")
-        
-        # 获取管理机器人实例
+        # 解析消息内容，一条消息可能包含多条检测结果
         try:
-            admin_bot = nonebot.get_bot(plugin_config.admin_bot_id)
-        except Exception as e:
-            logger.error(f"无法找到管理机器人 {plugin_config.admin_bot_id}: {e}")
-            bots = nonebot.get_bots()
-            admin_bot = bots.get(plugin_config.admin_bot_id)
-            if not admin_bot:
-                logger.error(f"管理机器人 {plugin_config.admin_bot_id} 未连接")
-                return
-        
-        # 执行踢人操作
-        try:
-            await admin_bot.set_group_kick(group_id=monitor_group_id, user_id=user_id)
-            logger.info(f"已踢出用户: {user_id} 来自监控群 {monitor_group_id}")
-        except Exception as e:
-            logger.error(f"踢出用户失败: {e}")
-            logger.error(f"尝试调用的API: set_group_kick(group_id={monitor_group_id}, user_id={user_id})")
+            detections = decode_detections(message_text)
+        except DetectionFormatError as e:
+            logger.error(f"无法解析检测消息: {e}")
             return
         
-        # 在监控群中发送警告消息
-        warning_message = (
-            f"检测到违规邀请行为！\n"
-            f"成员：{user_card} ({user_id})\n"
-            f"试图邀请群成员加入外部群聊：{target_group_name} ({target_group_id})\n"
-            f"已被移出本群。请大家注意甄别，不要点击不明群聊邀请，谨防广告与诈骗！"
-        )
-        
-        try:
-            await admin_bot.send_group_msg(group_id=monitor_group_id, message=warning_message)
-            logger.info(f"警告消息已发送到监控群 {monitor_group_id}")
-        except Exception as e:
-            logger.error(f"发送警告消息失败: {e}")
-            logger.error(f"尝试调用的API: send_group_msg(group_id={monitor_group_id}, message=...)")
+        receive_detections(detections)
     
     except Exception as e:
         logger.error(f"处理检测消息时发生错误: {e}")
-
-def parse_detection_message(message: str) -> Optional[Dict]:
-    """解析检测消息"""
-    try:
-        # 消息格式：InvalidGroupInvitationDetect | Time: ... | MonitorGroup: ... | User: ... | ...
-        parts = message.split(" | ")
-        if len(parts) < 7:
-            return None
-        
-        data = {}
-        for part in parts[1:]:  # 跳过第一个标识符
-            if ": " in part:
-                key, value = part.split(": ", 1)
-                data[key.strip()] = value.strip()
-        
-        # 检查必需的字段
-        required_fields = ['MonitorGroup', 'User', 'Card', 'Nickname', 'TargetGroup', 'TargetGroupName']
-        for field in required_fields:
-            if field not in data:
-                logger.error(f"检测消息缺少必需字段: {field}")
-                return None
-        
-        return {
-            'monitor_group': int(data['MonitorGroup']),
-            'user_id': int(data['User']),
-            'user_card': data['Card'],
-            'nickname': data['Nickname'],
-            'target_group': int(data['TargetGroup']),
-            'target_group_name': data['TargetGroupName']
-        }
-    
-    except Exception as e:
-        logger.error(f"解析检测消息失败: {e}")
-        return None
@@ -0,0 +1,287 @@
+"""
+管理机器人踢人执行器
+
+每个监控群一个队列和一个工作任务：不同群之间并行执行，同一群内串行执行。
+操作出队后立即踢人，失败时按指数退避重试；已踢出或正在排队的用户不会被重复踢出；
+只有警告消息会等待合并窗口，窗口内从同一群踢出的多名用户合并为一条警告消息，关闭时立即发送尚未发出的警告。
+启用未完成操作日志时，操作在入队时记入日志、执行完成后标记完成，意外退出后也能恢复；
+未启用时，未完成的操作在关闭时保存到文件，下次启动时在负责的管理机器人连接后恢复。
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Bot
+
+from .cache import ApiCaller, call_api
+from .journal import KIND_KICK, ActionJournal
+
+Action = Dict[str, Any]
+ActionKey = Tuple[int, int]
+
+# 已知违规用户重新入群时没有对应的邀请目标群，以 0 表示；此类操作不受已踢出记录的限制
+REJOIN_TARGET_GROUP = 0
+
+
+def action_key(action: Action) -> ActionKey:
+    """操作的幂等键 (监控群, 用户)"""
+    return int(action["monitor_group"]), int(action["user_id"])
+
+
+class KickExecutor:
+    """踢人操作执行器"""
+
+    def __init__(
+        self,
+        get_bot: Callable[[int], Optional[Bot]],
+        format_warning: Callable[[List[Action]], str],
+        state_path: Optional[Path] = None,
+        merge_window: float = 3.0,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0,
+        kicked_ttl: float = 3600,
+        on_kicked: Optional[Callable[[Action], None]] = None,
+        journal: Optional[ActionJournal] = None,
+        call_api: ApiCaller = call_api,
+    ):
+        # call_api(bot, api, **params) 发出实际的 API 调用，如带计时的调用
+        self.call_api = call_api
+        # get_bot(群号) 返回负责该群的管理机器人
+        self.get_bot = get_bot
+        self.format_warning = format_warning
+        # 踢出成功后回调，用于统计
+        self.on_kicked = on_kicked
+        self.state_path = state_path
+        self.journal = journal
+        self.merge_window = merge_window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.kicked_ttl = kicked_ttl
+        self._queues: Dict[int, "asyncio.Queue[Action]"] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        # 已排队或执行中的操作
+        self._pending: Dict[ActionKey, Action] = {}
+        # 已排队或执行中的操作在未完成操作日志中的条目 id
+        self._journal_ids: Dict[ActionKey, Optional[int]] = {}
+        # 从文件恢复、所在群尚无管理机器人的操作及其日志条目 id
+        self._parked: List[Tuple[Action, Optional[int]]] = []
+        # 已踢出、等待合并发送警告的操作
+        self._warnings: Dict[int, List[Action]] = {}
+        # 等待合并窗口的发送任务，以及所有尚未结束的发送任务（包括正在发送的）
+        self._warn_tasks: Dict[int, asyncio.Task] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # 最近已踢出的 (群, 用户) -> 踢出时间
+        self._kicked: "OrderedDict[ActionKey, float]" = OrderedDict()
+        self.kicks_succeeded = 0
+        self.kicks_failed = 0
+        self.kicks_skipped = 0
+
+    def configure(self, merge_window: float, max_retries: int, retry_backoff: float, kicked_ttl: float):
+        """更新执行参数"""
+        self.merge_window = merge_window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.kicked_ttl = kicked_ttl
+
+    def _expire_kicked(self):
+        now = time.monotonic()
+        while self._kicked:
+            key, kicked_at = next(iter(self._kicked.items()))
+            if now - kicked_at < self.kicked_ttl:
+                break
+            del self._kicked[key]
+
+    def is_kicked(self, key: ActionKey) -> bool:
+        """该用户最近是否已从该群踢出"""
+        self._expire_kicked()
+        return key in self._kicked
+
+    @property
+    def journaled(self) -> bool:
+        """是否通过未完成操作日志持久化"""
+        return self.journal is not None and self.journal.opened
+
+    def submit(self, action: Action, journal_id: Optional[int] = None) -> bool:
+        """提交一个踢人操作，重复的操作会被忽略，返回是否已加入队列
+
+        journal_id 为从未完成操作日志中恢复的条目 id，为空时为新操作记入日志。
+        """
+        key = action_key(action)
+        rejoin = action.get("target_group") == REJOIN_TARGET_GROUP
+        if key in self._pending or (not rejoin and self.is_kicked(key)):
+            self.kicks_skipped += 1
+            logger.info(f"用户 {key[1]} 在群 {key[0]} 的踢出操作已在处理或已完成，忽略重复请求")
+            if self.journal is not None:
+                self.journal.done(journal_id)
+            return False
+
+        if journal_id is None and self.journal is not None:
+            journal_id = self.journal.add(KIND_KICK, action)
+        self._pending[key] = action
+        self._journal_ids[key] = journal_id
+        group_id = key[0]
+        queue = self._queues.get(group_id)
+        if queue is None:
+            queue = self._queues[group_id] = asyncio.Queue()
+        queue.put_nowait(action)
+        worker = self._workers.get(group_id)
+        if worker is None or worker.done():
+            self._workers[group_id] = asyncio.create_task(self._run(group_id, queue))
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._parked)
+
+    def _finish(self, key: ActionKey):
+        """操作执行完成（成功或重试后仍失败），不再需要恢复"""
+        self._pending.pop(key, None)
+        journal_id = self._journal_ids.pop(key, None)
+        if self.journal is not None:
+            self.journal.done(journal_id)
+
+    async def _run(self, group_id: int, queue: "asyncio.Queue[Action]"):
+        while True:
+            action = await queue.get()
+            if await self._kick(group_id, action):
+                self._queue_warning(group_id, action)
+
+    def _queue_warning(self, group_id: int, action: Action):
+        """将已踢出的用户加入该群待发送的警告，合并窗口结束后统一发送"""
+        self._warnings.setdefault(group_id, []).append(action)
+        task = self._warn_tasks.get(group_id)
+        if task is None or task.done():
+            task = self._warn_tasks[group_id] = asyncio.create_task(self._flush_warnings(group_id))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_warnings(self, group_id: int):
+        if self.merge_window > 0:
+            await asyncio.sleep(self.merge_window)
+        # 发送期间新踢出的用户进入下一条警告
+        actions = self._warnings.pop(group_id, [])
+        self._warn_tasks.pop(group_id, None)
+        if actions:
+            await self._warn(group_id, actions)
+
+    async def _kick(self, group_id: int, action: Action) -> bool:
+        """执行踢人，失败时指数退避重试"""
+        key = action_key(action)
+        user_id = key[1]
+        for attempt in range(self.max_retries + 1):
+            bot = self.get_bot(group_id)
+            try:
+                if bot is None:
+                    raise RuntimeError(f"没有可用于群 {group_id} 的管理机器人")
+                await self.call_api(bot, "set_group_kick", group_id=group_id, user_id=user_id)
+            except Exception as e:
+                if attempt < self.max_retries:
+                    delay = self.retry_backoff * (2 ** attempt)
+                    logger.warning(f"踢出用户 {user_id} 失败，{delay:.1f} 秒后重试: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                self.kicks_failed += 1
+                logger.error(f"踢出用户失败，已重试 {attempt} 次: {e}")
+                logger.error(f"尝试调用的API: set_group_kick(group_id={group_id}, user_id={user_id})")
+                self._finish(key)
+                return False
+
+            self.kicks_succeeded += 1
+            self._kicked[key] = time.monotonic()
+            self._finish(key)
+            logger.info(f"已踢出用户: {user_id} 来自监控群 {group_id}")
+            if self.on_kicked is not None:
+                self.on_kicked(action)
+            return True
+        return False
+
+    async def _warn(self, group_id: int, actions: List[Action]):
+        """在监控群中发送合并后的警告消息"""
+        bot = self.get_bot(group_id)
+        if bot is None:
+            logger.error(f"没有可用于群 {group_id} 的管理机器人，无法发送警告消息")
+            return
+        try:
+            await self.call_api(bot, "send_group_msg", group_id=group_id, message=self.format_warning(actions))
+            logger.info(f"警告消息已发送到监控群 {group_id}（{len(actions)} 名成员）")
+        except Exception as e:
+            logger.error(f"发送警告消息失败: {e}")
+            logger.error(f"尝试调用的API: send_group_msg(group_id={group_id}, message=...)")
+
+    def load(self):
+        """读取上次关闭时未完成的操作，在负责的管理机器人连接后恢复"""
+        if self.state_path is None or not self.state_path.exists():
+            return
+        try:
+            actions = json.loads(self.state_path.read_text(encoding="utf-8"))
+            self.state_path.unlink()
+        except Exception as e:
+            logger.error(f"读取未完成的踢人操作失败: {e}")
+            return
+        for action in actions:
+            # 文件已删除，启用日志时立即记入日志，等待期间意外退出也不会丢失
+            journal_id = self.journal.add(KIND_KICK, action) if self.journal is not None else None
+            self._parked.append((action, journal_id))
+        if actions:
+            logger.info(f"已读取 {len(actions)} 个未完成的踢人操作")
+        self.resume()
+
+    def resume(self) -> int:
+        """提交所在群已有管理机器人的待恢复操作，返回提交的数量；没有机器人时不计为失败，继续等待"""
+        if not self._parked:
+            return 0
+        parked, self._parked = self._parked, []
+        restored = 0
+        for action, journal_id in parked:
+            if self.get_bot(int(action["monitor_group"])) is None:
+                self._parked.append((action, journal_id))
+            elif self.submit(action, journal_id):
+                restored += 1
+        if restored:
+            logger.info(f"已恢复 {restored} 个未完成的踢人操作，{len(self._parked)} 个等待管理机器人连接")
+        return restored
+
+    async def stop(self, warn_timeout: float = 3.0):
+        """停止所有工作任务，立即发送合并窗口内尚未发送的警告；未通过日志持久化时，将未完成的操作保存到文件"""
+        # 正在发送的警告不取消，等待合并窗口的警告由下面立即发送
+        tasks = [*self._workers.values(), *self._warn_tasks.values()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._queues.clear()
+        self._warn_tasks.clear()
+
+        # 已踢出的用户不会再次处理，警告消息不保存，关闭前在限定时间内发出
+        warnings, self._warnings = self._warnings, {}
+        sending = [*self._flush_tasks, *(self._warn(group_id, actions) for group_id, actions in warnings.items())]
+        if sending:
+            try:
+                await asyncio.wait_for(asyncio.gather(*sending), warn_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("关闭前发送警告消息超时，部分群的警告消息未发送")
+
+        # 通过日志持久化时，未完成的条目已在日志中，下次启动时重放
+        actions = [*self._pending.values(), *(action for action, _ in self._parked)]
+        if self.state_path is not None and actions and not self.journaled:
+            try:
+                self.state_path.write_text(json.dumps(actions, ensure_ascii=False), encoding="utf-8")
+                logger.info(f"已保存 {len(actions)} 个未完成的踢人操作")
+            except Exception as e:
+                logger.error(f"保存未完成的踢人操作失败: {e}")
+        self._pending.clear()
+        self._journal_ids.clear()
+        self._parked.clear()
+
+    def summary(self) -> str:
+        """生成执行统计文本"""
+        return (
+            f"踢人执行器: 待处理 {self.pending_count}, 成功 {self.kicks_succeeded}, "
+            f"失败 {self.kicks_failed}, 忽略重复 {self.kicks_skipped}"
+        )
@@ -0,0 +1,350 @@
+"""
+违规记录统计与导出
+
+流式读取文本违规日志（含轮转和压缩分段）或 SQLite 数据库，单次遍历按目标群、邀请者和时间段聚合。
+内存占用只与不同目标群、邀请者和时间段的数量有关，与记录数无关；
+键数超过上限时只保留计数最大的键，结果变为近似值，并给出计数误差的上界。
+结果可导出为 CSV / JSON，或生成前 N 名摘要。
+
+也可以不启动 NoneBot，在插件目录中直接运行：
+    python analytics.py summary
+    python analytics.py export --by target --min-count 3 --output blocklist.csv
+    python analytics.py export --db violations.db --format json --since 2024-01-01
+"""
+
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+try:
+    from .store import COLUMNS, TEXT_LOG_TIME_FORMAT, iter_text_log, table_columns
+except ImportError:
+    # 作为脚本直接运行时没有包上下文
+    from store import COLUMNS, TEXT_LOG_TIME_FORMAT, iter_text_log, table_columns
+
+Record = Dict[str, Any]
+
+DIMENSIONS = ("target", "inviter", "time")
+FORMATS = ("csv", "json")
+# 时间段 -> 键的格式
+BUCKETS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m",
+}
+
+
+def iter_sqlite(path: Path, since: Optional[int] = None, until: Optional[int] = None) -> Iterator[Record]:
+    """以只读连接流式读取数据库中的违规记录，不影响插件的写入"""
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        where, params = [], []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        # 只读连接无法升级旧版本的表结构，只读取已有的列
+        existing = set(table_columns(conn))
+        columns = [column for column in COLUMNS if column in existing]
+        sql = f"SELECT {', '.join(columns)} FROM violations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        for row in conn.execute(sql, params):
+            yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
+
+def bucket_range(ts: int, bucket: str) -> Tuple[float, float, str]:
+    """返回时间戳所在时间段的 (开始, 结束, 键)，按本地时间划分"""
+    dt = datetime.fromtimestamp(ts)
+    if bucket == "hour":
+        start = dt.replace(minute=0, second=0, microsecond=0)
+        end = start + timedelta(hours=1)
+    elif bucket == "day":
+        start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+    elif bucket == "week":
+        start = dt.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dt.weekday())
+        end = start + timedelta(days=7)
+    elif bucket == "month":
+        start = dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        raise ValueError(f"不支持的时间段: {bucket}")
+    return start.timestamp(), end.timestamp(), start.strftime(BUCKETS[bucket])
+
+
+class KeyStats:
+    """单个键的统计"""
+
+    __slots__ = ("count", "first_ts", "last_ts", "label")
+
+    def __init__(self, ts: int, label: str):
+        self.count = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.label = label
+
+
+class BoundedCounter:
+    """键数有上限的计数器
+
+    键数超过上限的两倍时，只保留计数最大的 max_keys 个键。被丢弃的键再次出现时从零计数，
+    因此保留下来的计数是下界。一个键每次被丢弃时少计的次数不超过该次丢弃的最大计数，
+    error 为历次丢弃的最大计数之和，是任意键少计次数的上界。键数从未超过上限时结果是精确的。
+    """
+
+    def __init__(self, max_keys: int = 0):
+        # 0 表示不限制
+        self.max_keys = max_keys
+        self.stats: Dict[Any, KeyStats] = {}
+        self.error = 0
+
+    def add(self, key: Any, ts: int, label: str = ""):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = KeyStats(ts, label)
+            if self.max_keys > 0 and len(self.stats) > self.max_keys * 2:
+                self._prune()
+                stats = self.stats.setdefault(key, stats)
+        stats.count += 1
+        if ts < stats.first_ts:
+            stats.first_ts = ts
+        if ts >= stats.last_ts:
+            stats.last_ts = ts
+            if label:
+                stats.label = label
+
+    def _prune(self):
+        ranked = sorted(self.stats.items(), key=lambda item: item[1].count, reverse=True)
+        # 同一个键可能被多次丢弃，每次少计的次数累加
+        self.error += ranked[self.max_keys][1].count
+        self.stats = dict(ranked[: self.max_keys])
+
+    @property
+    def exact(self) -> bool:
+        return self.error == 0
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def top(self, n: Optional[int] = None, min_count: int = 1) -> List[Tuple[Any, KeyStats]]:
+        """按计数从大到小排列，计数相同时按键排列"""
+        ranked = sorted(
+            (item for item in self.stats.items() if item[1].count >= min_count),
+            key=lambda item: (-item[1].count, item[0]),
+        )
+        return ranked if n is None else ranked[:n]
+
+
+class ViolationAggregator:
+    """违规记录聚合器"""
+
+    def __init__(
+        self,
+        bucket: str = "day",
+        max_keys: int = 100000,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ):
+        if bucket not in BUCKETS:
+            raise ValueError(f"不支持的时间段: {bucket}")
+        self.bucket = bucket
+        self.since = since
+        self.until = until
+        self.targets = BoundedCounter(max_keys)
+        self.inviters = BoundedCounter(max_keys)
+        # 时间段数量很少，不需要限制
+        self.buckets = BoundedCounter()
+        self.total = 0
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        # 记录大致按时间顺序排列，缓存当前时间段，避免每条记录都计算
+        self._bucket_range: Tuple[float, float, str] = (0, 0, "")
+
+    def add(self, record: Record):
+        ts = record["ts"]
+        if (self.since is not None and ts < self.since) or (self.until is not None and ts >= self.until):
+            return
+        self.total += 1
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+        target_group = record.get("target_group")
+        if target_group:
+            self.targets.add(target_group, ts, record.get("target_group_name") or "")
+        self.inviters.add(record["user_id"], ts, record.get("nickname") or "")
+
+        start, end, key = self._bucket_range
+        if not start <= ts < end:
+            self._bucket_range = bucket_range(ts, self.bucket)
+            key = self._bucket_range[2]
+        self.buckets.add(key, ts)
+
+    def consume(self, records: Iterable[Record]) -> "ViolationAggregator":
+        """单次遍历聚合所有记录"""
+        for record in records:
+            self.add(record)
+        return self
+
+    def counter(self, dimension: str) -> BoundedCounter:
+        if dimension == "target":
+            return self.targets
+        if dimension == "inviter":
+            return self.inviters
+        if dimension == "time":
+            return self.buckets
+        raise ValueError(f"不支持的统计维度: {dimension}")
+
+    def rows(self, dimension: str, min_count: int = 1, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """生成某个维度的导出行，目标群和邀请者按次数从大到小排列，时间段按时间顺序排列"""
+        if dimension == "time":
+            for key, stats in sorted(self.buckets.stats.items()):
+                if stats.count >= min_count:
+                    yield {"bucket": key, "count": stats.count}
+            return
+        name_field = "target_group_name" if dimension == "target" else "nickname"
+        key_field = "target_group" if dimension == "target" else "user_id"
+        for key, stats in self.counter(dimension).top(limit, min_count):
+            yield {
+                key_field: key,
+                name_field: stats.label,
+                "count": stats.count,
+                "first_seen": datetime.fromtimestamp(stats.first_ts).strftime(TEXT_LOG_TIME_FORMAT),
+                "last_seen": datetime.fromtimestamp(stats.last_ts).strftime(TEXT_LOG_TIME_FORMAT),
+            }
+
+    def to_dict(self, min_count: int = 1, limit: Optional[int] = None) -> Dict[str, Any]:
+        """生成包含所有维度的 JSON 结构"""
+        return {
+            "total": self.total,
+            "first_seen": self._format_ts(self.first_ts),
+            "last_seen": self._format_ts(self.last_ts),
+            "bucket": self.bucket,
+            "approximate": {
+                "target": self.targets.error,
+                "inviter": self.inviters.error,
+            },
+            "targets": list(self.rows("target", min_count, limit)),
+            "inviters": list(self.rows("inviter", min_count, limit)),
+            "time": list(self.rows("time")),
+        }
+
+    @staticmethod
+    def _format_ts(ts: Optional[int]) -> Optional[str]:
+        return datetime.fromtimestamp(ts).strftime(TEXT_LOG_TIME_FORMAT) if ts is not None else None
+
+    @staticmethod
+    def _key_count(counter: BoundedCounter) -> str:
+        # 丢弃过键后无法得知准确的键数
+        return str(len(counter)) if counter.exact else f"超过 {len(counter)}"
+
+    def _error_note(self, counter: BoundedCounter) -> str:
+        return "" if counter.exact else f"（近似值，误差不超过 {counter.error} 次）"
+
+    def summary(self, top: int = 10) -> str:
+        """生成前 N 名摘要文本"""
+        if not self.total:
+            return "没有符合条件的违规记录"
+        lines = [
+            f"违规记录 {self.total} 条（{self._format_ts(self.first_ts)} ~ {self._format_ts(self.last_ts)}）, "
+            f"{self._key_count(self.targets)} 个目标群, {self._key_count(self.inviters)} 名邀请者"
+        ]
+        lines.append(f"目标群前 {top} 名{self._error_note(self.targets)}:")
+        for row in self.rows("target", limit=top):
+            name = f" {row['target_group_name']}" if row["target_group_name"] else ""
+            lines.append(f"  {row['target_group']}{name}: {row['count']} 次, 最近 {row['last_seen']}")
+        lines.append(f"邀请者前 {top} 名{self._error_note(self.inviters)}:")
+        for row in self.rows("inviter", limit=top):
+            lines.append(f"  {row['nickname']} ({row['user_id']}): {row['count']} 次, 最近 {row['last_seen']}")
+        busiest = self.buckets.top(1)
+        if busiest:
+            key, stats = busiest[0]
+            lines.append(f"按{self.bucket}统计 {len(self.buckets)} 个时间段, 最多为 {key}: {stats.count} 次")
+        return "\n".join(lines)
+
+
+def write_csv(aggregator: ViolationAggregator, dimension: str, output: TextIO, min_count: int = 1) -> int:
+    """以 CSV 格式写出某个维度，返回写出的行数"""
+    writer: Optional[csv.DictWriter] = None
+    written = 0
+    for row in aggregator.rows(dimension, min_count):
+        if writer is None:
+            writer = csv.DictWriter(output, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        written += 1
+    return written
+
+
+def write_json(aggregator: ViolationAggregator, output: TextIO, min_count: int = 1) -> int:
+    """以 JSON 格式写出所有维度，返回写出的行数"""
+    data = aggregator.to_dict(min_count)
+    json.dump(data, output, ensure_ascii=False, indent=2)
+    output.write("\n")
+    return len(data["targets"]) + len(data["inviters"]) + len(data["time"])
+
+
+def export_file(aggregator: ViolationAggregator, path: Path, dimension: str, fmt: str, min_count: int = 1) -> int:
+    """导出到文件，CSV 只包含一个维度，JSON 包含所有维度，返回导出的行数"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            return write_csv(aggregator, dimension, f, min_count)
+        return write_json(aggregator, f, min_count)
+
+
+def parse_date(value: str) -> int:
+    """将 YYYY-MM-DD 解析为本地时间当天零点的时间戳"""
+    return int(datetime.strptime(value, "%Y-%m-%d").timestamp())
+
+
+def main(argv: Optional[List[str]] = None):
+    plugin_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="违规记录统计与导出")
+    parser.add_argument("command", choices=["summary", "export"], help="summary 输出前 N 名摘要，export 导出统计结果")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--log", type=Path, help="文本违规日志路径（自动包含轮转和压缩分段），默认为插件目录下的 violation_logs.txt")
+    source.add_argument("--db", type=Path, help="违规记录数据库路径")
+    parser.add_argument("--since", type=parse_date, help="起始日期 YYYY-MM-DD（含）")
+    parser.add_argument("--until", type=parse_date, help="结束日期 YYYY-MM-DD（不含）")
+    parser.add_argument("--bucket", choices=list(BUCKETS), default="day", help="时间段")
+    parser.add_argument("--max-keys", dest="max_keys", type=int, default=100000, help="每个维度最多保留的键数，0 表示不限制")
+    parser.add_argument("--top", type=int, default=10, help="摘要中列出的前 N 名")
+    parser.add_argument("--by", choices=DIMENSIONS, default="target", help="CSV 导出的维度")
+    parser.add_argument("--format", choices=FORMATS, default="csv", help="导出格式")
+    parser.add_argument("--min-count", dest="min_count", type=int, default=1, help="只导出次数不少于该值的目标群和邀请者")
+    parser.add_argument("--output", type=Path, help="导出文件路径，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    aggregator = ViolationAggregator(args.bucket, args.max_keys, args.since, args.until)
+    if args.db is not None:
+        records = iter_sqlite(args.db, args.since, args.until)
+    else:
+        records = iter_text_log(args.log or plugin_dir / "violation_logs.txt")
+    aggregator.consume(records)
+
+    if args.command == "summary":
+        print(aggregator.summary(args.top))
+    elif args.output is not None:
+        written = export_file(aggregator, args.output, args.by, args.format, args.min_count)
+        print(f"已导出 {written} 行到 {args.output}", file=sys.stderr)
+    elif args.format == "csv":
+        write_csv(aggregator, args.by, sys.stdout, args.min_count)
+    else:
+        write_json(aggregator, sys.stdout, args.min_count)
+
+
+if __name__ == "__main__":
+    main()
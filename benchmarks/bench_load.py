@@ -0,0 +1,290 @@
+"""
+群邀请负载测试
+
+使用 fake_onebot 模拟的 OneBot V11 后端，按场景向插件投递大量群邀请事件，
+统计事件处理吞吐量、邀请到踢出的 p50/p99 延迟以及每次邀请的 API 调用次数。
+插件使用临时目录中的配置文件和日志，不会修改插件目录下的 config.ini。
+
+用法:
+    python benchmarks/bench_load.py                      # 依次运行所有场景
+    python benchmarks/bench_load.py --scenario storm     # 只运行一个场景
+    python benchmarks/bench_load.py --scenario storm --latency 0.05 --transport group
+
+每个场景在独立的子进程中运行，互不影响。
+"""
+
+import argparse
+import asyncio
+import configparser
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+# 场景默认参数，命令行参数可覆盖
+SCENARIOS: Dict[str, Dict] = {
+    # 成员索引未启用、缓存为空，每次邀请都要逐群查询
+    "cold_start": dict(groups=20, members=200, invites=200, inviters=200, member_index=False, latency=0.02),
+    # 50 名广告号在极短时间内发出 1000 次邀请
+    "storm": dict(groups=20, members=500, invites=1000, inviters=50, member_index=True, latency=0.02),
+    # 500 个监控群
+    "wide": dict(groups=500, members=50, invites=300, inviters=300, member_index=True, latency=0.005),
+    # 与 wide 相同，但启动时从上次保存的成员索引快照加载，不逐群获取成员列表
+    "warm_start": dict(groups=500, members=50, invites=300, inviters=300, member_index=True, latency=0.005, snapshot=True),
+}
+
+DEFAULTS = dict(
+    monitors=1,
+    admins=1,
+    jitter=0.0,
+    error_rate=0.0,
+    rate=0.0,
+    noise=0.2,
+    transport="local",
+    # 与 config.ini 的默认值一致；合并窗口只推迟警告消息，不影响踢人延迟
+    merge_window=3.0,
+    sender_rate=0.5,
+    timeout=120.0,
+    seed=0,
+    metrics=False,
+    snapshot=False,
+)
+
+COMMUNICATION_GROUP = 99999
+FIRST_MONITOR_ID = 1000001
+FIRST_ADMIN_ID = 2000001
+FIRST_TARGET_GROUP = 900000000
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def write_config(path: Path, params: Dict, group_ids: List[int], monitor_ids: List[str], admin_ids: List[str]):
+    """生成负载测试使用的配置文件"""
+    config = configparser.ConfigParser()
+    config["bots"] = {"monitor_bot_id": ", ".join(monitor_ids), "admin_bot_id": ", ".join(admin_ids)}
+    config["groups"] = {
+        "monitored_groups": ", ".join(str(group_id) for group_id in group_ids),
+        "communication_group": str(COMMUNICATION_GROUP),
+    }
+    config["settings"] = {
+        "enabled": "true",
+        "member_index_enabled": str(params["member_index"]).lower(),
+        "member_index_refresh_interval": "0",
+        "member_index_snapshot": str(path.parent / "member_index.json"),
+        "dedup_window": "30",
+        "detection_format": "compact",
+    }
+    config["violation_log"] = {"backend": "text", "flush_interval": "0.2"}
+    config["sender"] = {"rate": str(params["sender_rate"]), "batch_window": "0.2", "retry_backoff": "0.05"}
+    config["executor"] = {"merge_window": str(params["merge_window"]), "retry_backoff": "0.05"}
+    config["transport"] = {"mode": params["transport"]}
+    config["metrics"] = {"enabled": str(params["metrics"]).lower()}
+    config["journal"] = {"path": str(path.parent / "pending_journal.log")}
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+
+
+def write_member_snapshot(path: Path, network, group_ids: List[int]):
+    """按模拟网络的当前成员生成成员索引快照，模拟上次运行时保存的快照"""
+    groups = {}
+    for group_id in group_ids:
+        members = network.groups[group_id]
+        groups[str(group_id)] = {
+            "synced_at": time.time(),
+            "members": list(members),
+            "roles": {str(user_id): role for user_id, role in members.items() if role != "member"},
+        }
+    path.write_text(json.dumps({"version": 1, "groups": groups}), encoding="utf-8")
+
+
+async def run_scenario(name: str, params: Dict):
+    sys.path.insert(0, str(PLUGIN_DIR.parent))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import nonebot
+
+    nonebot.init(driver="~none", log_level="ERROR")
+    from fake_onebot import FakeNetwork, create_adapter, group_invite_event
+    from nonebot.message import handle_event
+
+    adapter = create_adapter()
+    driver = nonebot.get_driver()
+    module = nonebot.load_plugin(PLUGIN_DIR.name).module
+
+    network = FakeNetwork(
+        params["groups"], params["members"], params["latency"], params["jitter"], seed=params["seed"]
+    )
+    group_ids = network.group_ids
+    monitor_ids = [str(FIRST_MONITOR_ID + index) for index in range(params["monitors"])]
+    admin_ids = [str(FIRST_ADMIN_ID + index) for index in range(params["admins"])]
+
+    # 普通成员中选出邀请者，另有一部分邀请来自不在任何监控群中的用户
+    candidates = network.members("member")
+    network.random.shuffle(candidates)
+    inviters: List[Tuple[int, int]] = candidates[: params["inviters"]]
+    for self_id in monitor_ids:
+        network.join(self_id, group_ids + [COMMUNICATION_GROUP])
+    for self_id in admin_ids:
+        network.join(self_id, group_ids, role="admin")
+        network.join(self_id, [COMMUNICATION_GROUP])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        module.config_file_path = tmp_dir / "config.ini"
+        module.violation_log_writer.path = tmp_dir / "violation_logs.txt"
+        module.kick_executor.state_path = None
+        write_config(module.config_file_path, params, group_ids, monitor_ids, admin_ids)
+        if params["snapshot"]:
+            write_member_snapshot(tmp_dir / "member_index.json", network, group_ids)
+        await module.reload_plugin_config()
+        await driver._lifespan.startup()
+
+        # 连接机器人，等待机器人池登记和成员索引加载完成
+        connect_start = time.perf_counter()
+        deadline = connect_start + params["timeout"]
+        bots = [network.create_bot(adapter, self_id) for self_id in monitor_ids + admin_ids]
+        for bot in bots:
+            driver._bot_connect(bot)
+        while time.perf_counter() < deadline and (
+            len(module.monitor_pool.bots) < len(monitor_ids)
+            or len(module.admin_pool.bots) < len(admin_ids)
+            or (params["member_index"] and module.member_index.group_count < len(group_ids))
+        ):
+            await asyncio.sleep(0.01)
+        connect_time = time.perf_counter() - connect_start
+        startup_calls = sum(network.api_calls.values())
+        network.api_calls.clear()
+        # 模拟的调用失败只在启动完成后注入，避免登记阶段的失败使各场景的起点不一致
+        network.error_rate = params["error_rate"]
+
+        # 生成邀请事件
+        events = []
+        noise_user = 90000000
+        for index in range(params["invites"]):
+            target_group = FIRST_TARGET_GROUP + index
+            if params["noise"] and network.random.random() < params["noise"]:
+                noise_user += 1
+                events.append((None, noise_user, target_group))
+            else:
+                group_id, user_id = inviters[index % len(inviters)]
+                events.append((group_id, user_id, target_group))
+        expected = {(group_id, user_id) for group_id, user_id, _ in events if group_id is not None}
+
+        first_seen: Dict[Tuple[int, int], float] = {}
+        monitor_bots = bots[: len(monitor_ids)]
+
+        async def dispatch(index: int, group_id, user_id: int, target_group: int):
+            bot = monitor_bots[index % len(monitor_bots)]
+            if group_id is not None:
+                first_seen.setdefault((group_id, user_id), time.perf_counter())
+            event = group_invite_event(int(bot.self_id), user_id, target_group, f"flag{index}")
+            await handle_event(bot, event)
+
+        start = time.perf_counter()
+        if params["rate"] > 0:
+            tasks = []
+            for index, item in enumerate(events):
+                tasks.append(asyncio.create_task(dispatch(index, *item)))
+                await asyncio.sleep(1 / params["rate"])
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.gather(*(dispatch(index, *item) for index, item in enumerate(events)))
+        dispatch_time = time.perf_counter() - start
+
+        # 等待所有应被踢出的邀请者被踢出
+        deadline = time.perf_counter() + params["timeout"]
+        while not expected.issubset(network.kicks) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        total_time = time.perf_counter() - start
+
+        latencies = [network.kicks[key] - first_seen[key] for key in expected if key in network.kicks]
+        kicked = len(latencies)
+        api_calls = sum(network.api_calls.values())
+
+        print(f"== 场景 {name} ==")
+        print(
+            f"参数: {params['groups']} 个监控群 x {params['members']} 人, {params['invites']} 次邀请 / "
+            f"{len(expected)} 名违规邀请者, 监控机器人 {params['monitors']}, 管理机器人 {params['admins']}, "
+            f"API 延迟 {params['latency'] * 1000:.0f}ms, 失败率 {params['error_rate']:.0%}, "
+            f"成员索引 {'开' if params['member_index'] else '关'}{'（快照）' if params['snapshot'] else ''}, "
+            f"传输 {params['transport']}"
+        )
+        print(f"启动: {connect_time:.2f}s, {startup_calls} 次 API 调用")
+        print(f"事件处理: {dispatch_time:.2f}s, 吞吐 {params['invites'] / dispatch_time:.0f} 次邀请/秒")
+        print(f"踢出: {kicked}/{len(expected)}, 总耗时 {total_time:.2f}s")
+        print(
+            f"邀请到踢出延迟: p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+            f"p99 {percentile(latencies, 99) * 1000:.1f}ms, 最大 {max(latencies, default=0) * 1000:.1f}ms"
+        )
+        print(f"每次邀请 API 调用: {api_calls / max(params['invites'], 1):.2f}")
+        print(network.summary())
+        if params["metrics"]:
+            print(module.metrics_summary())
+        print()
+
+        # 等待投递中的通讯群消息等事件处理完成，避免关闭后仍有处理器在运行
+        await network.drain()
+        await driver._lifespan.shutdown()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="群邀请负载测试")
+    parser.add_argument("--scenario", default="all", choices=["all", *SCENARIOS], help="要运行的场景")
+    parser.add_argument("--groups", type=int, help="监控群数量")
+    parser.add_argument("--members", type=int, help="每个群的成员数")
+    parser.add_argument("--invites", type=int, help="邀请事件数")
+    parser.add_argument("--inviters", type=int, help="违规邀请者数量")
+    parser.add_argument("--member-index", dest="member_index", type=lambda v: v.lower() == "true", help="是否启用成员索引 (true/false)")
+    parser.add_argument("--monitors", type=int, help="监控机器人数量")
+    parser.add_argument("--admins", type=int, help="管理机器人数量")
+    parser.add_argument("--latency", type=float, help="API 平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, help="API 延迟抖动（秒）")
+    parser.add_argument("--error-rate", dest="error_rate", type=float, help="API 调用失败率 (0~1)")
+    parser.add_argument("--rate", type=float, help="每秒投递的邀请数，0 表示同时投递")
+    parser.add_argument("--noise", type=float, help="来自非监控群成员的邀请比例 (0~1)")
+    parser.add_argument("--transport", choices=["local", "group"], help="检测结果传输方式")
+    parser.add_argument("--merge-window", dest="merge_window", type=float, help="踢人警告合并窗口（秒）")
+    parser.add_argument("--sender-rate", dest="sender_rate", type=float, help="通讯群消息发送速率（条/秒）")
+    parser.add_argument("--timeout", type=float, help="等待踢出完成的最长时间（秒）")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    parser.add_argument("--metrics", action="store_true", default=None, help="启用运行指标并输出摘要")
+    parser.add_argument("--snapshot", action="store_true", default=None, help="启动时从成员索引快照加载")
+    return parser, parser.parse_args()
+
+
+def main():
+    parser, args = parse_args()
+    overrides = {key: value for key, value in vars(args).items() if key != "scenario" and value is not None}
+
+    if args.scenario == "all":
+        # 插件使用模块级全局状态，每个场景在独立的进程中运行
+        passthrough, skip_value = [], False
+        for arg in sys.argv[1:]:
+            if skip_value:
+                skip_value = False
+            elif arg == "--scenario":
+                # 同时去掉参数值，如 --scenario all
+                skip_value = True
+            elif not arg.startswith("--scenario="):
+                passthrough.append(arg)
+        for name in SCENARIOS:
+            subprocess.run([sys.executable, __file__, "--scenario", name, *passthrough], check=False)
+        return
+
+    params = {**DEFAULTS, **SCENARIOS[args.scenario], **overrides}
+    asyncio.run(run_scenario(args.scenario, params))
+
+
+if __name__ == "__main__":
+    main()
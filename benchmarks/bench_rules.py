@@ -0,0 +1,144 @@
+"""
+匹配规则单事件开销基准测试
+
+测量群邀请规则、检测消息规则和成员变动通知规则对不相关事件的单次判断耗时，
+并与使用具体事件类型注解、构造字符串比较的旧写法对比。
+
+- 响应器: 通过 Matcher.check_rule 判断，与 NoneBot 分发事件时的路径相同，
+  事件类型不符的响应器在这里直接跳过，不会调用规则
+- 规则函数: 直接调用规则函数本身，不含 NoneBot 依赖注入的开销
+
+用法（在插件目录的上一级目录或任意位置运行均可）:
+    python benchmarks/bench_rules.py [-n 次数]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR.parent))
+
+import nonebot  # noqa: E402
+
+nonebot.init(driver="~none", log_level="WARNING")
+
+from nonebot.adapters.onebot.v11 import (  # noqa: E402
+    Adapter,
+    Bot,
+    GroupIncreaseNoticeEvent,
+    GroupMessageEvent,
+    GroupRequestEvent,
+    Message,
+)
+from nonebot.adapters.onebot.v11.event import Sender  # noqa: E402
+from nonebot.rule import Rule  # noqa: E402
+
+driver = nonebot.get_driver()
+driver.register_adapter(Adapter)
+plugin = nonebot.load_plugin(PLUGIN_DIR.name)
+module = plugin.module
+config = module.plugin_config
+
+OTHER_BOT_ID = 999999999
+OTHER_GROUP_ID = 888888888
+
+
+def group_message(self_id: int, group_id: int, text: str) -> GroupMessageEvent:
+    message = Message(text)
+    return GroupMessageEvent(
+        time=int(time.time()), self_id=self_id, post_type="message", sub_type="normal",
+        user_id=10001, message_type="group", message_id=1, message=message, original_message=message,
+        raw_message=text, font=0, sender=Sender(user_id=10001), group_id=group_id, to_me=False,
+    )
+
+
+def group_request(self_id: int, sub_type: str) -> GroupRequestEvent:
+    return GroupRequestEvent(
+        time=int(time.time()), self_id=self_id, post_type="request", request_type="group",
+        sub_type=sub_type, group_id=OTHER_GROUP_ID, user_id=10001, comment="", flag="flag",
+    )
+
+
+def member_increase(self_id: int, group_id: int) -> GroupIncreaseNoticeEvent:
+    return GroupIncreaseNoticeEvent(
+        time=int(time.time()), self_id=self_id, post_type="notice", notice_type="group_increase",
+        sub_type="approve", group_id=group_id, operator_id=0, user_id=10001,
+    )
+
+
+async def _legacy_detection_rule(event: GroupMessageEvent) -> bool:
+    """旧写法：具体事件类型注解，并构造字符串比较"""
+    if not config.enabled:
+        return False
+    if not config.communication_group or event.group_id != config.communication_group:
+        return False
+    if str(event.self_id) not in config.admin_bot_ids:
+        return False
+    return module.is_detection_text(str(event.message).strip())
+
+
+# 与检测消息响应器注册方式相同，仅规则不同
+legacy_matcher = nonebot.on_message(rule=Rule(_legacy_detection_rule), priority=5)
+
+
+def rule_function(matcher):
+    """取出响应器中唯一的规则函数"""
+    (checker,) = matcher.rule.checkers
+    return checker.call
+
+
+async def measure(check, iterations: int) -> float:
+    """返回单次判断的平均耗时（微秒）"""
+    for _ in range(min(iterations, 1000)):
+        await check()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await check()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations: int):
+    adapter = Adapter(driver)
+    admin_id = int(config.admin_bot_ids[0]) if config.admin_bot_ids else OTHER_BOT_ID
+    monitor_id = int(config.monitor_bot_ids[0]) if config.monitor_bot_ids else OTHER_BOT_ID
+    comm_group = config.communication_group or OTHER_GROUP_ID
+    bot = Bot(adapter, str(admin_id))
+
+    detection = module.detection_message_handler
+    invite = module.group_invite_handler
+    notice = module.member_notice_handler
+    legacy = legacy_matcher
+
+    cases = [
+        ("检测消息规则 | 其他群的普通消息", detection, group_message(admin_id, OTHER_GROUP_ID, "hello " * 20)),
+        ("检测消息规则 | 其他机器人的消息", detection, group_message(OTHER_BOT_ID, OTHER_GROUP_ID, "hello")),
+        ("检测消息规则 | 通讯群的普通消息", detection, group_message(admin_id, comm_group, "hello " * 20)),
+        ("检测消息规则 | 收到群邀请事件", detection, group_request(monitor_id, "invite")),
+        ("旧写法 | 其他群的普通消息", legacy, group_message(admin_id, OTHER_GROUP_ID, "hello " * 20)),
+        ("旧写法 | 通讯群的普通消息", legacy, group_message(admin_id, comm_group, "hello " * 20)),
+        ("邀请规则 | 其他机器人的邀请", invite, group_request(OTHER_BOT_ID, "invite")),
+        ("邀请规则 | 加群申请", invite, group_request(monitor_id, "add")),
+        ("邀请规则 | 群消息", invite, group_message(admin_id, OTHER_GROUP_ID, "hello")),
+        ("成员通知规则 | 其他机器人的通知", notice, member_increase(OTHER_BOT_ID, OTHER_GROUP_ID)),
+    ]
+
+    print(f"每种情况 {iterations} 次，单次平均耗时（µs）：")
+    print(f"  {'情况':<28}{'响应器':>10}{'规则函数':>10}")
+    for name, matcher, event in cases:
+        through_matcher = await measure(lambda: matcher.check_rule(bot, event, {}), iterations)
+        function = rule_function(matcher)
+        if matcher is invite:
+            direct = await measure(lambda: function(bot, event, {}), iterations)
+        else:
+            direct = await measure(lambda: function(event), iterations)
+        print(f"  {name:<28}{through_matcher:>10.2f}{direct:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匹配规则单事件开销基准测试")
+    parser.add_argument("-n", "--iterations", type=int, default=20000, help="每种情况的判断次数")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
@@ -0,0 +1,195 @@
+"""
+模拟 OneBot V11 后端
+
+在内存中模拟若干QQ群及其成员，FakeOneBot 的 API 调用经 FakeAdapter 直接读写这些数据，
+可配置调用延迟和失败率，用于在没有QQ账号的情况下对插件做负载测试。
+通讯群中的消息会作为 GroupMessageEvent 投递给同群的其他机器人。
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import nonebot
+from nonebot.adapters.onebot.v11 import Adapter, Bot, GroupMessageEvent, GroupRequestEvent, Message
+from nonebot.adapters.onebot.v11.event import Sender
+from nonebot.adapters.onebot.v11.exception import ActionFailed, NetworkError
+from nonebot.message import handle_event
+
+
+class FakeNetwork:
+    """模拟的QQ群数据和 API 调用统计"""
+
+    def __init__(
+        self,
+        group_count: int,
+        members_per_group: int,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        first_group_id: int = 100000,
+        first_user_id: int = 10000000,
+        seed: int = 0,
+    ):
+        self.random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # 群号 -> {QQ号: 角色}
+        self.groups: Dict[int, Dict[int, str]] = {}
+        self.group_names: Dict[int, str] = {}
+        user_id = first_user_id
+        for index in range(group_count):
+            group_id = first_group_id + index
+            members = {}
+            for member_index in range(members_per_group):
+                # 每个群的第一名成员为群主，之后每 50 人中有一名管理员
+                role = "owner" if member_index == 0 else "admin" if member_index % 50 == 0 else "member"
+                members[user_id] = role
+                user_id += 1
+            self.groups[group_id] = members
+            self.group_names[group_id] = f"模拟群{index}"
+        self.bots: Dict[str, "FakeOneBot"] = {}
+        self.api_calls: Counter = Counter()
+        self.api_errors: Counter = Counter()
+        # (群号, QQ号) -> 踢出时间
+        self.kicks: Dict[Tuple[int, int], float] = {}
+        self.messages: List[Tuple[int, str]] = []
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def group_ids(self) -> List[int]:
+        return list(self.groups)
+
+    def members(self, role: Optional[str] = None) -> List[Tuple[int, int]]:
+        """返回 (群号, QQ号) 列表，可按角色筛选"""
+        return [
+            (group_id, user_id)
+            for group_id, members in self.groups.items()
+            for user_id, member_role in members.items()
+            if role is None or member_role == role
+        ]
+
+    def join(self, self_id: str, group_ids, role: str = "member"):
+        """让机器人加入若干群"""
+        for group_id in group_ids:
+            self.groups.setdefault(group_id, {})[int(self_id)] = role
+
+    def create_bot(self, adapter: Adapter, self_id: str) -> "FakeOneBot":
+        bot = FakeOneBot(adapter, self_id, self)
+        self.bots[self_id] = bot
+        return bot
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    def deliver_group_message(self, sender: "FakeOneBot", group_id: int, text: str):
+        """把群消息作为事件投递给同群的其他机器人"""
+        self.messages.append((group_id, text))
+        for bot in self.bots.values():
+            if bot is sender or int(bot.self_id) not in self.groups.get(group_id, {}):
+                continue
+            event = group_message_event(int(bot.self_id), group_id, int(sender.self_id), text)
+            task = asyncio.create_task(handle_event(bot, event))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """等待所有投递中的事件处理完成"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def summary(self) -> str:
+        calls = ", ".join(f"{api} {count}" for api, count in sorted(self.api_calls.items()))
+        return f"API 调用: {calls or '无'}（失败 {sum(self.api_errors.values())} 次）"
+
+
+class FakeOneBot(Bot):
+    """API 调用由 FakeNetwork 应答的机器人"""
+
+    def __init__(self, adapter: Adapter, self_id: str, network: FakeNetwork):
+        super().__init__(adapter, self_id)
+        self.network = network
+
+    def _member(self, group_id: int, user_id: int) -> Dict[str, Any]:
+        members = self.network.groups.get(group_id, {})
+        if user_id not in members:
+            raise ActionFailed(retcode=100, msg="不是群成员", wording="群成员不存在")
+        return {
+            "group_id": group_id,
+            "user_id": user_id,
+            "nickname": f"用户{user_id}",
+            "card": f"名片{user_id}",
+            "role": members[user_id],
+        }
+
+    async def handle_api(self, api: str, **data: Any) -> Any:
+        """应答一次 API 调用"""
+        network = self.network
+        network.api_calls[api] += 1
+        await network.delay()
+        if network.error_rate and network.random.random() < network.error_rate:
+            network.api_errors[api] += 1
+            raise NetworkError(f"模拟的 {api} 调用失败")
+
+        self_id = int(self.self_id)
+        if api == "get_group_list":
+            return [
+                {"group_id": group_id, "group_name": network.group_names.get(group_id, "")}
+                for group_id, members in network.groups.items()
+                if self_id in members
+            ]
+        if api == "get_group_member_list":
+            group_id = data["group_id"]
+            return [self._member(group_id, user_id) for user_id in network.groups.get(group_id, {})]
+        if api == "get_group_member_info":
+            return self._member(data["group_id"], data["user_id"])
+        if api == "get_group_info":
+            group_id = data["group_id"]
+            return {"group_id": group_id, "group_name": network.group_names.get(group_id, f"群{group_id}")}
+        if api == "set_group_kick":
+            group_id, user_id = data["group_id"], data["user_id"]
+            if network.groups.get(group_id, {}).get(self_id) not in ("admin", "owner"):
+                raise ActionFailed(retcode=102, msg="没有权限", wording="没有管理员权限")
+            network.groups[group_id].pop(user_id, None)
+            network.kicks.setdefault((group_id, user_id), time.perf_counter())
+            return None
+        if api == "send_group_msg":
+            network.deliver_group_message(self, data["group_id"], str(data["message"]))
+            return {"message_id": len(network.messages)}
+        if api == "set_group_add_request":
+            return None
+        raise ActionFailed(retcode=1404, msg=f"模拟后端不支持 {api}", wording="")
+
+
+def group_message_event(self_id: int, group_id: int, user_id: int, text: str) -> GroupMessageEvent:
+    message = Message(text)
+    return GroupMessageEvent(
+        time=int(time.time()), self_id=self_id, post_type="message", sub_type="normal",
+        user_id=user_id, message_type="group", message_id=1, message=message, original_message=message,
+        raw_message=text, font=0, sender=Sender(user_id=user_id), group_id=group_id, to_me=False,
+    )
+
+
+def group_invite_event(self_id: int, inviter_id: int, target_group_id: int, flag: str) -> GroupRequestEvent:
+    return GroupRequestEvent(
+        time=int(time.time()), self_id=self_id, post_type="request", request_type="group",
+        sub_type="invite", group_id=target_group_id, user_id=inviter_id, comment="", flag=flag,
+    )
+
+
+class FakeAdapter(Adapter):
+    """API 调用交给 FakeOneBot 应答，仍经过 NoneBot 的 call_api 流程"""
+
+    async def _call_api(self, bot: Bot, api: str, **data: Any) -> Any:
+        return await bot.handle_api(api, **data)
+
+
+def create_adapter() -> Adapter:
+    """注册并返回模拟的 OneBot V11 适配器"""
+    driver = nonebot.get_driver()
+    driver.register_adapter(FakeAdapter)
+    return driver._adapters[FakeAdapter.get_name()]
@@ -0,0 +1,184 @@
+"""
+OneBot API 读取缓存
+
+为 get_group_member_info / get_group_info 等只读接口提供带 TTL 的 LRU 缓存，
+支持对"不在群中"等失败结果进行负缓存，并合并并发的相同请求。
+"""
+
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from nonebot.adapters.onebot.v11 import ActionFailed, Bot
+
+CacheKey = Tuple[str, str, Tuple[Tuple[str, Any], ...]]
+ApiCaller = Callable[..., Awaitable[Any]]
+
+
+async def call_api(bot: Bot, api: str, **params: Any) -> Any:
+    """直接调用 API"""
+    return await bot.call_api(api, **params)
+
+
+class ApiStats:
+    """单个 API 的缓存命中统计"""
+
+    __slots__ = ("hits", "negative_hits", "misses", "coalesced")
+
+    def __init__(self):
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+
+class ApiCache:
+    """OneBot API 读取缓存"""
+
+    def __init__(
+        self,
+        max_size: int = 4096,
+        ttls: Optional[Dict[str, float]] = None,
+        negative_ttl: float = 60,
+        call_api: ApiCaller = call_api,
+    ):
+        # call_api(bot, api, **params) 发出实际的 API 调用，如带计时的调用
+        self.call_api = call_api
+        # key -> (过期时间, 是否成功, 结果或异常)
+        self._entries: "OrderedDict[CacheKey, Tuple[float, bool, Any]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self._waiters: Dict[CacheKey, int] = {}
+        self._bot_ids: Set[str] = set()
+        self.stats: Dict[str, ApiStats] = {}
+        self.enabled = True
+        self.max_size = max_size
+        self.ttls: Dict[str, float] = dict(ttls or {})
+        self.negative_ttl = negative_ttl
+
+    def configure(self, enabled: bool, max_size: int, ttls: Dict[str, float], negative_ttl: float):
+        """更新缓存参数，保留已缓存的数据"""
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttls = dict(ttls)
+        self.negative_ttl = negative_ttl
+        if not enabled:
+            self.clear()
+        self._evict()
+
+    @staticmethod
+    def _make_key(self_id: str, api: str, params: Dict[str, Hashable]) -> CacheKey:
+        return self_id, api, tuple(sorted(params.items()))
+
+    def _stats(self, api: str) -> ApiStats:
+        stats = self.stats.get(api)
+        if stats is None:
+            stats = self.stats[api] = ApiStats()
+        return stats
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _store(self, key: CacheKey, ttl: float, ok: bool, value: Any):
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, ok, value)
+        self._entries.move_to_end(key)
+        self._evict()
+
+    async def call(self, bot: Bot, api: str, **params: Hashable) -> Any:
+        """通过缓存调用 API，未配置 TTL 的接口直接透传"""
+        ttl = self.ttls.get(api, 0)
+        if not self.enabled or ttl <= 0:
+            return await self.call_api(bot, api, **params)
+
+        self_id = str(bot.self_id)
+        self._bot_ids.add(self_id)
+        key = self._make_key(self_id, api, params)
+        stats = self._stats(api)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, ok, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                if ok:
+                    stats.hits += 1
+                    return value
+                stats.negative_hits += 1
+                # 每次抛出新的副本，缓存的异常不会累积调用栈
+                raise copy.copy(value)
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            stats.coalesced += 1
+        else:
+            stats.misses += 1
+            task = asyncio.create_task(self._fetch(bot, key, api, ttl, params))
+            # 所有调用方都已取消时避免出现未获取异常的警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        # 单个调用方被取消（如超时）不影响其他等待同一请求的调用方，
+        # 最后一个调用方取消时才取消实际请求
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters.get(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+            else:
+                self._waiters.pop(key, None)
+
+    async def _fetch(self, bot: Bot, key: CacheKey, api: str, ttl: float, params: Dict[str, Hashable]) -> Any:
+        try:
+            result = await self.call_api(bot, api, **params)
+        except ActionFailed as e:
+            # 接口明确返回失败（如用户不在群中），进行负缓存；
+            # 缓存不带调用栈的副本，避免在缓存期间持有调用栈中的帧和局部变量
+            self._store(key, self.negative_ttl, False, copy.copy(e))
+            raise
+        else:
+            self._store(key, ttl, True, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, api: str, **params: Hashable):
+        """使所有机器人对应的缓存项失效"""
+        for self_id in self._bot_ids:
+            self._entries.pop(self._make_key(self_id, api, params), None)
+
+    def invalidate_group(self, group_id: int):
+        """使与某个群相关的所有缓存项失效"""
+        for key in [key for key in self._entries if ("group_id", group_id) in key[2]]:
+            del self._entries[key]
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def summary(self) -> str:
+        """生成缓存统计文本"""
+        lines = [f"缓存状态: {'启用' if self.enabled else '禁用'}, 条目 {self.size}/{self.max_size}"]
+        for api, stats in sorted(self.stats.items()):
+            total = stats.hits + stats.negative_hits + stats.misses + stats.coalesced
+            hit_rate = (stats.hits + stats.negative_hits + stats.coalesced) / total * 100 if total else 0.0
+            lines.append(
+                f"{api}: 命中 {stats.hits}, 负缓存命中 {stats.negative_hits}, "
+                f"合并 {stats.coalesced}, 未命中 {stats.misses}, 命中率 {hit_rate:.1f}%"
+            )
+        if not self.stats:
+            lines.append("暂无调用记录")
+        return "\n".join(lines)
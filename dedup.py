@@ -0,0 +1,72 @@
+"""
+群邀请去重
+
+广告号通常在几秒内向多名成员发出同一个群的邀请。以 (邀请者, 监控群) 为键，
+在时间窗口内只对第一次邀请执行完整的检测流程，后续邀请只计数。
+窗口从第一次邀请开始计时，到期时由定时器关闭并回调汇总的邀请次数；
+窗口关闭后同一邀请者的下一次邀请会重新检测，首次踢出失败时不会一直被当作重复邀请忽略。
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class InviteWindow:
+    """单个去重窗口"""
+
+    __slots__ = ("first_seen", "last_seen", "count", "payload", "handle")
+
+    def __init__(self, now: float):
+        self.first_seen = now
+        self.last_seen = now
+        self.count = 1
+        # 窗口关闭时随回调一起交给调用方的数据，如待写入的违规记录
+        self.payload: Any = None
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class InviteDeduplicator:
+    """基于固定时间窗口的邀请去重器"""
+
+    def __init__(self, window: float = 30, on_expire: Optional[Callable[[Hashable, int, float, Any], None]] = None):
+        self.window = window
+        # 窗口关闭时回调 (键, 窗口内邀请次数, 首次到最近一次邀请的间隔, 附加数据)
+        self.on_expire = on_expire
+        self._entries: Dict[Hashable, InviteWindow] = {}
+
+    def hit(self, key: Hashable) -> int:
+        """记录一次邀请，返回该键在当前窗口内的邀请次数（1 表示首次）"""
+        if self.window <= 0:
+            return 1
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = InviteWindow(now)
+            entry.handle = asyncio.get_running_loop().call_later(self.window, self._close, key)
+            return 1
+        entry.last_seen = now
+        entry.count += 1
+        return entry.count
+
+    def defer(self, key: Hashable, payload: Any) -> bool:
+        """将数据附加到该键当前的窗口，窗口关闭时随回调交出；没有打开的窗口时返回 False"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry.payload = payload
+        return True
+
+    def _close(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.handle is not None:
+            entry.handle.cancel()
+        if self.on_expire is not None:
+            self.on_expire(key, entry.count, entry.last_seen - entry.first_seen, entry.payload)
+
+    def close_all(self):
+        """立即关闭所有窗口，如插件关闭时"""
+        for key in list(self._entries):
+            self._close(key)
@@ -0,0 +1,224 @@
+"""
+未完成操作持久化日志
+
+尚未交给管理机器人的检测结果和尚未执行的踢人操作在进入内存队列前先追加到日志文件，
+完成后再追加一条完成记录。记录由后台任务按时间间隔攒批写入，每批只调用一次 fsync，
+热路径上没有同步磁盘写入；进程意外退出时，最多丢失最近一个写入间隔内的记录。
+启动时重放日志，所有未完成的条目会被重新处理（至少一次）；
+完成记录累计到一定数量后，只保留未完成的条目重写日志文件。
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from nonebot import logger
+
+# 条目类型：监控端尚未交给管理端的检测结果、管理端尚未执行的踢人操作
+KIND_DETECTION = "detection"
+KIND_KICK = "kick"
+
+Entry = Tuple[int, str, Dict[str, Any]]
+
+
+class ActionJournal:
+    """追加写入的未完成操作日志"""
+
+    def __init__(self, path: Path, flush_interval: float = 0.05, compact_threshold: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        # 未完成的条目 id -> (类型, 数据)
+        self._pending: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        # 尚未写入文件的记录
+        self._buffer: List[str] = []
+        self._next_id = 1
+        # 上次重写以来写入的完成记录数
+        self._completed = 0
+        self._file = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.opened = False
+
+    def configure(self, flush_interval: float, compact_threshold: int):
+        """更新写入间隔和重写阈值"""
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def open(self) -> List[Entry]:
+        """读取日志文件并启动后台写入任务，按记录顺序返回上次未完成的条目"""
+        if self.opened:
+            return []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pending, invalid = await asyncio.to_thread(self._replay)
+        self._next_id = max(self._pending, default=0) + 1
+        if invalid:
+            logger.warning(f"未完成操作日志中有 {invalid} 行无法解析，已跳过")
+        # 重放后只保留未完成的条目，同时打开追加写入的文件
+        await asyncio.to_thread(self._rewrite, list(self._pending.items()))
+        self._completed = 0
+        self.opened = True
+        self._task = asyncio.create_task(self._run())
+        if self._pending:
+            logger.info(f"未完成操作日志中有 {len(self._pending)} 个条目需要重新处理")
+        return [(entry_id, kind, data) for entry_id, (kind, data) in sorted(self._pending.items())]
+
+    async def close(self):
+        """写入剩余记录，重写日志文件后关闭"""
+        if not self.opened:
+            return
+        # 先取得锁，等待后台任务正在线程中进行的写入完成后再取消
+        async with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+            try:
+                await asyncio.to_thread(self._write, self._take_buffer())
+                await asyncio.to_thread(self._rewrite, list(self._pending.items()))
+            except Exception as e:
+                logger.error(f"写入未完成操作日志失败: {e}")
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer.clear()
+        self._pending.clear()
+        self.opened = False
+
+    def add(self, kind: str, data: Dict[str, Any]) -> Optional[int]:
+        """记录一个未完成的条目，返回条目 id；日志未打开时返回 None"""
+        if not self.opened:
+            return None
+        entry_id = self._next_id
+        self._next_id += 1
+        # 保存副本，调用方之后修改数据不影响日志内容
+        data = dict(data)
+        self._pending[entry_id] = (kind, data)
+        self._append({"op": "add", "id": entry_id, "kind": kind, "data": data})
+        return entry_id
+
+    def done(self, entry_id: Optional[int]):
+        """标记条目已完成"""
+        if entry_id is None or not self.opened or self._pending.pop(entry_id, None) is None:
+            return
+        self._completed += 1
+        self._append({"op": "done", "id": entry_id})
+
+    def _append(self, record: Dict[str, Any]):
+        self._buffer.append(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._wakeup.set()
+
+    def _take_buffer(self) -> List[str]:
+        lines, self._buffer = self._buffer, []
+        return lines
+
+    async def flush(self):
+        """立即写入所有排队的记录"""
+        async with self._lock:
+            lines = self._take_buffer()
+            if not lines:
+                return
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except Exception:
+                # 写入失败的记录放回队首，下一批重试
+                self._buffer[:0] = lines
+                raise
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 在写入间隔内攒批，一批记录只 fsync 一次
+            if self.flush_interval > 0:
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.compact_threshold > 0 and self._completed >= self.compact_threshold:
+                    await self.compact()
+            except Exception as e:
+                logger.error(f"写入未完成操作日志失败: {e}")
+                await asyncio.sleep(1)
+                self._wakeup.set()
+
+    async def compact(self):
+        """只保留未完成的条目重写日志文件"""
+        async with self._lock:
+            # 快照之后产生的记录仍在缓冲区中，会在重写后追加到新文件
+            entries = list(self._pending.items())
+            await asyncio.to_thread(self._rewrite, entries)
+            self._completed = 0
+        logger.debug(f"未完成操作日志已重写，保留 {len(entries)} 个条目")
+
+    def _replay(self) -> Tuple[Dict[int, Tuple[str, Dict[str, Any]]], int]:
+        """在线程中执行：读取日志文件，返回未完成的条目和无法解析的行数"""
+        pending: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        invalid = 0
+        if not self.path.exists():
+            return pending, invalid
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    entry_id = int(record["id"])
+                    if record["op"] == "add":
+                        pending[entry_id] = (str(record["kind"]), dict(record["data"]))
+                    else:
+                        pending.pop(entry_id, None)
+                except (ValueError, KeyError, TypeError):
+                    # 进程在写入过程中退出时，最后一行可能不完整
+                    invalid += 1
+        return pending, invalid
+
+    def _write(self, lines: List[str]):
+        """在线程中执行：追加一批记录并落盘"""
+        if not lines:
+            return
+        self._file.write("".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rewrite(self, entries: List[Tuple[int, Tuple[str, Dict[str, Any]]]]):
+        """在线程中执行：将条目写入临时文件后原子替换日志文件，并重新打开追加写入"""
+        temp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry_id, (kind, data) in entries:
+                record = {"op": "add", "id": entry_id, "kind": kind, "data": data}
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # 部分平台不能替换仍被打开的文件，先关闭
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.replace(temp_path, self.path)
+            self._sync_directory()
+        finally:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def _sync_directory(self):
+        """使文件替换本身落盘，不支持的平台上忽略"""
+        try:
+            fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def summary(self) -> str:
+        """生成日志统计文本"""
+        return f"未完成操作日志: {len(self._pending)} 个条目, 待写入 {len(self._buffer)} 条记录"
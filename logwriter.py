@@ -0,0 +1,152 @@
+"""
+违规日志后台写入器
+
+违规记录先放入内存缓冲区，由后台任务按条数或时间间隔批量写入文件，
+文件 I/O 在线程中执行，不阻塞事件循环。所有写入由同一把锁串行执行，记录写入成功后才移出缓冲区，
+写入失败的记录留在缓冲区中重试。日志按大小和日期轮转，旧文件可压缩为 gzip。
+"""
+
+import asyncio
+import gzip
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import List, Optional
+
+from nonebot import logger
+
+
+class ViolationLogWriter:
+    """违规日志后台写入器"""
+
+    def __init__(
+        self,
+        path: Path,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        rotate_daily: bool = True,
+        compress: bool = True,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        # 尚未写入文件的记录
+        self._buffer: List[str] = []
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._file_date: Optional[date] = None
+
+    def configure(self, batch_size: int, flush_interval: float, max_bytes: int, rotate_daily: bool, compress: bool):
+        """更新写入参数，已排队的记录不受影响"""
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+
+    def write(self, line: str):
+        """将一行日志加入写入缓冲区，立即返回"""
+        self._buffer.append(line)
+        # 缓冲区由空变为非空时开始计时，达到批量大小时立即写入
+        if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务并写入所有排队的记录"""
+        if self._task is not None and not self._task.done():
+            # 后台任务写完当前批次后退出
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"写入违规日志失败，{self.pending} 条记录未写入: {e}")
+
+    async def flush(self):
+        """立即写入所有排队的记录，后台任务正在写入的批次写完后才返回；写入失败时抛出异常"""
+        async with self._lock:
+            # 取得锁时，之前开始的写入都已完成
+            lines = self._buffer[:]
+            if not lines:
+                return
+            await asyncio.to_thread(self._write_lines, lines)
+            # 写入期间新加入的记录保留在缓冲区中
+            del self._buffer[:len(lines)]
+
+    async def _run(self):
+        while not self._stopping:
+            # 上一批写入期间加入的记录不会再次唤醒，直接开始攒批
+            if not self._buffer:
+                await self._wakeup.wait()
+            # 在时间间隔内攒批，达到批量大小或停止时立即写入
+            if not self._stopping and len(self._buffer) < self.batch_size and self.flush_interval > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"写入违规日志失败，稍后重试: {e}")
+                if not self._stopping:
+                    await asyncio.sleep(1)
+
+    def _write_lines(self, lines: List[str]):
+        """在线程中执行：必要时轮转后追加写入"""
+        data = "".join(lines)
+        self._rotate_if_needed(len(data.encode("utf-8")))
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+        logger.debug(f"已写入 {len(lines)} 条违规日志")
+
+    def _rotate_if_needed(self, incoming: int):
+        today = date.today()
+        if not self.path.exists():
+            self._file_date = today
+            return
+        if self._file_date is None:
+            self._file_date = datetime.fromtimestamp(self.path.stat().st_mtime).date()
+
+        size = self.path.stat().st_size
+        date_changed = self.rotate_daily and self._file_date != today
+        too_large = self.max_bytes > 0 and size > 0 and size + incoming > self.max_bytes
+        if date_changed or too_large:
+            self._rotate()
+            self._file_date = today
+
+    def _rotate(self):
+        """将当前文件重命名为带日期和序号的分段，并按配置压缩"""
+        stem = f"{self.path.stem}.{self._file_date.isoformat()}"
+        index = 1
+        while True:
+            rotated = self.path.with_name(f"{stem}.{index}{self.path.suffix}")
+            if not rotated.exists() and not rotated.with_name(rotated.name + ".gz").exists():
+                break
+            index += 1
+        self.path.rename(rotated)
+
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated.with_name(rotated.name + ".gz"), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        logger.info(f"违规日志已轮转: {rotated.name}")
@@ -0,0 +1,439 @@
+"""
+监控群成员索引
+
+在内存中维护 用户QQ号 -> {监控群号: 群内角色} 的映射，
+使邀请规则可以直接通过字典查询判断成员身份与管理员权限，无需逐群调用 OneBot API。
+重新获取成员列表时与现有索引比较，只应用新增、移除和角色变化的成员。
+索引可保存为快照文件，启动时直接加载，不必逐群重新获取；快照中的群由后台同步优先重新确认。
+
+MemberSyncScheduler 在后台按限速轮流重新同步各监控群的成员列表，
+近期有成员变动或邀请的群更早同步。
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from nonebot import logger
+from nonebot.adapters.onebot.v11 import Bot
+
+from .cache import ApiCaller, call_api
+
+ADMIN_ROLES = ("admin", "owner")
+
+# get_bot(群号) 返回用于加载该群成员列表的机器人
+BotGetter = Callable[[int], Optional[Bot]]
+
+SNAPSHOT_VERSION = 1
+
+
+class MemberIndex:
+    """监控群成员索引"""
+
+    def __init__(self, call_api: ApiCaller = call_api):
+        # call_api(bot, api, **params) 发出实际的 API 调用，如带计时的调用
+        self.call_api = call_api
+        # user_id -> {group_id: role}
+        self._members: Dict[int, Dict[int, str]] = {}
+        # group_id -> 群内用户，用于比较成员列表和移除整个群，不必遍历所有用户
+        self._group_members: Dict[int, Set[int]] = {}
+        # 已完整加载成员列表的群
+        self._ready_groups: Set[int] = set()
+        # 从快照加载、尚未重新同步的群
+        self._stale_groups: Set[int] = set()
+        # 各群最近一次完整同步的时间戳
+        self.synced_at: Dict[int, float] = {}
+        # 快照保存后索引是否有变化
+        self.dirty = False
+
+    def is_ready(self, group_id: int) -> bool:
+        """该群成员列表是否已加载（包括从快照加载的群）"""
+        return group_id in self._ready_groups
+
+    def is_stale(self, group_id: int) -> bool:
+        """该群是否从快照加载且尚未重新同步"""
+        return group_id in self._stale_groups
+
+    def pending_groups(self, group_ids: Iterable[int]) -> List[int]:
+        """返回尚未加载成员列表的群"""
+        return [group_id for group_id in group_ids if group_id not in self._ready_groups]
+
+    def find(self, user_id: int, group_order: Mapping[int, int]) -> Optional[Tuple[int, str]]:
+        """查找用户所在的监控群，group_order 为 群号 -> 优先级，返回优先级最高的 (群号, 角色)
+
+        只遍历该用户所在的群，与监控群数量无关。
+        """
+        groups = self._members.get(user_id)
+        if not groups:
+            return None
+        best = None
+        for group_id, role in groups.items():
+            order = group_order.get(group_id)
+            if order is not None and (best is None or order < best[0]):
+                best = (order, group_id, role)
+        return (best[1], best[2]) if best else None
+
+    def add(self, group_id: int, user_id: int, role: str = "member"):
+        """添加或更新成员"""
+        self._members.setdefault(user_id, {})[group_id] = role
+        self._group_members.setdefault(group_id, set()).add(user_id)
+        self.dirty = True
+
+    def remove(self, group_id: int, user_id: int):
+        """移除成员"""
+        groups = self._members.get(user_id)
+        if groups is None or group_id not in groups:
+            return
+        del groups[group_id]
+        if not groups:
+            del self._members[user_id]
+        members = self._group_members.get(group_id)
+        if members is not None:
+            members.discard(user_id)
+        self.dirty = True
+
+    def set_role(self, group_id: int, user_id: int, role: str):
+        """更新成员角色（仅当成员已在索引中）"""
+        groups = self._members.get(user_id)
+        if groups is not None and group_id in groups:
+            groups[group_id] = role
+            self.dirty = True
+
+    def drop_group(self, group_id: int):
+        """移除某个群的全部索引"""
+        for user_id in list(self._group_members.pop(group_id, ())):
+            groups = self._members.get(user_id)
+            if groups is not None:
+                groups.pop(group_id, None)
+                if not groups:
+                    del self._members[user_id]
+        self._ready_groups.discard(group_id)
+        self._stale_groups.discard(group_id)
+        self.synced_at.pop(group_id, None)
+        self.dirty = True
+
+    def sync_group(self, group_id: int, members: Iterable[Tuple[int, str]]) -> Tuple[int, int, int]:
+        """用完整成员列表更新某个群的索引，只应用变化的部分，返回 (新增, 移除, 角色变化) 人数"""
+        current = self._group_members.setdefault(group_id, set())
+        latest: Dict[int, str] = {}
+        for user_id, role in members:
+            latest[user_id] = role
+        removed = [user_id for user_id in current if user_id not in latest]
+        for user_id in removed:
+            self.remove(group_id, user_id)
+        added = changed = 0
+        for user_id, role in latest.items():
+            previous = self._members.get(user_id, {}).get(group_id)
+            if previous == role:
+                continue
+            if previous is None:
+                added += 1
+            else:
+                changed += 1
+            self.add(group_id, user_id, role)
+        self._ready_groups.add(group_id)
+        self._stale_groups.discard(group_id)
+        self.synced_at[group_id] = time.time()
+        return added, len(removed), changed
+
+    def clear(self):
+        """清空索引"""
+        self._members.clear()
+        self._group_members.clear()
+        self._ready_groups.clear()
+        self._stale_groups.clear()
+        self.synced_at.clear()
+        self.dirty = True
+
+    @property
+    def user_count(self) -> int:
+        return len(self._members)
+
+    @property
+    def group_count(self) -> int:
+        return len(self._ready_groups)
+
+    @property
+    def stale_count(self) -> int:
+        return len(self._stale_groups)
+
+    async def build_group(self, bot: Bot, group_id: int) -> Optional[Tuple[int, int, int]]:
+        """通过 get_group_member_list 加载单个群的成员，返回 (新增, 移除, 角色变化) 人数，失败时返回 None"""
+        try:
+            member_list = await self.call_api(bot, "get_group_member_list", group_id=group_id)
+        except Exception as e:
+            logger.warning(f"获取群 {group_id} 成员列表失败: {e}")
+            return None
+
+        changes = self.sync_group(
+            group_id,
+            ((int(m["user_id"]), m.get("role", "member")) for m in member_list if "user_id" in m),
+        )
+        logger.debug(f"群 {group_id} 成员索引已同步: {len(member_list)} 人, 新增 {changes[0]}, 移除 {changes[1]}, 角色变化 {changes[2]}")
+        return changes
+
+    async def build(self, get_bot: BotGetter, group_ids: Iterable[int]):
+        """依次加载所有监控群的成员，每个群使用负责该群的机器人"""
+        group_ids = list(group_ids)
+        loaded = 0
+        for group_id in group_ids:
+            bot = get_bot(group_id)
+            if bot is None:
+                logger.debug(f"群 {group_id} 没有可用的监控机器人，跳过加载成员索引")
+                continue
+            if await self.build_group(bot, group_id) is not None:
+                loaded += 1
+        logger.info(f"成员索引构建完成: {loaded}/{len(group_ids)} 个群, {self.user_count} 名用户")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """生成可保存为 JSON 的快照，成员只记录 QQ号，角色只记录非普通成员"""
+        groups = {}
+        for group_id in self._ready_groups:
+            user_ids = self._group_members.get(group_id, set())
+            roles = {}
+            for user_id in user_ids:
+                role = self._members[user_id][group_id]
+                if role != "member":
+                    roles[str(user_id)] = role
+            groups[str(group_id)] = {
+                "synced_at": self.synced_at.get(group_id, 0),
+                "members": list(user_ids),
+                "roles": roles,
+            }
+        return {"version": SNAPSHOT_VERSION, "groups": groups}
+
+    def load_snapshot(self, data: Dict[str, Any], group_ids: Iterable[int], max_age: float = 0) -> int:
+        """从快照加载指定群中尚未加载的成员，标记为待确认，返回加载的群数
+
+        max_age 大于 0 时，同步时间早于 max_age 秒前的群不加载，由机器人连接时重新获取。
+        """
+        if data.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"成员索引快照版本不兼容: {data.get('version')}")
+        groups = data.get("groups", {})
+        oldest = time.time() - max_age if max_age > 0 else 0
+        loaded = 0
+        for group_id in group_ids:
+            entry = groups.get(str(group_id))
+            if entry is None or group_id in self._ready_groups or float(entry.get("synced_at", 0)) < oldest:
+                continue
+            roles = entry.get("roles", {})
+            for user_id in entry.get("members", []):
+                self.add(group_id, int(user_id), roles.get(str(user_id), "member"))
+            self._group_members.setdefault(group_id, set())
+            self._ready_groups.add(group_id)
+            self._stale_groups.add(group_id)
+            self.synced_at[group_id] = float(entry.get("synced_at", 0))
+            loaded += 1
+        return loaded
+
+
+def read_snapshot(path: Path) -> Dict[str, Any]:
+    """读取成员索引快照文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_snapshot(path: Path, data: Dict[str, Any]):
+    """写入临时文件后原子替换成员索引快照文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp_path, path)
+
+
+class SyncStats:
+    """成员同步统计"""
+
+    def __init__(self):
+        self.syncs = 0
+        self.failures = 0
+        self.added = 0
+        self.removed = 0
+        self.changed = 0
+
+
+class MemberSyncScheduler:
+    """成员列表后台同步调度器
+
+    每次只同步一个群，两次同步之间至少间隔 1 / rate 秒。按以下优先级选择下一个群：
+    从快照加载待确认的群和加载失败的群、近期有活动且距上次同步超过 active_interval 的群、
+    距上次同步超过 interval 的群；后者在 interval 内均匀分散，不会在同一时刻集中同步。
+    """
+
+    def __init__(
+        self,
+        index: MemberIndex,
+        get_bot: BotGetter,
+        get_group_ids: Callable[[], Iterable[int]],
+        snapshot_path: Optional[Path] = None,
+        snapshot_max_age: float = 86400,
+        interval: float = 3600,
+        active_interval: float = 600,
+        rate: float = 0.5,
+        save_interval: float = 300,
+    ):
+        self.index = index
+        self.get_bot = get_bot
+        self.get_group_ids = get_group_ids
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+        self.interval = interval
+        self.active_interval = active_interval
+        self.rate = rate
+        self.save_interval = save_interval
+        # 各群最近一次活动（成员变动、邀请）的时间戳
+        self._active_at: Dict[int, float] = {}
+        # 加载失败或没有可用机器人的群最近一次尝试的时间戳
+        self._attempted_at: Dict[int, float] = {}
+        self._last_sync = 0.0
+        self._last_routine = 0.0
+        self._last_save = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.stats = SyncStats()
+
+    def configure(
+        self, interval: float, active_interval: float, rate: float, snapshot_path: Optional[Path], snapshot_max_age: float
+    ):
+        """更新同步参数，下一次调度时生效"""
+        self.interval = interval
+        self.active_interval = active_interval
+        self.rate = rate
+        self.snapshot_path = snapshot_path
+        self.snapshot_max_age = snapshot_max_age
+        self._wakeup.set()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """启动后台同步任务"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        """停止后台同步任务"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def touch(self, group_id: int):
+        """记录群内活动，该群将按 active_interval 提前同步"""
+        now = time.time()
+        newly_active = self._active_at.get(group_id, 0) <= self.index.synced_at.get(group_id, 0)
+        self._active_at[group_id] = now
+        if newly_active:
+            self._wakeup.set()
+
+    def _due(self, group_id: int) -> Tuple[int, float]:
+        """返回该群的 (优先级, 到期时间)，优先级数值越小越优先"""
+        if not self.index.is_ready(group_id) or self.index.is_stale(group_id):
+            retry = min(value for value in (self.interval, self.active_interval, 60) if value > 0)
+            return 0, self._attempted_at.get(group_id, 0) + retry
+        synced_at = self.index.synced_at.get(group_id, 0)
+        if self.active_interval > 0 and self._active_at.get(group_id, 0) > synced_at:
+            return 1, synced_at + self.active_interval
+        if self.interval > 0:
+            return 2, synced_at + self.interval
+        return 3, float("inf")
+
+    def next_group(self, now: float) -> Tuple[Optional[int], float]:
+        """选择下一个需要同步的群，返回 (群号, 可以开始同步的时间戳)"""
+        group_ids = [group_id for group_id in self.get_group_ids() if self.get_bot(group_id) is not None]
+        best: Optional[Tuple[int, float, int]] = None
+        for group_id in group_ids:
+            priority, due = self._due(group_id)
+            if due == float("inf"):
+                continue
+            # 已到期的群按优先级选择，均未到期时选择最早到期的群
+            key = (0 if due <= now else 1, priority if due <= now else 0, due)
+            if best is None or key < best[0]:
+                best = (key, due, group_id)
+        if best is None:
+            return None, float("inf")
+        key, due, group_id = best
+        start = due
+        if self._due(group_id)[0] == 2 and group_ids:
+            # 定期同步在 interval 内均匀分散
+            start = max(start, self._last_routine + self.interval / len(group_ids))
+        if self.rate > 0:
+            start = max(start, self._last_sync + 1 / self.rate)
+        return group_id, start
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            group_id, start = self.next_group(now)
+            if group_id is None or start > now:
+                self._wakeup.clear()
+                # 最多等待 60 秒后重新检查，监控群或机器人变化时不会错过
+                timeout = min(start - now, 60) if group_id is not None else 60
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.sync(group_id)
+                if self.save_interval > 0 and time.monotonic() - self._last_save >= self.save_interval:
+                    await self.save()
+            except Exception as e:
+                logger.error(f"同步群 {group_id} 成员列表失败: {e}")
+
+    async def sync(self, group_id: int) -> bool:
+        """立即同步一个群的成员列表"""
+        routine = self._due(group_id)[0] == 2
+        self._last_sync = time.time()
+        if routine:
+            self._last_routine = self._last_sync
+        bot = self.get_bot(group_id)
+        changes = await self.index.build_group(bot, group_id) if bot is not None else None
+        if changes is None:
+            self.stats.failures += 1
+            self._attempted_at[group_id] = time.time()
+            return False
+        self._attempted_at.pop(group_id, None)
+        self.stats.syncs += 1
+        self.stats.added += changes[0]
+        self.stats.removed += changes[1]
+        self.stats.changed += changes[2]
+        return True
+
+    async def load(self, group_ids: Iterable[int]) -> int:
+        """从快照文件加载成员索引，返回加载的群数"""
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return 0
+        data = await asyncio.to_thread(read_snapshot, self.snapshot_path)
+        loaded = self.index.load_snapshot(data, group_ids, self.snapshot_max_age)
+        self.index.dirty = False
+        if loaded:
+            logger.info(f"已从快照加载 {loaded} 个群的成员索引, {self.index.user_count} 名用户，将在后台重新同步")
+        return loaded
+
+    async def save(self):
+        """索引有变化时保存快照文件"""
+        self._last_save = time.monotonic()
+        if self.snapshot_path is None or not self.index.dirty:
+            return
+        data = self.index.snapshot()
+        self.index.dirty = False
+        try:
+            await asyncio.to_thread(write_snapshot, self.snapshot_path, data)
+        except Exception:
+            self.index.dirty = True
+            raise
+        logger.debug(f"成员索引快照已保存: {len(data['groups'])} 个群")
+
+    def summary(self) -> str:
+        """生成同步统计文本"""
+        stats = self.stats
+        return (
+            f"成员同步: {'运行中' if self.running else '未运行'}, 已同步 {stats.syncs} 次, 失败 {stats.failures}, "
+            f"新增 {stats.added}/移除 {stats.removed}/角色变化 {stats.changed}, "
+            f"待确认的快照群 {self.index.stale_count}"
+        )
@@ -0,0 +1,243 @@
+"""
+运行指标
+
+统计群邀请处理、OneBot API 调用和踢人执行的计数与耗时分布，可导出为 Prometheus 文本格式。
+未启用时计数方法直接返回，API 调用直接透传，不读取计时器。
+"""
+
+import bisect
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from nonebot.adapters import Bot
+
+LabelValues = Tuple[str, ...]
+Samples = Dict[LabelValues, float]
+
+# API 调用耗时分桶（秒）
+API_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 邀请到踢出耗时分桶（秒）
+END_TO_END_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """指标基类"""
+
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Samples = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not self.registry.enabled:
+            return
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> List[str]:
+        if not self.labelnames and not self.values:
+            return [f"{self.name} 0"]
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sorted(self.values.items())]
+
+    def reset(self):
+        self.values.clear()
+
+
+class Histogram(Metric):
+    """分桶统计的耗时分布"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = API_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 -> [各桶计数（不累计）..., +Inf 桶计数, 总和]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self.registry.enabled:
+            return
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [0] * (len(self.buckets) + 2)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self.values.get(labels)
+        return int(sum(entry[:-1])) if entry else 0
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """按桶线性插值估算分位数，与 Prometheus 的 histogram_quantile 相同"""
+        entry = self.values.get(labels)
+        if not entry:
+            return None
+        total = sum(entry[:-1])
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for index, upper in enumerate(self.buckets):
+            count = entry[index]
+            if cumulative + count >= rank and count > 0:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        # 落在 +Inf 桶中时返回最大的有限边界
+        return self.buckets[-1] if self.buckets else None
+
+    def mean(self, *labels: str) -> Optional[float]:
+        entry = self.values.get(labels)
+        count = self.count(*labels)
+        return entry[-1] / count if entry and count else None
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, entry in sorted(self.values.items()):
+            cumulative = 0
+            for index, upper in enumerate(self.buckets + (float("inf"),)):
+                cumulative += entry[index]
+                le = f'le="{_format_value(upper)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}")
+        return lines
+
+    def reset(self):
+        self.values.clear()
+
+
+class CallbackMetric(Metric):
+    """导出时才读取数值的指标，如队列长度，热路径上没有任何开销"""
+
+    def __init__(self, *args, kind: str, func: Callable[[], Samples], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.kind = kind
+        self.func = func
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in sorted(self.func().items())]
+
+
+class ApiTimer:
+    """统计插件发出的每个 OneBot API 调用的耗时和失败次数
+
+    在插件自己的调用路径上计时，调用被取消（如超时）时同样计入耗时和失败次数。
+    """
+
+    def __init__(self, registry: "MetricsRegistry", durations: Histogram, errors: Counter):
+        self.registry = registry
+        self.durations = durations
+        self.errors = errors
+
+    async def call(self, bot: Bot, api: str, **params: Hashable) -> Any:
+        """调用 API 并计时，未启用时直接透传"""
+        if not self.registry.enabled:
+            return await bot.call_api(api, **params)
+        started = time.perf_counter()
+        try:
+            return await bot.call_api(api, **params)
+        except BaseException:
+            self.errors.inc(api)
+            raise
+        finally:
+            self.durations.observe(time.perf_counter() - started, api)
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self.enabled = False
+        self.metrics: List[Metric] = []
+        self.api_timer: Optional[ApiTimer] = None
+        self.started_at = time.time()
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(self, self._name(name), help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Iterable[float] = API_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(self, self._name(name), help_text, labelnames, buckets=buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def callback(
+        self, name: str, help_text: str, func: Callable[[], Samples], labelnames: Tuple[str, ...] = (), kind: str = "gauge"
+    ) -> CallbackMetric:
+        metric = CallbackMetric(self, self._name(name), help_text, labelnames, kind=kind, func=func)
+        self.metrics.append(metric)
+        return metric
+
+    def time_api_calls(self, name: str, help_text: str, errors_name: str, errors_help: str) -> ApiTimer:
+        """注册 API 耗时和失败次数指标，返回的计时器的 call 方法用于发出 API 调用"""
+        self.api_timer = ApiTimer(
+            self,
+            self.histogram(name, help_text, ("action",)),
+            self.counter(errors_name, errors_help, ("action",)),
+        )
+        return self.api_timer
+
+    def configure(self, enabled: bool):
+        """启用或停用统计，停用时清空已有数据"""
+        if enabled and not self.enabled:
+            self.started_at = time.time()
+        if not enabled:
+            for metric in self.metrics:
+                metric.reset()
+        self.enabled = enabled
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,216 @@
+"""
+检测消息发送队列
+
+监控机器人的检测结果先进入按机器人划分的发送队列，在短时间窗口内攒批后合并为一条消息发送到通讯群。
+每个机器人使用令牌桶限制发送速率，发送失败时按指数退避重试，降低监控账号被风控的风险。
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from nonebot import get_bots, logger
+
+from .cache import ApiCaller, call_api
+
+# 队列中的停止标记
+_STOP = None
+
+Detection = Dict[str, Any]
+Formatter = Callable[[List[Detection]], List[str]]
+SentCallback = Callable[[List[Detection]], None]
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """获取一个令牌，不足时等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SenderStats:
+    """发送统计"""
+
+    def __init__(self):
+        self.messages_sent = 0
+        self.detections_sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def record_send(self, latency: float, detections: int):
+        self.messages_sent += 1
+        self.detections_sent += detections
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.messages_sent if self.messages_sent else 0.0
+
+
+class DetectionSender:
+    """检测消息批量发送器"""
+
+    def __init__(
+        self,
+        formatter: Formatter,
+        batch_window: float = 1.0,
+        max_batch_size: int = 10,
+        rate: float = 0.5,
+        burst: float = 3,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0,
+        on_sent: Optional[SentCallback] = None,
+        call_api: ApiCaller = call_api,
+    ):
+        self.formatter = formatter
+        # call_api(bot, api, **params) 发出实际的 API 调用，如带计时的调用
+        self.call_api = call_api
+        # 检测结果所在的消息全部发送成功后回调，用于标记持久化日志中的条目已完成
+        self.on_sent = on_sent
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # 每个机器人一个队列、一个令牌桶和一个发送任务
+        self._queues: Dict[str, "asyncio.Queue[Optional[Tuple[int, Detection, float]]]"] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, SenderStats] = defaultdict(SenderStats)
+
+    def configure(
+        self, batch_window: float, max_batch_size: int, rate: float, burst: float, max_retries: int, retry_backoff: float
+    ):
+        """更新发送参数，已排队的检测结果不受影响"""
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        for bucket in self._buckets.values():
+            bucket.rate = rate
+            bucket.capacity = max(burst, 1)
+
+    def submit(self, self_id: str, group_id: int, detection: Detection):
+        """将检测结果加入指定机器人的发送队列，立即返回"""
+        queue = self._queues.get(self_id)
+        if queue is None:
+            queue = self._queues[self_id] = asyncio.Queue()
+            self._buckets[self_id] = TokenBucket(self.rate, self.burst)
+        queue.put_nowait((group_id, detection, time.monotonic()))
+        worker = self._workers.get(self_id)
+        if worker is None or worker.done():
+            self._workers[self_id] = asyncio.create_task(self._run(self_id, queue))
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    async def stop(self, timeout: float = 10):
+        """发送剩余的检测结果并停止所有发送任务"""
+        workers = [worker for worker in self._workers.values() if not worker.done()]
+        for self_id, worker in self._workers.items():
+            if not worker.done():
+                self._queues[self_id].put_nowait(_STOP)
+        if workers:
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+            for worker in pending:
+                worker.cancel()
+            if pending:
+                logger.warning(f"停止发送队列超时，{self.queue_depth} 条检测结果未发送")
+        self._workers.clear()
+
+    async def _run(self, self_id: str, queue: "asyncio.Queue"):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_window
+            # 在时间窗口内攒批
+            while len(batch) < self.max_batch_size and _STOP not in batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            stopping = _STOP in batch
+
+            # 按通讯群分组后合并发送
+            groups: Dict[int, List[Tuple[Detection, float]]] = defaultdict(list)
+            for item in batch:
+                if item is not _STOP:
+                    group_id, detection, queued_at = item
+                    groups[group_id].append((detection, queued_at))
+            for group_id, items in groups.items():
+                detections = [detection for detection, _ in items]
+                sent = True
+                for message in self.formatter(detections):
+                    if not await self._send(self_id, group_id, message, len(detections), min(t for _, t in items)):
+                        sent = False
+                if sent and self.on_sent is not None:
+                    self.on_sent(detections)
+
+    async def _send(self, self_id: str, group_id: int, message: str, count: int, queued_at: float) -> bool:
+        """限速发送一条消息，失败时指数退避重试，返回是否发送成功"""
+        stats = self.stats[self_id]
+        for attempt in range(self.max_retries + 1):
+            await self._buckets[self_id].acquire()
+            bot = get_bots().get(self_id)
+            try:
+                if bot is None:
+                    raise RuntimeError(f"机器人 {self_id} 未连接")
+                await self.call_api(bot, "send_group_msg", group_id=group_id, message=message)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    stats.failures += 1
+                    logger.error(f"发送检测消息失败，已重试 {attempt} 次: {e}")
+                    return False
+                stats.retries += 1
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"发送检测消息失败，{delay:.1f} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+            else:
+                stats.record_send(time.monotonic() - queued_at, count)
+                logger.info(f"检测消息已发送到通讯群 {group_id}（{count} 条检测结果）")
+                return True
+        return False
+
+    def summary(self) -> str:
+        """生成发送统计文本"""
+        lines = [f"检测消息发送队列: 待发送 {self.queue_depth} 条"]
+        for self_id, stats in sorted(self.stats.items()):
+            lines.append(
+                f"机器人 {self_id}: 已发送 {stats.messages_sent} 条消息/{stats.detections_sent} 条检测结果, "
+                f"重试 {stats.retries}, 失败 {stats.failures}, "
+                f"延迟 平均 {stats.avg_latency:.2f}s / 最大 {stats.max_latency:.2f}s / 最近 {stats.last_latency:.2f}s"
+            )
+        return "\n".join(lines)
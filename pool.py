@@ -0,0 +1,130 @@
+"""
+机器人池与监控群分配
+
+监控机器人和管理机器人都可以配置多个。每个机器人连接时登记自己能负责的监控群
+（监控机器人为所在的群，管理机器人为拥有管理员权限的群），每个群分配给负载最低的可用机器人；
+机器人断开或失去权限时，它负责的群自动转移给其他可用机器人。
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+Changes = Dict[int, Optional[str]]
+
+
+class BotPool:
+    """同一角色的一组机器人及其负责的监控群"""
+
+    def __init__(self, name: str, get_group_ids: Callable[[], Iterable[int]]):
+        self.name = name
+        # get_group_ids() 返回当前需要分配的监控群
+        self.get_group_ids = get_group_ids
+        # 机器人 -> 可以负责的群
+        self._capable: Dict[str, Set[int]] = {}
+        # 群 -> 负责的机器人
+        self._owners: Dict[int, str] = {}
+        # 机器人 -> 负责的群数量
+        self._loads: Dict[str, int] = {}
+
+    @property
+    def bots(self) -> List[str]:
+        """已登记的机器人"""
+        return list(self._capable)
+
+    def owner(self, group_id: int) -> Optional[str]:
+        """负责该群的机器人"""
+        return self._owners.get(group_id)
+
+    def capable_groups(self, self_id: str) -> Set[int]:
+        """该机器人可以负责的群"""
+        return set(self._capable.get(self_id, ()))
+
+    def set_capable(self, self_id: str, group_ids: Iterable[int]) -> Changes:
+        """登记机器人可以负责的群，返回归属发生变化的群"""
+        self._capable[self_id] = set(group_ids)
+        self._loads.setdefault(self_id, 0)
+        return self.refresh()
+
+    def grant(self, self_id: str, group_id: int) -> Changes:
+        """机器人获得某个群的负责能力（如被设为管理员）"""
+        if self_id not in self._capable:
+            return {}
+        self._capable[self_id].add(group_id)
+        return self.refresh()
+
+    def revoke(self, self_id: str, group_id: int) -> Changes:
+        """机器人失去某个群的负责能力（如被取消管理员或被移出群）"""
+        if self_id not in self._capable:
+            return {}
+        self._capable[self_id].discard(group_id)
+        return self.refresh()
+
+    def remove_bot(self, self_id: str) -> Changes:
+        """移除机器人，它负责的群转移给其他机器人"""
+        self._capable.pop(self_id, None)
+        return self.refresh()
+
+    def candidates(self, group_id: int) -> List[str]:
+        """可以负责该群的机器人"""
+        return [self_id for self_id, groups in self._capable.items() if group_id in groups]
+
+    def _pick(self, group_id: int) -> Optional[str]:
+        """选择可以负责该群且负载最低的机器人"""
+        candidates = self.candidates(group_id)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda self_id: (self._loads.get(self_id, 0), self_id))
+
+    def _set_owner(self, group_id: int, self_id: Optional[str], changes: Changes):
+        previous = self._owners.get(group_id)
+        if previous == self_id:
+            return
+        if previous is not None:
+            del self._owners[group_id]
+            if previous in self._loads:
+                self._loads[previous] -= 1
+        if self_id is not None:
+            self._owners[group_id] = self_id
+            self._loads[self_id] = self._loads.get(self_id, 0) + 1
+        changes[group_id] = self_id
+
+    def refresh(self) -> Changes:
+        """重新分配监控群：移除失效的归属，为未分配的群选择机器人，并使各机器人负载均衡"""
+        changes: Changes = {}
+        group_ids = set(self.get_group_ids())
+        for self_id in [self_id for self_id in self._loads if self_id not in self._capable]:
+            del self._loads[self_id]
+
+        for group_id, owner in list(self._owners.items()):
+            if group_id not in group_ids or group_id not in self._capable.get(owner, ()):
+                self._set_owner(group_id, None, changes)
+        for group_id in group_ids:
+            if group_id not in self._owners:
+                self_id = self._pick(group_id)
+                if self_id is not None:
+                    self._set_owner(group_id, self_id, changes)
+
+        # 负载差距超过 1 时把群转移给负载更低的机器人，每次转移都使负载更平均，循环必然结束
+        moved = True
+        while moved:
+            moved = False
+            for group_id in list(self._owners):
+                owner, best = self._owners[group_id], self._pick(group_id)
+                if best is not None and self._loads[owner] - self._loads[best] > 1:
+                    self._set_owner(group_id, best, changes)
+                    moved = True
+        return changes
+
+    def unassigned_groups(self) -> List[int]:
+        """没有可用机器人负责的监控群"""
+        return [group_id for group_id in self.get_group_ids() if group_id not in self._owners]
+
+    def summary(self) -> str:
+        """生成分配情况文本"""
+        if not self._capable:
+            return f"{self.name}机器人池: 无已登记的机器人"
+        parts = [f"{self_id} 负责 {self._loads.get(self_id, 0)} 个群" for self_id in sorted(self._capable)]
+        text = f"{self.name}机器人池: " + ", ".join(parts)
+        unassigned = self.unassigned_groups()
+        if unassigned:
+            text += f"\n{self.name}机器人池中无人负责的群: {unassigned}"
+        return text
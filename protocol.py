@@ -0,0 +1,129 @@
+"""
+检测消息格式
+
+监控机器人与管理机器人之间通过通讯群传递检测结果。
+当前格式为 "IGID1:" 前缀加 base64url 编码的紧凑 JSON，单条消息可携带多条检测结果；
+旧版 "InvalidGroupInvitationDetect | ..." 文本格式仍可解析，便于分批升级。
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, List, Tuple
+
+LEGACY_PREFIX = "InvalidGroupInvitationDetect"
+COMPACT_VERSION = 1
+COMPACT_PREFIX = f"IGID{COMPACT_VERSION}:"
+
+# 规则中用于快速判断的前缀
+DETECTION_PREFIXES: Tuple[str, ...] = (COMPACT_PREFIX, LEGACY_PREFIX)
+
+# 紧凑格式中每条检测结果的字段顺序
+COMPACT_FIELDS = ("time", "monitor_group", "user_id", "user_card", "nickname", "target_group", "target_group_name")
+INT_FIELDS = ("monitor_group", "user_id", "target_group")
+
+# 旧版文本格式的字段名及对应的键
+LEGACY_FIELDS = (
+    ("Time", "time"),
+    ("MonitorGroup", "monitor_group"),
+    ("User", "user_id"),
+    ("Card", "user_card"),
+    ("Nickname", "nickname"),
+    ("TargetGroup", "target_group"),
+    ("TargetGroupName", "target_group_name"),
+)
+
+
+class DetectionFormatError(ValueError):
+    """检测消息格式错误"""
+
+
+def is_detection_text(text: str) -> bool:
+    """文本是否为检测消息（只检查前缀）"""
+    return text.lstrip().startswith(DETECTION_PREFIXES)
+
+
+def encode_detections(detections: Iterable[Dict[str, Any]]) -> str:
+    """将若干检测结果编码为紧凑格式"""
+    payload = {
+        "v": COMPACT_VERSION,
+        "d": [[detection.get(field) for field in COMPACT_FIELDS] for detection in detections],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return COMPACT_PREFIX + base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_compact(body: str) -> List[Dict[str, Any]]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(body.strip()))
+    except (binascii.Error, ValueError) as e:
+        raise DetectionFormatError(f"无法解码检测消息: {e}") from e
+    if not isinstance(payload, dict) or payload.get("v") != COMPACT_VERSION or not isinstance(payload.get("d"), list):
+        raise DetectionFormatError("检测消息版本或结构不正确")
+
+    detections = []
+    for item in payload["d"]:
+        if not isinstance(item, list) or len(item) != len(COMPACT_FIELDS):
+            raise DetectionFormatError("检测结果字段数量不正确")
+        detection = dict(zip(COMPACT_FIELDS, item))
+        try:
+            for field in INT_FIELDS:
+                detection[field] = int(detection[field])
+        except (TypeError, ValueError) as e:
+            raise DetectionFormatError(f"检测结果字段类型不正确: {e}") from e
+        detection["user_card"] = str(detection["user_card"] or "")
+        detection["nickname"] = str(detection["nickname"] or "")
+        detection["target_group_name"] = str(detection["target_group_name"] or "")
+        detections.append(detection)
+    return detections
+
+
+def format_legacy_detection(detection: Dict[str, Any]) -> str:
+    """将单条检测结果格式化为旧版文本格式"""
+    return " | ".join(
+        [LEGACY_PREFIX] + [f"{name}: {detection.get(key, '')}" for name, key in LEGACY_FIELDS]
+    )
+
+
+def parse_legacy_detection(message: str) -> Dict[str, Any]:
+    """解析旧版文本格式
+
+    按固定字段顺序定位 " | 字段名: " 标记，字段值中包含 " | " 或 ": " 时也能正确解析。
+    """
+    message = message.strip()
+    if not message.startswith(LEGACY_PREFIX):
+        raise DetectionFormatError("不是检测消息")
+
+    detection: Dict[str, Any] = {}
+    position = len(LEGACY_PREFIX)
+    markers = [(f" | {name}: ", key) for name, key in LEGACY_FIELDS]
+    for index, (marker, key) in enumerate(markers):
+        start = message.find(marker, position)
+        if start < 0:
+            raise DetectionFormatError(f"检测消息缺少必需字段: {LEGACY_FIELDS[index][0]}")
+        value_start = start + len(marker)
+        if index + 1 < len(markers):
+            end = message.find(markers[index + 1][0], value_start)
+            if end < 0:
+                raise DetectionFormatError(f"检测消息缺少必需字段: {LEGACY_FIELDS[index + 1][0]}")
+        else:
+            end = len(message)
+        detection[key] = message[value_start:end].strip()
+        position = end
+
+    try:
+        for field in INT_FIELDS:
+            detection[field] = int(detection[field])
+    except ValueError as e:
+        raise DetectionFormatError(f"检测结果字段类型不正确: {e}") from e
+    return detection
+
+
+def decode_detections(text: str) -> List[Dict[str, Any]]:
+    """解析检测消息，支持紧凑格式和旧版文本格式"""
+    text = text.strip()
+    if text.startswith(COMPACT_PREFIX):
+        return _decode_compact(text[len(COMPACT_PREFIX):])
+    if text.startswith(LEGACY_PREFIX):
+        return [parse_legacy_detection(text)]
+    raise DetectionFormatError("不是检测消息")
@@ -0,0 +1,301 @@
+"""
+违规信誉库
+
+记录每个邀请者和目标群出现在违规记录中的次数，次数达到阈值即视为已知的违规用户或广告群。
+每张表在磁盘上是按 ID 排序的 (ID, 次数) int64 数组，启动时以 mmap 只读映射，二分查找，
+不需要把整张表读入内存；新增的次数先暂存在内存中，定期与磁盘数组归并后原子替换文件。
+文件使用本机字节序，不能在字节序不同的机器之间直接复制。
+"""
+
+import array
+import asyncio
+import mmap
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from nonebot import logger
+
+MAGIC = b"IGREP001"
+# 每次写入文件的记录数
+WRITE_CHUNK = 65536
+
+
+def count_offenders(records: Iterable[Tuple[int, Optional[int]]]) -> Tuple[Counter, Counter]:
+    """统计 (用户, 目标群) 违规记录中每个用户和目标群出现的次数"""
+    users: Counter = Counter()
+    targets: Counter = Counter()
+    for user_id, target_group in records:
+        users[user_id] += 1
+        if target_group:
+            targets[target_group] += 1
+    return users, targets
+
+
+class ReputationTable:
+    """磁盘上的 (ID, 次数) 有序数组及尚未写入的增量"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        # int64 视图，偶数位置为 ID，奇数位置为次数
+        self._view: Optional[memoryview] = None
+        self._size = 0
+        # 尚未写入磁盘的增量
+        self._added: Dict[int, int] = {}
+        # 正在写入磁盘的增量，替换文件后才清空，保存期间查询仍计入
+        self._saving: Dict[int, int] = {}
+
+    def open(self):
+        """映射磁盘文件，文件不存在或为空时视为空表"""
+        self.close()
+        if not self.path.exists() or self.path.stat().st_size <= len(MAGIC):
+            return
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"信誉库文件格式不正确: {self.path}")
+        self._view = memoryview(self._mmap)[len(MAGIC):].cast("q")
+        self._size = len(self._view) // 2
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._size = 0
+
+    def _stored(self, key: int) -> int:
+        view = self._view
+        low, high = 0, self._size
+        while low < high:
+            mid = (low + high) // 2
+            if view[mid * 2] < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._size and view[low * 2] == key:
+            return view[low * 2 + 1]
+        return 0
+
+    def count(self, key: int) -> int:
+        """ID 在违规记录中出现的次数"""
+        stored = self._stored(key) if self._size else 0
+        count = stored + self._added.get(key, 0)
+        if self._saving:
+            count += self._saving.get(key, 0)
+        return count
+
+    def add(self, key: int, amount: int = 1):
+        self._added[key] = self._added.get(key, 0) + amount
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._added)
+
+    @property
+    def pending(self) -> int:
+        """尚未写入磁盘的条目数"""
+        return len(self._added) + len(self._saving)
+
+    def __len__(self) -> int:
+        """磁盘上的条目数（不含尚未写入的增量）"""
+        return self._size
+
+    def _iter_stored(self) -> Iterator[Tuple[int, int]]:
+        view = self._view
+        for index in range(self._size):
+            yield view[index * 2], view[index * 2 + 1]
+
+    def _merge(self, added: Dict[int, int]) -> Iterator[Tuple[int, int]]:
+        """按 ID 顺序归并磁盘数组和增量"""
+        stored = self._iter_stored()
+        pending = iter(sorted(added.items()))
+        current = next(stored, None)
+        extra = next(pending, None)
+        while current is not None or extra is not None:
+            if extra is None or (current is not None and current[0] < extra[0]):
+                yield current
+                current = next(stored, None)
+            elif current is None or extra[0] < current[0]:
+                yield extra
+                extra = next(pending, None)
+            else:
+                yield current[0], current[1] + extra[1]
+                current, extra = next(stored, None), next(pending, None)
+
+    @property
+    def temp_path(self) -> Path:
+        return self.path.with_suffix(self.path.suffix + ".tmp")
+
+    def _write(self, entries: Iterable[Tuple[int, int]]) -> int:
+        """写入临时文件，返回条目数，由 commit() 替换正式文件"""
+        written = 0
+        with open(self.temp_path, "wb") as f:
+            f.write(MAGIC)
+            buffer = array.array("q")
+            for key, count in entries:
+                buffer.append(key)
+                buffer.append(count)
+                if len(buffer) >= WRITE_CHUNK * 2:
+                    buffer.tofile(f)
+                    written += len(buffer) // 2
+                    buffer = array.array("q")
+            buffer.tofile(f)
+            written += len(buffer) // 2
+            f.flush()
+            os.fsync(f.fileno())
+        return written
+
+    def write_merged(self, added: Dict[int, int]) -> int:
+        """将磁盘数组与增量归并写入临时文件（可在线程中执行，只读取当前映射）"""
+        return self._write(self._merge(added))
+
+    def write_counts(self, counts: Dict[int, int]) -> int:
+        """将完整的次数表写入临时文件"""
+        return self._write(sorted(counts.items()))
+
+    def commit(self):
+        """用临时文件原子替换正式文件并重新映射；部分平台不能替换仍在映射中的文件，先解除映射"""
+        self.close()
+        try:
+            os.replace(self.temp_path, self.path)
+            # 新文件已包含正在写入的增量
+            self._saving = {}
+        finally:
+            self.open()
+
+    def take_added(self) -> Dict[int, int]:
+        """取出当前增量准备写入，commit() 前查询仍计入；写入失败时用 restore_added 放回"""
+        self._saving, self._added = self._added, {}
+        return self._saving
+
+    def restore_added(self, added: Dict[int, int]):
+        self._saving = {}
+        for key, amount in added.items():
+            self.add(key, amount)
+
+    def discard_added(self):
+        """丢弃尚未写入磁盘的增量"""
+        self._added = {}
+        self._saving = {}
+
+
+class ReputationStore:
+    """违规用户与广告群信誉库"""
+
+    def __init__(
+        self,
+        directory: Path,
+        user_threshold: int = 1,
+        target_threshold: int = 3,
+        save_interval: float = 60,
+    ):
+        self.directory = directory
+        self.user_threshold = max(user_threshold, 1)
+        self.target_threshold = max(target_threshold, 1)
+        self.save_interval = save_interval
+        self.users = ReputationTable(directory / "users.bin")
+        self.targets = ReputationTable(directory / "targets.bin")
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.opened = False
+
+    def configure(self, user_threshold: int, target_threshold: int, save_interval: float):
+        """更新阈值和保存间隔，阈值至少为 1"""
+        self.user_threshold = max(user_threshold, 1)
+        self.target_threshold = max(target_threshold, 1)
+        self.save_interval = save_interval
+
+    @property
+    def exists(self) -> bool:
+        """磁盘上是否已有信誉库文件"""
+        return self.users.path.exists() or self.targets.path.exists()
+
+    def open(self):
+        """映射磁盘文件并启动定期保存任务"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.users.open()
+        self.targets.open()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self.opened = True
+        logger.info(f"信誉库已加载: {len(self.users)} 名用户, {len(self.targets)} 个目标群")
+
+    async def close(self):
+        """保存增量并关闭"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.save()
+        self.users.close()
+        self.targets.close()
+        self.opened = False
+
+    def is_bad_user(self, user_id: int) -> bool:
+        """是否为已知的违规用户"""
+        return self.users.count(user_id) >= self.user_threshold
+
+    def is_bad_target(self, group_id: int) -> bool:
+        """是否为已知的广告群"""
+        return self.targets.count(group_id) >= self.target_threshold
+
+    def record(self, user_id: int, target_group: Optional[int]):
+        """记录一次违规"""
+        self.users.add(user_id)
+        if target_group:
+            self.targets.add(target_group)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.save_interval if self.save_interval > 0 else 60)
+            if self.save_interval > 0:
+                await self.save()
+
+    async def _save_table(self, table: ReputationTable):
+        if not table.dirty:
+            return
+        added = table.take_added()
+        try:
+            await asyncio.to_thread(table.write_merged, added)
+            # 保存期间新增的次数仍在内存中
+            table.commit()
+        except Exception:
+            table.restore_added(added)
+            raise
+
+    async def save(self):
+        """将增量写入磁盘"""
+        async with self._lock:
+            for table in (self.users, self.targets):
+                try:
+                    await self._save_table(table)
+                except Exception as e:
+                    logger.error(f"保存信誉库 {table.path.name} 失败: {e}")
+
+    async def rebuild(self, users: Dict[int, int], targets: Dict[int, int]) -> Tuple[int, int]:
+        """以历史违规记录统计出的次数重建信誉库，返回 (用户数, 目标群数)"""
+        async with self._lock:
+            for table, counts in ((self.users, users), (self.targets, targets)):
+                # 尚未保存的增量可能已包含在历史记录中，重建后丢弃
+                table.discard_added()
+                await asyncio.to_thread(table.write_counts, counts)
+                table.commit()
+        return len(users), len(targets)
+
+    def summary(self) -> str:
+        """生成信誉库统计文本"""
+        pending = self.users.pending + self.targets.pending
+        return (
+            f"信誉库: {len(self.users)} 名用户（阈值 {self.user_threshold} 次）, "
+            f"{len(self.targets)} 个目标群（阈值 {self.target_threshold} 次）, 待保存 {pending} 条"
+        )
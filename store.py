@@ -0,0 +1,274 @@
+"""
+违规记录 SQLite 存储
+
+以 WAL 模式的 SQLite 数据库保存结构化违规记录，并在用户、监控群、目标群和时间上建立索引。
+所有数据库操作都在单独的线程中串行执行，写入经队列批量提交，不阻塞事件循环。
+"""
+
+import asyncio
+import gzip
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from nonebot import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS violations (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    monitor_group INTEGER NOT NULL,
+    target_group INTEGER,
+    target_group_name TEXT,
+    user_card TEXT,
+    nickname TEXT,
+    action TEXT NOT NULL,
+    invite_count INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_violations_user ON violations (user_id, ts);
+CREATE INDEX IF NOT EXISTS idx_violations_monitor_group ON violations (monitor_group, ts);
+CREATE INDEX IF NOT EXISTS idx_violations_target_group ON violations (target_group, ts);
+CREATE INDEX IF NOT EXISTS idx_violations_ts ON violations (ts);
+"""
+
+COLUMNS = (
+    "ts", "user_id", "monitor_group", "target_group", "target_group_name", "user_card", "nickname", "action", "invite_count",
+)
+
+# 查询条件 -> 列名
+QUERY_FIELDS = {
+    "user": "user_id",
+    "group": "monitor_group",
+    "target": "target_group",
+}
+
+TEXT_LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 最近解析的小时 -> 该小时开始的时间戳；日志按时间顺序写入，同一小时内的记录只调用一次 strptime
+_last_hour: Tuple[str, int] = ("", 0)
+
+
+def parse_text_log_time(text: str) -> int:
+    """解析文本日志中的时间，格式不正确时抛出 ValueError"""
+    global _last_hour
+    if len(text) != 19 or text[13] != ":" or text[16] != ":":
+        raise ValueError(text)
+    minute, second = text[14:16], text[17:19]
+    if not (minute.isdigit() and second.isdigit() and minute < "60" and second < "62"):
+        raise ValueError(text)
+    hour, start = _last_hour
+    if text[:13] != hour:
+        hour = text[:13]
+        start = int(datetime.strptime(hour, "%Y-%m-%d %H").timestamp())
+        _last_hour = (hour, start)
+    return start + int(minute) * 60 + int(second)
+
+
+def parse_text_log_line(line: str) -> Optional[Dict[str, Any]]:
+    """解析一行文本违规日志，格式不正确时返回 None"""
+    parts = line.rstrip("\n").split(" | ")
+    if len(parts) < 2:
+        return None
+    try:
+        ts = parse_text_log_time(parts[0])
+    except ValueError:
+        return None
+
+    fields: Dict[str, str] = {}
+    for part in parts[1:]:
+        if ": " in part:
+            key, value = part.split(": ", 1)
+            fields[key.strip()] = value.strip()
+    if not fields.get("Group", "").isdigit() or not fields.get("User", "").isdigit():
+        return None
+
+    target_group = fields.get("TargetGroup", "")
+    invite_count = fields.get("Invites", "")
+    return {
+        "ts": ts,
+        "user_id": int(fields["User"]),
+        "monitor_group": int(fields["Group"]),
+        "target_group": int(target_group) if target_group.isdigit() else None,
+        "target_group_name": fields.get("TargetGroupName"),
+        "user_card": fields.get("Card", ""),
+        "nickname": fields.get("Nickname", ""),
+        "action": fields.get("Action", "KICKED_FOR_INVITE"),
+        # 去重窗口内合并的邀请次数，旧日志没有该字段
+        "invite_count": int(invite_count) if invite_count.isdigit() else 1,
+    }
+
+
+def table_columns(conn: sqlite3.Connection) -> List[str]:
+    """返回违规记录表的列名"""
+    return [row[1] for row in conn.execute("PRAGMA table_info(violations)")]
+
+
+def _segment_order(path: Path) -> Tuple[str, int]:
+    # 轮转分段命名为 <名称>.<日期>.<序号>.txt[.gz]
+    parts = path.name.split(".")
+    return parts[1], int(parts[2]) if parts[2].isdigit() else 0
+
+
+def iter_text_log_files(path: Path) -> List[Path]:
+    """返回文本日志及其轮转分段，按时间从旧到新排列"""
+    segments = sorted(path.parent.glob(f"{path.stem}.*{path.suffix}*"), key=_segment_order)
+    if path.exists():
+        segments.append(path)
+    return segments
+
+
+def iter_text_log(path: Path) -> Iterator[Dict[str, Any]]:
+    """流式读取文本日志（含轮转和压缩分段）中的所有记录"""
+    for file in iter_text_log_files(path):
+        opener = gzip.open if file.suffix == ".gz" else open
+        with opener(file, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                record = parse_text_log_line(line)
+                if record is not None:
+                    yield record
+
+
+class ViolationStore:
+    """违规记录 SQLite 存储"""
+
+    def __init__(self, path: Path, batch_size: int = 100, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        # 单线程执行器保证同一连接上的操作串行执行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="violation-store")
+        self._queue: "asyncio.Queue[Tuple]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_in_thread(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        # 旧版本创建的数据库没有邀请次数列
+        if "invite_count" not in table_columns(conn):
+            conn.execute("ALTER TABLE violations ADD COLUMN invite_count INTEGER NOT NULL DEFAULT 1")
+        conn.commit()
+        self._conn = conn
+
+    async def open(self):
+        """打开数据库并启动后台写入任务"""
+        if self._conn is None:
+            await self._run_in_thread(self._connect)
+            logger.info(f"违规记录数据库已打开: {self.path}")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """写入排队的记录并关闭数据库"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            rows = self._drain(None)
+            if rows:
+                await self._run_in_thread(self._insert_rows, rows)
+            await self._run_in_thread(self._conn.close)
+            self._conn = None
+
+    def add(self, record: Dict[str, Any]):
+        """将一条违规记录加入写入队列，立即返回"""
+        self._queue.put_nowait(tuple(record.get(column) for column in COLUMNS))
+
+    def _drain(self, limit: Optional[int]) -> List[Tuple]:
+        rows: List[Tuple] = []
+        while not self._queue.empty() and (limit is None or len(rows) < limit):
+            rows.append(self._queue.get_nowait())
+        return rows
+
+    async def _run(self):
+        while True:
+            rows = [await self._queue.get()]
+            try:
+                await asyncio.sleep(self.flush_interval if self._queue.qsize() < self.batch_size else 0)
+                rows.extend(self._drain(self.batch_size - 1))
+            except asyncio.CancelledError:
+                # 停止时放回队列由 close() 统一写入
+                for row in rows:
+                    self._queue.put_nowait(row)
+                raise
+
+            write = asyncio.ensure_future(self._run_in_thread(self._insert_rows, rows))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                await asyncio.gather(write, return_exceptions=True)
+                raise
+            except Exception as e:
+                logger.error(f"写入违规记录数据库失败: {e}")
+
+    def _insert_rows(self, rows: Iterable[Tuple]) -> int:
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._conn:
+            cursor = self._conn.executemany(
+                f"INSERT INTO violations ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows
+            )
+        return cursor.rowcount
+
+    def _query(self, field: Optional[str], value: Optional[int], limit: int, offset: int) -> Tuple[int, List[Dict[str, Any]]]:
+        where, params = "", []
+        if field is not None:
+            where, params = f"WHERE {QUERY_FIELDS[field]} = ?", [value]
+        total = self._conn.execute(f"SELECT COUNT(*) FROM violations {where}", params).fetchone()[0]
+        cursor = self._conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM violations {where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        )
+        return total, [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    async def query(
+        self, field: Optional[str] = None, value: Optional[int] = None, page: int = 1, page_size: int = 10
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """分页查询违规记录，field 为 user / group / target，None 表示查询全部，返回 (总数, 当前页记录)"""
+        if field is not None and field not in QUERY_FIELDS:
+            raise ValueError(f"不支持的查询条件: {field}")
+        offset = (max(page, 1) - 1) * page_size
+        return await self._run_in_thread(self._query, field, value, page_size, offset)
+
+    def _offender_counts(self) -> Tuple[Dict[int, int], Dict[int, int]]:
+        users = dict(self._conn.execute("SELECT user_id, COUNT(*) FROM violations GROUP BY user_id"))
+        targets = dict(self._conn.execute(
+            "SELECT target_group, COUNT(*) FROM violations WHERE target_group > 0 GROUP BY target_group"
+        ))
+        return users, targets
+
+    async def offender_counts(self) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """统计每个用户和目标群的违规记录数，返回 (用户 -> 次数, 目标群 -> 次数)"""
+        return await self._run_in_thread(self._offender_counts)
+
+    def _import_text_log(self, log_path: Path) -> int:
+        # 只导入早于数据库中最早记录的文本日志，重复执行或与数据库双写时不会产生重复记录
+        cutoff = self._conn.execute("SELECT MIN(ts) FROM violations").fetchone()[0]
+        imported = 0
+        batch: List[Tuple] = []
+        for record in iter_text_log(log_path):
+            if cutoff is not None and record["ts"] >= cutoff:
+                continue
+            batch.append(tuple(record.get(column) for column in COLUMNS))
+            if len(batch) >= 1000:
+                imported += self._insert_rows(batch)
+                batch.clear()
+        if batch:
+            imported += self._insert_rows(batch)
+        return imported
+
+    async def import_text_log(self, log_path: Path) -> int:
+        """将文本违规日志（含轮转分段）导入数据库，返回导入的记录数"""
+        return await self._run_in_thread(self._import_text_log, log_path)
@@ -0,0 +1,248 @@
+"""
+检测结果传输
+
+监控机器人把检测结果交给管理机器人的几种方式，按优先级依次尝试：
+- LocalTransport: 两个机器人连接在同一个 NoneBot 进程时，直接在进程内交给管理端
+- SocketTransport: 不同进程之间通过本地 TCP 或 Unix socket 传输
+- GroupTransport: 通过通讯群消息传输，作为最终回退
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from nonebot import logger
+
+from .outbox import DetectionSender
+from .protocol import DetectionFormatError, decode_detections, encode_detections
+
+Detection = Dict[str, Any]
+Receiver = Callable[[List[Detection]], None]
+
+# 服务端处理完每一行后回复确认：成功交给管理端为 ACK，无法解析为 NACK
+ACK = b"ok\n"
+NACK = b"error\n"
+
+
+def parse_socket_address(address: str) -> Tuple[str, Any]:
+    """解析 socket 地址，返回 ("unix", 路径) 或 ("tcp", (主机, 端口))"""
+    address = address.strip()
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"无效的 socket 地址: {address}")
+    return "tcp", (host, int(port))
+
+
+class Transport:
+    """传输方式基类"""
+
+    name = "base"
+
+    def available(self, detections: List[Detection]) -> bool:
+        """当前是否可以用该传输方式发送这些检测结果"""
+        return True
+
+    async def send(self, self_id: str, detections: List[Detection]) -> bool:
+        """以指定监控机器人的身份发送检测结果，返回是否成功"""
+        raise NotImplementedError
+
+    async def stop(self):
+        """释放资源"""
+
+
+class LocalTransport(Transport):
+    """进程内传输，直接交给管理端的接收函数"""
+
+    name = "local"
+
+    def __init__(self, receiver: Receiver, is_available: Callable[[List[Detection]], bool]):
+        self.receiver = receiver
+        # is_available(检测结果) 判断本进程是否有负责这些监控群的管理机器人
+        self.is_available = is_available
+
+    def available(self, detections: List[Detection]) -> bool:
+        return self.is_available(detections)
+
+    async def send(self, self_id: str, detections: List[Detection]) -> bool:
+        self.receiver(detections)
+        return True
+
+
+class SocketTransport(Transport):
+    """本地 socket 传输（客户端），每行一条紧凑格式消息，收到服务端的确认后才算发送成功"""
+
+    name = "socket"
+
+    def __init__(self, address: str, token: str = "", timeout: float = 3.0):
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        self._stale = False
+
+    def configure(self, address: str, token: str):
+        """更新地址和认证口令，地址变化时下次发送前重新连接"""
+        if address != self.address or token != self.token:
+            self.address = address
+            self.token = token
+            self._stale = True
+
+    def available(self, detections: List[Detection]) -> bool:
+        return bool(self.address)
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        kind, target = parse_socket_address(self.address)
+        if kind == "unix":
+            connect = asyncio.open_unix_connection(target)
+        else:
+            connect = asyncio.open_connection(*target)
+        reader, writer = await asyncio.wait_for(connect, self.timeout)
+        if self.token:
+            writer.write(self.token.encode("utf-8") + b"\n")
+        return reader, writer
+
+    async def send(self, self_id: str, detections: List[Detection]) -> bool:
+        line = encode_detections(detections).encode("ascii") + b"\n"
+        async with self._lock:
+            if self._stale:
+                self._stale = False
+                await self._close_writer()
+            # 连接可能已被对端关闭（如管理端重启），此时在旧连接上写入仍会在本地成功，
+            # 以服务端的确认为准，没有确认时重连后重发一次
+            for _ in range(2):
+                try:
+                    if self._writer is None or self._writer.is_closing():
+                        self._reader, self._writer = await self._connect()
+                    self._writer.write(line)
+                    await asyncio.wait_for(self._writer.drain(), self.timeout)
+                    ack = await asyncio.wait_for(self._reader.readline(), self.timeout)
+                except Exception as e:
+                    # 超时后迟到的确认会与下一行错位，关闭连接
+                    logger.debug(f"通过 socket 发送检测结果失败: {e}")
+                    await self._close_writer()
+                    continue
+                if ack == ACK:
+                    return True
+                await self._close_writer()
+                if ack:
+                    raise RuntimeError(f"管理端无法解析检测结果: {ack!r}")
+                logger.debug("socket 连接已被管理端关闭，重新连接")
+        return False
+
+    async def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._reader = None
+            self._writer = None
+
+    async def stop(self):
+        await self._close_writer()
+
+
+class SocketServer:
+    """本地 socket 服务端，接收其他进程发送的检测结果"""
+
+    def __init__(self, address: str, receiver: Receiver, token: str = ""):
+        self.address = address
+        self.receiver = receiver
+        self.token = token
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        kind, target = parse_socket_address(self.address)
+        if kind == "unix":
+            self._server = await asyncio.start_unix_server(self._handle, path=target)
+        else:
+            self._server = await asyncio.start_server(self._handle, *target)
+        logger.info(f"检测结果 socket 服务已启动: {self.address}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if self.token:
+                first = (await reader.readline()).decode("utf-8", "replace").strip()
+                if first != self.token:
+                    logger.warning("检测结果 socket 连接认证失败，已断开")
+                    return
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.receiver(decode_detections(line.decode("ascii", "replace")))
+                except DetectionFormatError as e:
+                    logger.error(f"无法解析 socket 检测消息: {e}")
+                    writer.write(NACK)
+                else:
+                    # 检测结果已加入踢人队列（启用日志时已记入日志），客户端收到确认后才标记完成
+                    writer.write(ACK)
+                await writer.drain()
+        except Exception as e:
+            logger.debug(f"检测结果 socket 连接异常: {e}")
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class GroupTransport(Transport):
+    """通讯群传输，交给检测消息发送器攒批、限速发送"""
+
+    name = "group"
+
+    def __init__(self, sender: DetectionSender, get_group: Callable[[], Optional[int]]):
+        self.sender = sender
+        self.get_group = get_group
+
+    def available(self, detections: List[Detection]) -> bool:
+        return bool(self.get_group())
+
+    async def send(self, self_id: str, detections: List[Detection]) -> bool:
+        group_id = self.get_group()
+        for detection in detections:
+            self.sender.submit(self_id, group_id, detection)
+        return True
+
+
+class TransportRouter:
+    """按优先级选择传输方式，失败时回退到下一种"""
+
+    def __init__(self, transports: Optional[List[Transport]] = None):
+        self.transports = transports or []
+        self.counts: Dict[str, int] = {}
+
+    def configure(self, transports: List[Transport]):
+        """替换传输方式列表，统计保留"""
+        self.transports = transports
+
+    async def send(self, self_id: str, detections: List[Detection]) -> Optional[str]:
+        """发送检测结果，返回实际使用的传输方式名称，全部失败时返回 None"""
+        for transport in self.transports:
+            if not transport.available(detections):
+                continue
+            try:
+                if await transport.send(self_id, detections):
+                    self.counts[transport.name] = self.counts.get(transport.name, 0) + len(detections)
+                    return transport.name
+            except Exception as e:
+                logger.warning(f"传输方式 {transport.name} 发送失败: {e}")
+        return None
+
+    async def stop(self):
+        for transport in self.transports:
+            await transport.stop()
+
+    def summary(self) -> str:
+        names = " -> ".join(transport.name for transport in self.transports) or "无"
+        counts = ", ".join(f"{name} {count}" for name, count in sorted(self.counts.items())) or "暂无"
+        return f"检测结果传输: {names}（已传输: {counts}）"